@@ -12,6 +12,7 @@ import torch
 from torch.utils.data import TensorDataset
 
 from alpha_zero.envs.go import GoEnv
+from alpha_zero.envs import go_engine as go
 from alpha_zero.utils import sgf_wrapper
 from alpha_zero.utils.util import create_logger
 
@@ -77,8 +78,13 @@ def _extract_ratings(black_player, white_player, black_rank, white_rank):
 
 
 # A elo of 2100 is roughly the level of amateur 1 dan
-def replay_sgf(sgf_file, num_stack, logger, skip_n=0, min_elo=2100, max_games_per_player=200):  # noqa: C901
-    """Replay a game in sgf format and return the transitions tuple (states, target_pi, target_v) for every move in the game."""
+def replay_sgf(  # noqa: C901
+    sgf_file, num_stack, logger, skip_n=0, min_elo=2100, max_games_per_player=200, board_size=go.DEFAULT_BOARD_SIZE
+):
+    """Replay a game in sgf format and return the transitions tuple (states, target_pi, target_v) for every move in the game,
+    and the final position (board, komi, result_str, sgf_file) for checking the game result,
+    which is None if the game is won by resign or timeout. Games not played on `board_size` are skipped.
+    """
     sgf_content = None
 
     try:
@@ -91,8 +97,8 @@ def replay_sgf(sgf_file, num_stack, logger, skip_n=0, min_elo=2100, max_games_pe
 
     props = root_node.properties
 
-    board_size = sgf_wrapper.sgf_prop(props.get('SZ', ''))
-    if board_size is None or board_size == '' or int(board_size) != int(os.environ['BOARD_SIZE']):
+    sgf_board_size = sgf_wrapper.sgf_prop(props.get('SZ', ''))
+    if sgf_board_size is None or sgf_board_size == '' or int(sgf_board_size) != board_size:
         logger.debug(f'Game "{sgf_file}" board size mismatch')
         return None
 
@@ -146,7 +152,7 @@ def replay_sgf(sgf_file, num_stack, logger, skip_n=0, min_elo=2100, max_games_pe
     if props.get('KM') is not None:
         komi = float(sgf_wrapper.sgf_prop(props.get('KM')))
 
-    env = GoEnv(komi=komi, num_stack=num_stack)
+    env = GoEnv(board_size=board_size, komi=komi, num_stack=num_stack)
     obs = env.reset()
 
     winner = None
@@ -205,11 +211,32 @@ def replay_sgf(sgf_file, num_stack, logger, skip_n=0, min_elo=2100, max_games_pe
     if env.steps != num_moves:
         return None
 
-    # Additional check to see how many games have mismatching results
-    env_result_str = env.get_result_string()
-    env_result_str = env_result_str.upper()
-    result_str = result_str.upper()
+    # The final position is scored later in batch, to check how many games have mismatching results
+    final_position = None
     if not re.search(r'\+T', result_str, re.IGNORECASE) and not re.search(r'\+R', result_str, re.IGNORECASE):
+        final_position = (np.copy(env.board), komi, result_str, sgf_file)
+
+    return history, final_position
+
+
+def count_mismatched_results(final_positions, logger) -> None:
+    """Score the final positions of the games in batch, and compare the results with the ones recorded in sgf.
+
+    Args:
+        final_positions: a list of tuple (board, komi, result_str, sgf_file).
+        logger: logger instance.
+    """
+    if len(final_positions) == 0:
+        return
+
+    boards, komis, result_strs, sgf_files = zip(*final_positions)
+    # Same as the env, remove dead stones inside pass-alive territory before scoring
+    boards = np.stack([go.fill_pass_alive_areas(board) for board in boards], axis=0)
+    env_result_strs = go.batch_result_string(boards, np.array(komis))
+
+    for env_result_str, result_str, sgf_file in zip(env_result_strs, result_strs, sgf_files):
+        env_result_str = env_result_str.upper()
+        result_str = result_str.upper()
         is_mismatch = False
         if env_result_str[:2] != result_str[:2]:
             is_mismatch = True
@@ -237,10 +264,8 @@ def replay_sgf(sgf_file, num_stack, logger, skip_n=0, min_elo=2100, max_games_pe
         if is_mismatch:
             logger.debug(f'Game "{sgf_file}" has mismatching result, env result: {env_result_str}, SGF result: {result_str}')
 
-    return history
-
 
-def build_eval_dataset(games_dir, num_stack, logger=None) -> TensorDataset:
+def build_eval_dataset(games_dir, num_stack, logger=None, board_size=go.DEFAULT_BOARD_SIZE) -> TensorDataset:
     if logger is None:
         logger = create_logger()
 
@@ -252,11 +277,15 @@ def build_eval_dataset(games_dir, num_stack, logger=None) -> TensorDataset:
     target_pi = []
     target_v = []
 
+    final_positions = []
     valid_games = 0
     for sgf_file in sgf_files:
-        history = replay_sgf(sgf_file, num_stack, logger)
-        if history is None:
+        results = replay_sgf(sgf_file, num_stack, logger, board_size=board_size)
+        if results is None:
             continue
+        history, final_position = results
+        if final_position is not None:
+            final_positions.append(final_position)
         valid_games += 1
         for transition in history:
             states.append(transition[0])
@@ -269,6 +298,7 @@ def build_eval_dataset(games_dir, num_stack, logger=None) -> TensorDataset:
 
     eval_dataset = TensorDataset(states, target_pi, target_v)
 
+    count_mismatched_results(final_positions, logger)
     logger.warning(f'Number of games with mismatched results: {MISMATCH_GAMES}')
     sorted_game_counts = dict(sorted(GAME_COUNTS.items(), key=lambda x: x[1], reverse=True))
     logger.debug(f'Number of games by player: {sorted_game_counts}')
@@ -0,0 +1,121 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Shared memory ring to transfer the finished self-play games from the actors to the learner.
+
+Each slot holds the bit packed states, the search policies and the values of one game as contiguous arrays.
+An actor takes a free slot, writes the game into it, and only sends a small `GameSlot` descriptor through the data queue.
+The learner copies the game straight from the slot into the replay storage, then hands the slot back to the actors.
+So the games are never pickled, which is a list of hundreds of small arrays per game.
+"""
+import ctypes
+import multiprocessing as mp
+import queue
+from typing import Any, Mapping, NamedTuple, Optional, Sequence, Text
+import numpy as np
+
+from alpha_zero.core.network import pack_states
+from alpha_zero.core.replay import Transition
+
+
+class GameSlot(NamedTuple):
+    index: int
+    length: int
+
+
+class SharedGameRing:
+    """A fixed number of game slots in shared memory, which can be passed to the actor and learner processes."""
+
+    def __init__(self, num_slots: int, max_game_length: int, state_size: int, num_actions: int) -> None:
+        """
+        Args:
+            num_slots: the number of game slots, should be larger than the number of actors,
+                so the actors don't need to wait for the learner to release the slots.
+            max_game_length: the maximum number of transitions in a slot, longer games should be sent through the queue.
+            state_size: the size of a bit packed state in bytes, see `alpha_zero.core.network.pack_states`.
+            num_actions: the number of actions of the search policies.
+
+        Raises:
+            ValueError:
+                if num_slots, max_game_length, state_size or num_actions is not a positive integer.
+        """
+        for name, value in (
+            ('num_slots', num_slots),
+            ('max_game_length', max_game_length),
+            ('state_size', state_size),
+            ('num_actions', num_actions),
+        ):
+            if value <= 0:
+                raise ValueError(f'Expect {name} to be a positive integer, got {value}')
+
+        self.num_slots = num_slots
+        self.max_game_length = max_game_length
+        self.state_size = state_size
+        self.num_actions = num_actions
+
+        # The raw arrays have no lock, as each slot is only accessed by one process at a time
+        self.states_buffer = mp.RawArray(ctypes.c_uint8, num_slots * max_game_length * state_size)
+        self.pi_probs_buffer = mp.RawArray(ctypes.c_float, num_slots * max_game_length * num_actions)
+        self.values_buffer = mp.RawArray(ctypes.c_float, num_slots * max_game_length)
+        self.free_slots = mp.Queue()
+        for i in range(num_slots):
+            self.free_slots.put(i)
+
+        self._arrays = None
+
+    def __getstate__(self) -> Mapping[Text, Any]:
+        # The NumPy views are created again in the child process
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    @property
+    def arrays(self) -> Transition:
+        """The NumPy views of the shared buffers, [num_slots, max_game_length, ...]."""
+        if self._arrays is None:
+            shape = (self.num_slots, self.max_game_length)
+            self._arrays = Transition(
+                state=np.frombuffer(self.states_buffer, dtype=np.uint8).reshape(*shape, self.state_size),
+                pi_prob=np.frombuffer(self.pi_probs_buffer, dtype=np.float32).reshape(*shape, self.num_actions),
+                value=np.frombuffer(self.values_buffer, dtype=np.float32).reshape(shape),
+            )
+        return self._arrays
+
+    def put(self, game_seq: Sequence[Transition], timeout: Optional[float] = None) -> Optional[GameSlot]:
+        """Writes the game into a free slot, the states could be bit packed or not.
+
+        Args:
+            game_seq: the transitions of the game.
+            timeout: seconds to wait for a free slot, default None means wait until there is one.
+
+        Returns:
+            the slot descriptor to send to the learner, or None if the game is too long,
+            or there's no free slot before the timeout, in which case the game should be sent through the queue.
+        """
+        game_length = len(game_seq)
+        if game_length == 0 or game_length > self.max_game_length:
+            return None
+        try:
+            index = self.free_slots.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+        states, pi_probs, values = (x[index, :game_length] for x in self.arrays)
+        if game_seq[0].state.dtype == np.uint8:
+            np.stack([transition.state for transition in game_seq], axis=0, out=states)
+        else:
+            states[:] = pack_states(np.stack([transition.state for transition in game_seq], axis=0))
+        np.stack([transition.pi_prob for transition in game_seq], axis=0, out=pi_probs)
+        values[:] = [transition.value for transition in game_seq]
+        return GameSlot(index=index, length=game_length)
+
+    def get(self, slot: GameSlot) -> Transition:
+        """Returns the game in the slot as views of the shared buffers [L, ...], which are only valid until released."""
+        return Transition(*(x[slot.index, : slot.length] for x in self.arrays))
+
+    def release(self, slot: GameSlot) -> None:
+        """Hands the slot back to the actors."""
+        self.free_slots.put(slot.index)
@@ -0,0 +1,183 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Inference-only variants of the AlphaZero network.
+
+The self-play actors and the evaluator only run the network in `eval()` mode on small batches,
+so we can trade the flexibility of eager PyTorch for lower per call overhead:
+    - Fused: fold the BatchNorm layers into the preceding conv layers, and run the ReLU activations in-place.
+    - Autocast: run the network with bfloat16 autocast and/or channels_last memory format, on CPUs with
+        native bfloat16 support (AVX512-BF16 or AMX) this is much faster than float32.
+    - TorchScript: trace and freeze the network into a graph, which can be saved to a file and loaded
+        without the Python model code.
+    - torch.compile: JIT compile the network with the default inductor backend, where available.
+"""
+import copy
+import os
+from typing import Callable, Tuple, Union
+import numpy as np
+import torch
+from torch import nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+
+def _fuse_sequential(block: nn.Sequential) -> None:
+    """Fold Conv2d + BatchNorm2d pairs inside the sequential block, and make the ReLU activations in-place."""
+    for i in range(len(block)):
+        if isinstance(block[i], nn.BatchNorm2d) and i > 0 and isinstance(block[i - 1], nn.Conv2d):
+            block[i - 1] = fuse_conv_bn_eval(block[i - 1], block[i])
+            # Keep the indices of the remaining layers unchanged.
+            block[i] = nn.Identity()
+        elif isinstance(block[i], nn.ReLU):
+            block[i] = nn.ReLU(inplace=True)
+
+
+def fuse_network(network: nn.Module) -> nn.Module:
+    """Returns an inference-only copy of the AlphaZero network, where the BatchNorm layers are folded into
+    the weights and bias of the preceding conv layers, and the ReLU activations run in-place.
+
+    The copy is in `eval()` mode and has no gradients, it should not be trained or loaded with a checkpoint,
+    instead fuse the network again after loading a new checkpoint.
+    """
+    fused = copy.deepcopy(network)
+    fused.eval()
+    for module in fused.modules():
+        if isinstance(module, nn.Sequential):
+            _fuse_sequential(module)
+
+    for p in fused.parameters():
+        p.requires_grad = False
+    return fused
+
+
+class AutocastNetwork(nn.Module):
+    """Run the network with bfloat16 autocast and/or channels_last memory format,
+    the outputs are always float32, so the network can be used as a drop-in replacement."""
+
+    def __init__(self, network: nn.Module, use_bf16: bool = False, channels_last: bool = False) -> None:
+        super().__init__()
+        self.use_bf16 = use_bf16
+        self.channels_last = channels_last
+        self.network = network.to(memory_format=torch.channels_last) if channels_last else network
+
+    def forward(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        # Bit packed states are unpacked by the network
+        if self.channels_last and x.dim() == 4:
+            x = x.contiguous(memory_format=torch.channels_last)
+        with torch.autocast(device_type=x.device.type, dtype=torch.bfloat16, enabled=self.use_bf16):
+            pi_logits, value = self.network(x)
+        return pi_logits.float(), value.float()
+
+
+@torch.no_grad()
+def compute_inference_drift(
+    reference: nn.Module,
+    candidate: nn.Module,
+    states: Union[np.ndarray, torch.Tensor],
+    batch_size: int = 64,
+) -> Tuple[float, float]:
+    """Compare the outputs of the candidate inference network (for example bfloat16 or INT8) against the float32 network.
+
+    Args:
+        reference: the float32 network.
+        candidate: the inference network to check.
+        states: a batch of game positions [N, C, H, W], or bit packed states.
+        batch_size: the batch size for running the networks, default 64.
+
+    Returns:
+        a tuple of (policy_drift, value_drift), where policy drift is the mean total variation distance between
+        the action probabilities, and value drift is the mean absolute error of the values.
+    """
+    device = next(reference.parameters()).device
+    states = torch.as_tensor(states)
+    total_policy_drift = total_value_drift = 0.0
+    for i in range(0, len(states), batch_size):
+        x = states[i : i + batch_size].to(device=device)
+        pi_logits, value = reference(x)
+        candidate_pi_logits, candidate_value = candidate(x)
+        pi = torch.softmax(pi_logits.float(), dim=-1)
+        candidate_pi = torch.softmax(candidate_pi_logits.float(), dim=-1)
+        total_policy_drift += 0.5 * (pi - candidate_pi).abs().sum().item()
+        total_value_drift += (value.float() - candidate_value.float()).abs().sum().item()
+    return total_policy_drift / len(states), total_value_drift / len(states)
+
+
+def export_torchscript(network: nn.Module, input_shape: Tuple, output_file: str = None) -> torch.jit.ScriptModule:
+    """Trace the network with an example input, then freeze the graph for inference.
+
+    Args:
+        network: the AlphaZero network, the weights are copied into the TorchScript module,
+            which runs on the same device as the network.
+        input_shape: the (C, H, W) shape of a single state.
+        output_file: save the TorchScript module to the file if not None, default None.
+
+    Returns:
+        the frozen TorchScript module, which outputs the same (pi_logits, value) tuple as the network,
+            note it only takes unpacked states, as the graph is traced with unpacked states.
+    """
+    was_training = network.training
+    network.eval()
+    try:
+        device = next(network.parameters()).device
+        example_input = torch.zeros((1, *input_shape), dtype=torch.float32, device=device)
+        with torch.no_grad():
+            frozen = torch.jit.freeze(torch.jit.trace(network, example_input))
+    finally:
+        network.train(was_training)
+
+    # The graph rewritten by `optimize_for_inference` may hold prepacked weights which can't be serialized,
+    # so we save the frozen graph and optimize it again when loading.
+    if output_file is not None:
+        torch.jit.save(frozen, output_file)
+    return torch.jit.optimize_for_inference(frozen)
+
+
+def load_torchscript(file: str, device: torch.device = torch.device('cpu')) -> torch.jit.ScriptModule:
+    """Load a TorchScript module saved by `export_torchscript`."""
+    if not os.path.isfile(file):
+        raise ValueError(f'Expect `file` to be a valid TorchScript file, got "{file}"')
+
+    scripted = torch.jit.load(file, map_location=device)
+    scripted.eval()
+    return torch.jit.optimize_for_inference(scripted)
+
+
+def compile_network(network: nn.Module, mode: str = 'reduce-overhead') -> nn.Module:
+    """Compile the network with `torch.compile` for inference, returns the network unchanged
+    if `torch.compile` is not available (PyTorch < 2.0)."""
+    if not hasattr(torch, 'compile'):
+        return network
+
+    network.eval()
+    return torch.compile(network, mode=mode, dynamic=True)
+
+
+def convert_checkpoint(
+    ckpt_file: str,
+    network_builder: Callable[[], nn.Module],
+    input_shape: Tuple,
+    output_file: str,
+    device: torch.device = torch.device('cpu'),
+) -> torch.jit.ScriptModule:
+    """Load the network weights from a training checkpoint, and save it as TorchScript module.
+
+    Args:
+        ckpt_file: the checkpoint file created by the learner.
+        network_builder: a function which returns a new network with the same architecture as the checkpoint.
+        input_shape: the (C, H, W) shape of a single state.
+        output_file: the file to save the TorchScript module.
+        device: device to run the TorchScript module, default CPU.
+
+    Returns:
+        the frozen TorchScript module.
+    """
+    if not os.path.isfile(ckpt_file):
+        raise ValueError(f'Expect `ckpt_file` to be a valid checkpoint file, got "{ckpt_file}"')
+
+    network = network_builder().to(device=device)
+    loaded_state = torch.load(ckpt_file, map_location=device)
+    network.load_state_dict(loaded_state['network'])
+    return export_torchscript(network, input_shape, output_file)
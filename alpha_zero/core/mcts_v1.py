@@ -36,7 +36,6 @@ In this case, a max(-0.8, -0.3) will give us the correct results for black playe
 
 """
 
-import copy
 import math
 from typing import Callable, Tuple, Mapping, Iterable, Any
 import numpy as np
@@ -330,8 +329,10 @@ def uct_search(
         node = root_node
 
         # Make sure do not touch the actual environment.
-        sim_env = copy.deepcopy(env)
-        obs = sim_env.observation()
+        sim_env = env.clone()
+        # Only build the stacked planes for the leaf node, which is evaluated by the neural network.
+        sim_env.return_lazy_obs = True
+        obs = sim_env.lazy_observation()
         done = sim_env.is_game_over
 
         # Phase 1 - Select
@@ -356,7 +357,7 @@ def uct_search(
             continue
 
         # Phase 2 - Expand and evaluation
-        prior_prob, value = eval_func(obs, False)
+        prior_prob, value = eval_func(obs.materialize(), False)
         # Children nodes are evaluated from opponent player's perspective.
         expand(node, prior_prob, sim_env.opponent_player)
 
@@ -513,8 +514,10 @@ def parallel_uct_search(
             node = root_node
 
             # Make sure do not touch the actual environment.
-            sim_env = copy.deepcopy(env)
-            obs = sim_env.observation()
+            sim_env = env.clone()
+            # Only build the stacked planes for the leaf node, which is evaluated by the neural network.
+            sim_env.return_lazy_obs = True
+            obs = sim_env.lazy_observation()
             done = sim_env.is_game_over
 
             # Phase 1 - Select
@@ -543,7 +546,7 @@ def parallel_uct_search(
 
         if leaves:
             batched_nodes, batched_obs, batched_opponent_player = map(list, zip(*leaves))
-            prior_probs, values = eval_func(np.stack(batched_obs, axis=0), True)
+            prior_probs, values = eval_func(np.stack([obs.materialize() for obs in batched_obs], axis=0), True)
 
             for leaf, prior_prob, value, opponent_player in zip(batched_nodes, prior_probs, values, batched_opponent_player):
                 revert_virtual_loss(leaf)
@@ -258,10 +258,10 @@ def minimax(
     # Move ordering based on evaluation scores
     move_scores = []
     for action in legal_actions:
-        sim_env = copy.deepcopy(env)
-        sim_env.step(action)
-        obs = sim_env.observation()
-        _, value = eval_func(obs, False)
+        sim_env = env.clone()
+        sim_env.return_lazy_obs = True
+        obs, *_ = sim_env.step(action)
+        _, value = eval_func(obs.materialize(), False)
         move_scores.append((action, value))
 
     # Sort moves by value (descending for maximizing player, ascending for minimizing)
@@ -274,7 +274,9 @@ def minimax(
     best_value = alpha if maximizing_player else beta
 
     for action, _ in move_scores:
-        sim_env = copy.deepcopy(env)
+        sim_env = env.clone()
+        # The observation is only needed at the leaf, where `env.observation()` is called explicitly
+        sim_env.return_lazy_obs = True
         sim_env.step(action)
         child_value = minimax(
             sim_env,
@@ -475,7 +477,7 @@ def generate_search_policy(child_N: np.ndarray, temperature: float, legal_action
 
 def uct_search(
     env: BoardGameEnv,
-    eval_func: Callable[[np.ndarray, bool], Tuple[Iterable[np.ndarray], Iterable[float]]],
+    eval_func: Callable[[np.ndarray, bool, np.ndarray], Tuple[np.ndarray, Iterable[float]]],
     root_node: Node,
     c_puct_base: float,
     c_puct_init: float,
@@ -486,6 +488,7 @@ def uct_search(
     warm_up: bool = False,
     deterministic: bool = False,
     use_minimax: bool = False,
+    root_mask: np.ndarray = None,
 ) -> Tuple[int, np.ndarray, float, float, Node]:
     """Single-threaded Upper Confidence Bound (UCB) for Trees (UCT) search without any rollout.
 
@@ -506,7 +509,7 @@ def uct_search(
         env: a gym like custom BoardGameEnv environment.
         eval_func: a evaluation function when called returns the
             action probabilities and predicted value from
-            current player's perspective.
+            current player's perspective, the action probabilities are masked by the given legal actions.
         root_node: root node of the search tree, this comes from reuse sub-tree.
         c_puct_base: a float constant determining the level of exploration.
         c_puct_init: a float constant determining the level of exploration.
@@ -518,6 +521,8 @@ def uct_search(
         deterministic: after the MCTS search, choose the child node with most visits number to play in the game,
             instead of sample through a probability distribution, default off.
         use_minimax: whether use minimax algorithm to evaluate the leaf node, default off.
+        root_mask: a 1D bool numpy.array mask to restrict the candidate moves at the root node,
+            for example the moves suggested by a tactical solver, default None means all legal moves.
 
     Returns:
         tuple contains:
@@ -531,6 +536,7 @@ def uct_search(
         ValueError:
             if input argument `env` is not valid BoardGameEnv instance.
             if input argument `num_simulations` is not a positive integer.
+            if input argument `root_mask` does not contain any legal move.
         RuntimeError:
             if the game is over.
     """
@@ -540,13 +546,15 @@ def uct_search(
         raise ValueError(f'Expect `num_simulations` to a positive integer, got {num_simulations}')
     if env.is_game_over():
         raise RuntimeError('Game is over.')
+    if root_mask is not None and not np.any(root_mask & (env.legal_actions == 1)):
+        raise ValueError('Expect `root_mask` to contain at least one legal move.')
 
     # Start time of the search
     start_time = time.perf_counter()
 
     # Create root node
     if root_node is None:
-        prior_prob, value = eval_func(env.observation(), False)
+        prior_prob, value = eval_func(env.observation(), False, env.legal_actions)
         root_node = Node(to_play=env.to_play, num_actions=env.action_dim, parent=DummyNode())
         expand(root_node, prior_prob)
         backup(root_node, value, value)
@@ -554,6 +562,8 @@ def uct_search(
     assert root_node.to_play == env.to_play
 
     root_legal_actions = env.legal_actions
+    if root_mask is not None:
+        root_legal_actions = np.where(root_mask, root_legal_actions, 0)
 
     # Add dirichlet noise to the prior probabilities to root node.
     if root_noise:
@@ -565,8 +575,10 @@ def uct_search(
         node = root_node
 
         # Make sure do not touch the actual environment.
-        sim_env = copy.deepcopy(env)
-        obs = sim_env.observation()
+        sim_env = env.clone()
+        # Only build the stacked planes for the leaf node, which is evaluated by the neural network.
+        sim_env.return_lazy_obs = True
+        obs = sim_env.lazy_observation()
         done = sim_env.is_game_over()
 
         # Phase 1 - Select
@@ -575,7 +587,8 @@ def uct_search(
         # - game is over.
         while node.is_expanded:
             # Select the best move and create the child node on demand
-            node = best_child(node, sim_env.legal_actions, c_puct_base, c_puct_init, sim_env.opponent_player)
+            legal_actions = root_legal_actions if node is root_node else sim_env.legal_actions
+            node = best_child(node, legal_actions, c_puct_base, c_puct_init, sim_env.opponent_player)
             # Make move on the simulation environment.
             obs, reward, done, _ = sim_env.step(node.move)
             if done:
@@ -600,11 +613,11 @@ def uct_search(
                 transposition_table,
             )
 
-            prior_prob, mcts_value = eval_func(obs, False)
+            prior_prob, mcts_value = eval_func(obs.materialize(), False, sim_env.legal_actions)
             # expand(node, prior_prob)
             backup(node, mcts_value, minimax_value)  # Backup with both MCTS and Minimax values
         else:
-            prior_prob, value = eval_func(obs, False)
+            prior_prob, value = eval_func(obs.materialize(), False, sim_env.legal_actions)
             expand(node, prior_prob)
             backup(node, value, value)
 
@@ -675,7 +688,7 @@ def revert_virtual_loss(node: Node) -> None:
 
 def parallel_uct_search(
     env: BoardGameEnv,
-    eval_func: Callable[[np.ndarray], Tuple[Iterable[np.ndarray], Iterable[float]]],
+    eval_func: Callable[[np.ndarray, bool, np.ndarray], Tuple[np.ndarray, Iterable[float]]],
     root_node: Node,
     c_puct_base: float,
     c_puct_init: float,
@@ -687,6 +700,7 @@ def parallel_uct_search(
     warm_up: bool = False,
     deterministic: bool = False,
     use_minimax: bool = False,
+    root_mask: np.ndarray = None,
 ) -> Tuple[int, np.ndarray, float, float, Node]:
     """Single-threaded Upper Confidence Bound (UCB) for Trees (UCT) search without any rollout.
 
@@ -709,7 +723,7 @@ def parallel_uct_search(
         env: a gym like custom GoEnv environment.
         eval_func: a evaluation function when called returns the
             action probabilities and predicted value from
-            current player's perspective.
+            current player's perspective, the action probabilities are masked by the given legal actions.
         root_node: root node of the search tree, this comes from reuse sub-tree.
         c_puct_base: a float constant determining the level of exploration.
         c_puct_init: a float constant determining the level of exploration.
@@ -723,6 +737,8 @@ def parallel_uct_search(
         deterministic: after the MCTS search, choose the child node with most visits number to play in the game,
             instead of sample through a probability distribution, default off.
         use_minimax: whether use minimax algorithm to evaluate the leaf node, default off.
+        root_mask: a 1D bool numpy.array mask to restrict the candidate moves at the root node,
+            for example the moves suggested by a tactical solver, default None means all legal moves.
 
 
     Returns:
@@ -737,6 +753,7 @@ def parallel_uct_search(
         ValueError:
             if input argument `env` is not valid GoEnv instance.
             if input argument `num_simulations` is not a positive integer.
+            if input argument `root_mask` does not contain any legal move.
         RuntimeError:
             if the game is over.
     """
@@ -746,11 +763,13 @@ def parallel_uct_search(
         raise ValueError(f'Expect `num_simulations` to a positive integer, got {num_simulations}')
     if env.is_game_over():
         raise RuntimeError('Game is over.')
+    if root_mask is not None and not np.any(root_mask & (env.legal_actions == 1)):
+        raise ValueError('Expect `root_mask` to contain at least one legal move.')
 
     start_time = time.perf_counter()
     # Create root node
     if root_node is None:
-        prior_prob, value = eval_func(env.observation(), False)
+        prior_prob, value = eval_func(env.observation(), False, env.legal_actions)
         root_node = Node(to_play=env.to_play, num_actions=env.action_dim, parent=DummyNode())
         expand(root_node, prior_prob)
         backup(root_node, value, value)
@@ -758,6 +777,8 @@ def parallel_uct_search(
     assert root_node.to_play == env.to_play
 
     root_legal_actions = env.legal_actions
+    if root_mask is not None:
+        root_legal_actions = np.where(root_mask, root_legal_actions, 0)
 
     # Add dirichlet noise to the prior probabilities to root node.
     if root_noise:
@@ -776,8 +797,10 @@ def parallel_uct_search(
             node = root_node
 
             # Make sure do not touch the actual environment.
-            sim_env = copy.deepcopy(env)
-            obs = sim_env.observation()
+            sim_env = env.clone()
+            # Only build the stacked planes for the leaf node, which is evaluated by the neural network.
+            sim_env.return_lazy_obs = True
+            obs = sim_env.lazy_observation()
             done = sim_env.is_game_over()
 
             # Phase 1 - Select
@@ -786,7 +809,8 @@ def parallel_uct_search(
             # - game is over.
             while node.is_expanded:
                 # Select the best move and create the child node on demand
-                node = best_child(node, sim_env.legal_actions, c_puct_base, c_puct_init, sim_env.opponent_player)
+                legal_actions = root_legal_actions if node is root_node else sim_env.legal_actions
+                node = best_child(node, legal_actions, c_puct_base, c_puct_init, sim_env.opponent_player)
                 # Make move on the simulation environment.
                 obs, reward, done, _ = sim_env.step(node.move)
                 if done:
@@ -802,10 +826,15 @@ def parallel_uct_search(
                 continue
             else:
                 add_virtual_loss(node)
-                leaves.append((node, obs))
+                leaves.append((node, obs, sim_env.legal_actions))
         if leaves:
-            batched_nodes, batched_obs = map(list, zip(*leaves))
-            prior_probs, values = eval_func(np.stack(batched_obs, axis=0), True)
+            batched_nodes, batched_obs, batched_legal_actions = map(list, zip(*leaves))
+            # The prior probabilities are a single [B, num_actions] array, already masked by the legal moves
+            prior_probs, values = eval_func(
+                np.stack([obs.materialize() for obs in batched_obs], axis=0),
+                True,
+                np.stack(batched_legal_actions, axis=0),
+            )
 
             if use_minimax:
                 # print(f"Leaf depth: {leaf.depth}, Minimax depth: {minimax_depth}")
@@ -834,13 +863,13 @@ def parallel_uct_search(
                 for leaf, prior_prob, value in zip(batched_nodes, prior_probs, values):
                     revert_virtual_loss(leaf)
 
-                # If a node was picked multiple times (despite virtual losses), we shouldn't
-                # expand it more than once.
-                if leaf.is_expanded:
-                    continue
+                    # If a node was picked multiple times (despite virtual losses), we shouldn't
+                    # expand it more than once.
+                    if leaf.is_expanded:
+                        continue
 
-                expand(leaf, prior_prob)
-                backup(leaf, value, value) # Backup with both MCTS values
+                    expand(leaf, prior_prob)
+                    backup(leaf, value, value)  # Backup with both MCTS values
 
     # Play - generate search policy action probability from the root node's child visit number.
     search_pi = generate_search_policy(root_node.child_N, 1.0 if warm_up else 0.1, root_legal_actions)
@@ -7,6 +7,7 @@
 """AlphaZero Neural Network component."""
 import math
 from typing import NamedTuple, Tuple
+import numpy as np
 import torch
 from torch import nn
 import torch.nn.functional as F
@@ -39,6 +40,49 @@ def initialize_weights(net: nn.Module) -> None:
                 nn.init.zeros_(module.bias)
 
 
+def pack_states(states: np.ndarray) -> np.ndarray:
+    """Pack the binary feature planes of the states into bits, 8 planes values per byte.
+
+    Args:
+        states: a single state [C, H, W] or a batch of states [B, C, H, W], with values 0 or 1.
+
+    Returns:
+        a uint8 array of shape [ceil(C * H * W / 8)] or [B, ceil(C * H * W / 8)].
+    """
+    if states.ndim == 3:
+        return np.packbits(states.reshape(-1))
+    return np.packbits(states.reshape(states.shape[0], -1), axis=-1)
+
+
+def unpack_states(packed: np.ndarray, input_shape: Tuple) -> np.ndarray:
+    """Reverse of `pack_states`, returns int8 states of shape [*input_shape] or [B, *input_shape]."""
+    num_bits = int(np.prod(input_shape))
+    if packed.ndim == 1:
+        return np.unpackbits(packed, count=num_bits).astype(np.int8).reshape(input_shape)
+    return np.unpackbits(packed, axis=-1, count=num_bits).astype(np.int8).reshape(-1, *input_shape)
+
+
+class UnpackStates(nn.Module):
+    """Expand the bit packed states created by `pack_states` into float32 feature planes,
+    so the states only travel as packed bytes from NumPy to the device.
+
+    Unpacked states of shape [B, C, H, W] are converted to float32 as usual.
+    """
+
+    def __init__(self, input_shape: Tuple) -> None:
+        super().__init__()
+        self.input_shape = tuple(input_shape)
+        self.num_bits = int(np.prod(input_shape))
+        # Not part of the state dict, so checkpoints stay compatible
+        self.register_buffer('shifts', torch.arange(7, -1, -1, dtype=torch.uint8), persistent=False)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        if x.dtype == torch.uint8 and x.dim() == 2:
+            bits = (x.unsqueeze(-1) >> self.shifts) & 1
+            x = bits.view(x.shape[0], -1)[:, : self.num_bits].view(-1, *self.input_shape)
+        return x.to(dtype=torch.float32)
+
+
 class ResNetBlock(nn.Module):
     """Basic redisual block."""
 
@@ -104,6 +148,9 @@ class AlphaZeroNet(nn.Module):
         # FIX BUG, Python 3.7 has no math.prod()
         conv_out = conv_out_hw[0] * conv_out_hw[1]
 
+        # Accept both bit packed and unpacked states
+        self.unpack_states = UnpackStates(input_shape)
+
         # First convolutional block
         self.conv_block = nn.Sequential(
             nn.Conv2d(
@@ -161,6 +208,7 @@ class AlphaZeroNet(nn.Module):
         """Given raw state x, predict the raw logits probability distribution for all actions,
         and the evaluated value, all from current player's perspective."""
 
+        x = self.unpack_states(x)
         conv_block_out = self.conv_block(x)
         features = self.res_blocks(conv_block_out)
 
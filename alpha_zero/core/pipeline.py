@@ -31,8 +31,14 @@ from alpha_zero.core.mcts_v2 import Node, parallel_uct_search, uct_search
 
 from alpha_zero.envs.base import BoardGameEnv
 from alpha_zero.core.eval_dataset import build_eval_dataset
+from alpha_zero.core.game_ring import GameSlot, SharedGameRing
+from alpha_zero.core.network import pack_states
+from alpha_zero.core.inference import AutocastNetwork, compute_inference_drift, fuse_network
+from alpha_zero.core.prefetch import BatchPrefetcher
+from alpha_zero.core.quantization import quantize_network
 from alpha_zero.core.rating import EloRating
 from alpha_zero.core.replay import UniformReplay, Transition
+from alpha_zero.core.shared_weights import SharedWeights
 from alpha_zero.utils.csv_writer import CsvWriter
 from alpha_zero.utils.transformation import apply_random_transformation
 from alpha_zero.utils.util import Timer, create_logger, get_time_stamp
@@ -85,40 +91,61 @@ def create_mcts_player(
     device: torch.device,
     num_simulations: int,
     num_parallel: int,
-    depth: int,
-    k_best: int,
+    depth: int = 0,
+    k_best: int = None,
     root_noise: bool = False,
     deterministic: bool = False,
     use_minimax: bool = False,
+    threat_solver: Callable[[BoardGameEnv], Any] = None,
 ) -> Callable[[BoardGameEnv, Node, float, float, bool], Tuple[int, np.ndarray, float, float, Node]]:
+    """Returns a function which runs MCTS search for the current player in the environment.
+
+    If `threat_solver` is provided, it's called with the environment before each search, and should return an object
+    with `move`, `value` and `root_mask` attributes, see `alpha_zero.envs.gomoku_threats.ThreatResult`.
+    A forced move is played instantly without running the MCTS search, and the root mask restricts
+    the candidate moves at the root node.
+    """
+
     @torch.no_grad()
     def eval_position(
         state: np.ndarray,
         batched: bool = False,
-    ) -> Tuple[Iterable[np.ndarray], Iterable[float]]:
+        legal_actions: np.ndarray = None,
+    ) -> Tuple[np.ndarray, Iterable[float]]:
         """Give a game state tensor, returns the action probabilities
-        and estimated state value from current player's perspective."""
+        and estimated state value from current player's perspective.
+
+        If `legal_actions` masks are given, the softmax is computed over the legal moves only on the device,
+        so the prior probabilities of illegal moves are zero. For a batch of states, the action probabilities
+        are a single contiguous [B, num_actions] array."""
 
         if not batched:
             state = state[None, ...]
+            if legal_actions is not None:
+                legal_actions = legal_actions[None, ...]
 
-        state = torch.from_numpy(state).to(dtype=torch.float32, device=device, non_blocking=True)
+        if device.type == 'cpu':
+            state = torch.from_numpy(state).to(dtype=torch.float32)
+        else:
+            # The binary planes travel to the device as packed bits, and are unpacked by the network
+            state = torch.from_numpy(pack_states(state)).to(device=device, non_blocking=True)
         pi_logits, v = network(state)
 
-        pi_logits = torch.detach(pi_logits)
+        pi_logits = torch.detach(pi_logits).float()
         v = torch.detach(v)
 
+        if legal_actions is not None:
+            legal_mask = torch.from_numpy(np.asarray(legal_actions)).to(device=pi_logits.device) == 1
+            # Keep the raw logits for any position without legal moves, which avoids NaN from softmax
+            legal_mask = legal_mask | ~legal_mask.any(dim=-1, keepdim=True)
+            pi_logits = pi_logits.masked_fill(~legal_mask, -float('inf'))
+
         pi = torch.softmax(pi_logits, dim=-1).cpu().numpy()
         v = v.cpu().numpy()
 
-        B, *_ = state.shape
-
         v = np.squeeze(v, axis=1)
         v = v.tolist()  # To list
 
-        # Unpack the batched array into a list of NumPy arrays
-        pi = [pi[i] for i in range(B)]
-
         if not batched:
             pi = pi[0]
             v = v[0]
@@ -132,6 +159,22 @@ def create_mcts_player(
         c_puct_init: float,
         warm_up: bool = False,
     ) -> Tuple[int, np.ndarray, float, float, Node]:
+        root_mask = None
+        if threat_solver is not None:
+            threat = threat_solver(env)
+            if threat.move is not None:
+                search_pi = np.zeros(env.action_dim)
+                search_pi[threat.move] = 1.0
+                value = threat.value
+                if value is None:
+                    _, value = eval_position(env.observation(), False)
+                return threat.move, search_pi, value, value, None
+
+            root_mask = threat.root_mask
+            if root_mask is not None:
+                # The visits of a reused sub-tree are not restricted to the root mask.
+                root_node = None
+
         if num_parallel > 1:
             return parallel_uct_search(
                 env=env,
@@ -147,6 +190,7 @@ def create_mcts_player(
                 use_minimax=use_minimax,
                 k_best=k_best,
                 depth=depth,
+                root_mask=root_mask,
             )
         else:
             return uct_search(
@@ -162,6 +206,7 @@ def create_mcts_player(
                 use_minimax=use_minimax,
                 k_best=k_best,
                 depth=depth,
+                root_mask=root_mask,
             )
 
     return act
@@ -196,18 +241,48 @@ def run_selfplay_actor_loop(
     log_level: str,
     var_ckpt: mp.Value,
     var_resign_threshold: mp.Value,
-    ckpt_event: mp.Event,
+    ckpt_ready_event: mp.Event,
     stop_event: mp.Event,
+    threat_solver: Callable[[BoardGameEnv], Any] = None,
+    quantize: bool = False,
+    use_bf16: bool = False,
+    channels_last: bool = False,
+    num_calibration_states: int = 512,
+    max_policy_drift: float = 0.05,
+    max_value_drift: float = 0.05,
+    game_ring: SharedGameRing = None,
+    shared_weights: SharedWeights = None,
 ) -> None:
-    """Use the latest neural network to play against itself, and record the transitions for training."""
+    """Use the latest neural network to play against itself, and record the transitions for training.
+
+    If `quantize` is true, the actor plays with an INT8 quantized copy of each new checkpoint,
+    calibrated on the positions from its most recent self-play games. This only applies to CPU actors.
+    If `use_bf16` or `channels_last` is true, the actor runs the network with bfloat16 autocast and/or channels_last
+    memory format. In both cases, the reduced precision network is only used if its outputs on the recent
+    self-play positions are within `max_policy_drift` and `max_value_drift` of the float32 network.
+
+    The actor blocks on `ckpt_ready_event` while the learner is creating a new checkpoint. The time spent waiting for
+    the checkpoint and for the data queue are sent with the game stats as `ckpt_wait_time` and `queue_wait_time`.
+
+    If `game_ring` is provided, the games are written into its shared memory slots, and only the slot descriptors are sent
+    through the data queue. A game which doesn't fit, or if there's no free slot in time, is sent through the queue.
+
+    If `shared_weights` is provided, the actor copies the weights of each new checkpoint in place from the shared memory,
+    instead of loading the checkpoint file in `var_ckpt`.
+    """
     assert num_simulations > 1
+    if quantize and device.type != 'cpu':
+        raise ValueError(f'Expect device to be CPU for quantized inference, got "{device}"')
+    if quantize and (use_bf16 or channels_last):
+        raise ValueError('Expect only one of quantize or use_bf16/channels_last to be enabled, got both')
 
     set_seed(int(seed + rank))
     logger = create_logger(log_level)
     writer = CsvWriter(os.path.join(logs_dir, f'actor{rank}.csv'))
     timer = Timer()
 
-    played_games = training_steps = 0
+    played_games = training_steps = last_version = 0
+    ckpt_wait_time = queue_wait_time = 0.0
     last_ckpt = None
 
     should_save_sgf = False
@@ -225,33 +300,80 @@ def run_selfplay_actor_loop(
 
     network.eval()
 
+    # Recent self-play positions to calibrate the quantized network and to check the drift of reduced precision network,
+    # the first game after loading a checkpoint is played with the float network if there are no positions yet.
+    reduced_precision = quantize or use_bf16 or channels_last
+    calibration_states = deque(maxlen=num_calibration_states)
+    should_reduce_precision = reduced_precision
+
+    def create_player(inference_network):
+        return create_mcts_player(
+            network=inference_network,
+            device=device,
+            num_simulations=num_simulations,
+            num_parallel=num_parallel,
+            depth=depth,
+            k_best=k_best,
+            root_noise=True,
+            deterministic=False,
+            use_minimax=use_minimax,
+            threat_solver=threat_solver,
+        )
+
     # resign_threshold <= -1 means no resign
     resign_threshold = var_resign_threshold.value if env.has_resign_move else -1
-    mcts_player = create_mcts_player(
-        network=network,
-        device=device,
-        num_simulations=num_simulations,
-        num_parallel=num_parallel,
-        depth=depth,
-        k_best=k_best,
-        root_noise=True,
-        deterministic=False,
-        use_minimax=use_minimax,
-    )
+    # Fused once for each checkpoint, shared by the float32 player, the reduced precision wrapper and the drift check
+    fused_network = fuse_network(network)
+    mcts_player = create_player(fused_network)
 
     while not stop_event.is_set():
-        # Wait for learner to finish creating new checkpoint
-        if ckpt_event.is_set():
+        # Wait for learner to finish creating new checkpoint, wake up periodically to check the stop signal
+        wait_start_time = time.perf_counter()
+        is_ckpt_ready = ckpt_ready_event.wait(timeout=1)
+        ckpt_wait_time += time.perf_counter() - wait_start_time
+        if not is_ckpt_ready:
             continue
 
-        new_ckpt = _decode_bytes(var_ckpt.value)
-        if new_ckpt != '' and new_ckpt != last_ckpt and os.path.exists(new_ckpt):
-            loaded_state = torch.load(new_ckpt, map_location=torch.device(device))
-            network.load_state_dict(loaded_state['network'])
-            training_steps = loaded_state['training_steps']
+        is_new_ckpt = False
+        if shared_weights is not None:
+            if shared_weights.version != last_version:
+                last_version, training_steps = shared_weights.load(network)
+                is_new_ckpt = True
+        else:
+            new_ckpt = _decode_bytes(var_ckpt.value)
+            if new_ckpt != '' and new_ckpt != last_ckpt and os.path.exists(new_ckpt):
+                loaded_state = torch.load(new_ckpt, map_location=torch.device(device))
+                network.load_state_dict(loaded_state['network'])
+                training_steps = loaded_state['training_steps']
+                last_ckpt = new_ckpt
+                is_new_ckpt = True
+
+        if is_new_ckpt:
             network.eval()
-            last_ckpt = new_ckpt
-            logger.debug(f'Actor{rank} switched to checkpoint "{new_ckpt}"')
+            should_reduce_precision = reduced_precision
+            fused_network = fuse_network(network)
+            mcts_player = create_player(fused_network)
+            logger.debug(f'Actor{rank} switched to checkpoint of training steps {training_steps}')
+
+        if should_reduce_precision and len(calibration_states) > 0:
+            states = np.stack(calibration_states)
+            if quantize:
+                inference_network = quantize_network(network, states)
+            else:
+                inference_network = AutocastNetwork(fused_network, use_bf16, channels_last)
+            policy_drift, value_drift = compute_inference_drift(fused_network, inference_network, states)
+            if policy_drift <= max_policy_drift and value_drift <= max_value_drift:
+                mcts_player = create_player(inference_network)
+                logger.debug(
+                    f'Actor{rank} switched to reduced precision network, '
+                    f'policy drift {policy_drift:.4f}, value drift {value_drift:.4f}'
+                )
+            else:
+                logger.warning(
+                    f'Actor{rank} keeps float32 network for training steps {training_steps}, '
+                    f'policy drift {policy_drift:.4f}, value drift {value_drift:.4f} above the limits'
+                )
+            should_reduce_precision = False
 
         if env.has_resign_move:
             resign_threshold = var_resign_threshold.value
@@ -275,15 +397,23 @@ def run_selfplay_actor_loop(
 
         played_games += 1
 
-        # The second check is necessary, as the events could be set while the actor is in the middle of playing a game.
+        if reduced_precision:
+            calibration_states.extend(transition.state for transition in game_seq)
+
+        # Send the states as packed bits to the learner
+        game_seq = [transition._replace(state=pack_states(transition.state)) for transition in game_seq]
+
+        # The second check is necessary, as the stop event could be set while the actor is in the middle of playing a game.
+        # Games finished while the learner is creating a new checkpoint are still sent, the learner decides to keep them.
         if stop_event.is_set():
             break
-        if ckpt_event.is_set():
-            continue
 
         # Logging
         stats['time_per_game'] = round_it(timer.mean_time())
         stats['training_steps'] = training_steps
+        # The stall time since the last game sent to the learner
+        stats['ckpt_wait_time'] = round_it(ckpt_wait_time)
+        stats['queue_wait_time'] = round_it(queue_wait_time)
         log_stats = {'datetime': get_time_stamp(), **stats}
         writer.write(OrderedDict((n, v) for n, v in log_stats.items()))
 
@@ -295,7 +425,12 @@ def run_selfplay_actor_loop(
                 f.write(sgf_content)
                 f.close()
 
-        data_queue.put((game_seq, stats))
+        # The queue is bounded, so this blocks if the learner can't keep up
+        put_start_time = time.perf_counter()
+        game_slot = game_ring.put(game_seq, timeout=1) if game_ring is not None else None
+        data_queue.put((game_slot if game_slot is not None else game_seq, stats))
+        queue_wait_time = time.perf_counter() - put_start_time
+        ckpt_wait_time = 0.0
 
     logger.debug(f'Actor{rank} received stop signal.')
     writer.close()
@@ -307,9 +442,6 @@ def play_and_record_one_game(
     resign_disabled: bool,
     c_puct_base: float,
     c_puct_init: float,
-    k_best: int,
-    depth: int,
-    use_minimax: bool,
     warm_up_steps: int,
     check_resign_after_steps: int,
     resign_threshold: float,
@@ -434,11 +566,38 @@ def run_learner_loop(  # noqa: C901
     data_queue: mp.SimpleQueue,
     var_ckpt: mp.Value,
     var_resign_threshold: mp.Value,
-    ckpt_event: mp.Event,
+    ckpt_ready_event: mp.Event,
     stop_event: mp.Event,
     lock=threading.Lock(),
+    use_bf16: bool = False,
+    channels_last: bool = False,
+    max_policy_drift: float = 0.05,
+    max_value_drift: float = 0.05,
+    prefetch_batches: int = 2,
+    max_ckpt_staleness: int = 0,
+    stale_game_weight: float = 1.0,
+    game_ring: SharedGameRing = None,
+    shared_weights: SharedWeights = None,
 ) -> None:
-    """Update the neural network, dynamically adjust resignation threshold if required."""
+    """Update the neural network, dynamically adjust resignation threshold if required.
+
+    If `use_bf16` or `channels_last` is true, the training step runs with bfloat16 autocast and/or channels_last memory
+    format. The drift between the reduced precision and float32 outputs is logged for each checkpoint.
+    If `prefetch_batches` is positive, a background thread samples and augments the batches ahead of the training step.
+    The average time per step waiting for the data and for the compute are logged.
+
+    The games are drained from `data_queue` into the replay by a separate ingestion thread, so the actors don't block on
+    the queue while the network is training. `ckpt_ready_event` is cleared while creating a new checkpoint, so the actors
+    can wait on it. The average actor stall time per game, waiting for the checkpoint and for the queue, is logged.
+
+    Games played with one of the last `max_ckpt_staleness` checkpoints before the current one are also added to the
+    replay, a game which is N checkpoints old is kept with probability `stale_game_weight**N`. Games finished while
+    creating a checkpoint are one checkpoint old. Only the games of the current checkpoint count towards `games_per_ckpt`.
+    The number of games accepted, down-weighted (the accepted stale games) and discarded are logged.
+
+    The games sent as slot descriptors of the shared `game_ring` are copied straight from the shared memory into the replay.
+    If `shared_weights` is provided, the weights of each checkpoint are also published into it for the actors and evaluator.
+    """
     assert min_games >= 100
     assert init_resign_threshold < -0.5
     assert target_fp_rate <= 0.05
@@ -447,6 +606,8 @@ def run_learner_loop(  # noqa: C901
     assert log_interval >= 100
     assert save_replay_interval >= 0
     assert max_training_steps > 0
+    assert max_ckpt_staleness >= 0
+    assert 0 < stale_game_weight <= 1
     assert ckpt_dir is not None and os.path.exists(ckpt_dir) and os.path.isdir(ckpt_dir)
 
     set_seed(int(seed))
@@ -461,7 +622,7 @@ def run_learner_loop(  # noqa: C901
     if training_sample_ratio > 0.25:
         logger.warning(f'Training sample ratio {training_sample_ratio:.2f} might be too high')
 
-    if save_replay_interval > 0:
+    if save_replay_interval > 0 and replay.storage_dir is None:
         logger.warning(f'Saving replay state has been enabled, ensure you have at least 100GB of free space at "{ckpt_dir}"')
 
     if init_resign_threshold <= -1:
@@ -478,12 +639,17 @@ def run_learner_loop(  # noqa: C901
         logger.info(f'Resignation threshold is set to {init_resign_threshold}')
 
     network = network.to(device=device)
+    if channels_last:
+        network = network.to(memory_format=torch.channels_last)
 
     with lock:
         var_ckpt.value = _encode_bytes('')
-        ckpt_event.clear()
+        ckpt_ready_event.clear()
 
-    if load_replay is not None and os.path.exists(load_replay):
+    if replay.storage_dir is not None and replay.size > 0:
+        # The memory mapped replay resumes from its storage directory
+        logger.info(f'Learner resumed replay with {replay.size} samples from "{replay.storage_dir}"')
+    elif load_replay is not None and os.path.exists(load_replay):
         replay_state = load_from_file(load_replay)
         replay.set_state(replay_state)
         logger.info(f'Learner loaded replay state from "{load_replay}"')
@@ -498,145 +664,282 @@ def run_learner_loop(  # noqa: C901
 
     network.train()
 
-    while True:
-        try:
-            item = data_queue.get()
-            if not isinstance(item, Tuple):
-                continue
+    # Protects the replay against the prefetching thread
+    replay_lock = threading.Lock()
+    prefetcher = None
+    if prefetch_batches > 0:
+        prefetcher = BatchPrefetcher(
+            replay=replay,
+            batch_size=batch_size,
+            device=device,
+            input_shape=network.unpack_states.input_shape,
+            argumentation=argument_data,
+            num_batches=prefetch_batches,
+            lock=replay_lock,
+        )
+    data_wait_time = compute_time = 0.0
+    num_timed_steps = 0
+
+    # The ingestion thread drains the data queue into the replay, while this thread trains the network.
+    # The counters shared by the two threads are protected by the replay lock.
+    # The training steps of the current and the last max_ckpt_staleness checkpoints, the newest first
+    recent_ckpt_steps = deque([training_steps], maxlen=max_ckpt_staleness + 1)
+    num_accepted_games = num_down_weighted_games = num_discarded_games = 0
+    is_training = False
+    ingestion_error = None
+    train_event = threading.Event()
+    stop_ingestion_event = threading.Event()
+    actor_stall_que = deque(maxlen=2000)
+
+    def ingest_game(game_seq, stats) -> None:
+        nonlocal last_ckpt_games, last_ckpt_samples, resign_count, last_resign_count, could_won_count, is_training
+        nonlocal num_accepted_games, num_down_weighted_games, num_discarded_games
+
+        with replay_lock:
+            # The number of checkpoints since the one which played the game,
+            # the current checkpoint is about to be replaced while training
+            if stats['training_steps'] in recent_ckpt_steps:
+                staleness = recent_ckpt_steps.index(stats['training_steps']) + int(is_training)
+            else:
+                staleness = max_ckpt_staleness + 1
 
-            game_seq, stats = item
+            if staleness > max_ckpt_staleness or (staleness > 0 and np.random.rand() >= stale_game_weight**staleness):
+                num_discarded_games += 1
+                return
 
+            replay.add_game(game_seq)
+            num_games_added = replay.num_games_added
+            num_samples_added = replay.num_samples_added
+            num_accepted_games += 1
             # Additional check to ensure that we collect equal amount of games from each checkpoint
-            if stats['training_steps'] != training_steps:
-                continue
+            if staleness == 0:
+                last_ckpt_games += 1
+                last_ckpt_samples += stats['game_length']
+            else:
+                num_down_weighted_games += 1
+        game_time_que.append(stats['time_per_game'])
+        game_length_que.append(stats['game_length'])
+        actor_stall_que.append(stats.get('ckpt_wait_time', 0) + stats.get('queue_wait_time', 0))
 
-            last_ckpt_games += 1
-            last_ckpt_samples += stats['game_length']
-            replay.add_game(game_seq)
-            game_time_que.append(stats['time_per_game'])
-            game_length_que.append(stats['game_length'])
-
-            # Logging
-            if replay.num_games_added % 10000 == 0:
-                avg_time_per_game = round_it(np.mean(game_time_que) / num_actors)
-                avg_game_length = np.mean(game_length_que)
-                logger.info(
-                    f'Collected total of {replay.num_games_added} self-play games, '
-                    f'{replay.num_samples_added} samples. '
-                    f'Average game length is {avg_game_length}. '
-                    f'Average time per game (over {num_actors} actors) is {avg_time_per_game}'
-                )
+        # Logging
+        if num_games_added % 10000 == 0:
+            avg_time_per_game = round_it(np.mean(game_time_que) / num_actors)
+            avg_game_length = np.mean(game_length_que)
+            logger.info(
+                f'Collected total of {num_games_added} self-play games, '
+                f'{num_samples_added} samples. '
+                f'Average game length is {avg_game_length}. '
+                f'Average time per game (over {num_actors} actors) is {avg_time_per_game}'
+            )
 
-            # Save replay buffer state periodically to avoid starting from zero.
-            if save_replay_interval > 0 and replay.num_games_added % save_replay_interval == 0:
+        # Save replay buffer state periodically to avoid starting from zero.
+        if save_replay_interval > 0 and num_games_added % save_replay_interval == 0:
+            if replay.storage_dir is not None:
+                with replay_lock:
+                    replay.flush()
+                logger.debug(f'Replay buffer flushed to "{replay.storage_dir}"')
+            else:
                 replay_file = os.path.join(ckpt_dir, 'replay_state.ckpt')
-                save_to_file(replay.get_state(), replay_file)
+                with replay_lock:
+                    replay_state = replay.get_state()
+                save_to_file(replay_state, replay_file)
                 logger.debug(f'Replay buffer state saved at "{replay_file}"')
 
-            # Adjust resignation threshold
-            if init_resign_threshold > -1.0 and replay.num_games_added >= no_resign_games:
-                if (
-                    'is_resign_disabled' in stats
-                    and 'is_marked_for_resign' in stats
-                    and stats['is_resign_disabled']
-                    and stats['is_marked_for_resign']
-                ):
-                    resign_count += 1
-                    if 'is_could_won' in stats and stats['is_could_won']:
-                        could_won_count += 1
-
-                # Doing a hard reset without checking current false positive rate,
-                # so statistics from long time along does not affect current play
-                if replay.num_games_added == no_resign_games or replay.num_games_added % reset_fp_interval == 0:
-                    resign_count = last_resign_count = could_won_count = 0
-                    logger.info(f'Reset resignation threshold to {init_resign_threshold}')
+        # Adjust resignation threshold
+        if init_resign_threshold > -1.0 and num_games_added >= no_resign_games:
+            if (
+                'is_resign_disabled' in stats
+                and 'is_marked_for_resign' in stats
+                and stats['is_resign_disabled']
+                and stats['is_marked_for_resign']
+            ):
+                resign_count += 1
+                if 'is_could_won' in stats and stats['is_could_won']:
+                    could_won_count += 1
+
+            # Doing a hard reset without checking current false positive rate,
+            # so statistics from long time along does not affect current play
+            if num_games_added == no_resign_games or num_games_added % reset_fp_interval == 0:
+                resign_count = last_resign_count = could_won_count = 0
+                logger.info(f'Reset resignation threshold to {init_resign_threshold}')
+                with lock:
+                    var_resign_threshold.value = init_resign_threshold
+            # For those resignation have been disabled games, the agent may not chose to resign depending on the search results
+            elif (
+                resign_count > last_resign_count
+                and resign_count % int(games_per_ckpt * 0.5 * disable_resign_ratio * 0.5) == 0
+            ):
+                last_resign_count = resign_count
+
+                current_fp_rate = 0 if resign_count == 0 else round_it(could_won_count / resign_count)
+                current_threshold = var_resign_threshold.value
+                new_threshold = maybe_adjust_resign_threshold(current_threshold, current_fp_rate, target_fp_rate)
+                if new_threshold != current_threshold:
+                    logger.info(
+                        f'Current resignation false positive is {current_fp_rate}, target {target_fp_rate}, '
+                        f'changing resignation threshold from {current_threshold} to {new_threshold}'
+                    )
                     with lock:
-                        var_resign_threshold.value = init_resign_threshold
-                # For those resignation have been disabled games, the agent may not chose to resign depending on the search results
-                elif (
-                    resign_count > last_resign_count
-                    and resign_count % int(games_per_ckpt * 0.5 * disable_resign_ratio * 0.5) == 0
-                ):
-                    last_resign_count = resign_count
-
-                    current_fp_rate = 0 if resign_count == 0 else round_it(could_won_count / resign_count)
-                    current_threshold = var_resign_threshold.value
-                    new_threshold = maybe_adjust_resign_threshold(current_threshold, current_fp_rate, target_fp_rate)
-                    if new_threshold != current_threshold:
-                        logger.info(
-                            f'Current resignation false positive is {current_fp_rate}, target {target_fp_rate}, '
-                            f'changing resignation threshold from {current_threshold} to {new_threshold}'
-                        )
-                        with lock:
-                            var_resign_threshold.value = new_threshold
-
-            # Perform network parameters update
-            if replay.num_games_added == min_games or (
-                replay.num_games_added >= min_games and last_ckpt_games >= games_per_ckpt
+                        var_resign_threshold.value = new_threshold
+
+        # Ask the training thread to perform network parameters update
+        with replay_lock:
+            if not is_training and (
+                num_games_added == min_games or (num_games_added >= min_games and last_ckpt_games >= games_per_ckpt)
             ):
-                logger.debug(
-                    f'Collected {last_ckpt_games} games, {last_ckpt_samples} samples from last checkpoint (training steps {training_steps})'
-                )
+                is_training = True
+                train_event.set()
 
-                with lock:
-                    ckpt_event.set()
-
-                network.train()
-
-                target_t = training_steps + ckpt_interval
-
-                while training_steps < target_t:
-                    transitions = replay.sample(batch_size)
-                    if transitions is None:
-                        continue
-
-                    optimizer.zero_grad()
-                    pi_loss, v_loss = compute_losses(network, device, transitions, argument_data)
-                    loss = pi_loss + v_loss
-                    loss.backward()
-                    optimizer.step()
-                    lr_scheduler.step()
-                    training_steps += 1
-
-                    # Logging statistics
-                    if training_steps % log_interval == 0 or training_steps % ckpt_interval == 0:
-                        stats = {
-                            'datetime': get_time_stamp(),
-                            'training_steps': training_steps,
-                            'policy_loss': pi_loss.detach().item(),
-                            'value_loss': v_loss.detach().item(),
-                            'learning_rate': lr_scheduler.get_last_lr()[0],
-                            'total_games': replay.num_games_added,
-                            'total_samples': replay.num_samples_added,
-                        }
-                        writer.write(OrderedDict((n, v) for n, v in stats.items()))
-
-                # Create checkpoint
-                ckpt_file = os.path.join(ckpt_dir, f'training_steps_{training_steps}.ckpt')
-                torch.save(
-                    {
-                        'network': network.state_dict(),
-                        'optimizer': optimizer.state_dict(),
-                        'lr_scheduler': lr_scheduler.state_dict(),
-                        'training_steps': training_steps,
-                    },
-                    ckpt_file,
-                )
+    def run_ingestion() -> None:
+        nonlocal ingestion_error
+        try:
+            while not stop_ingestion_event.is_set():
+                try:
+                    item = data_queue.get(timeout=1)
+                except (queue.Empty, EOFError):
+                    continue
+                if not isinstance(item, Tuple):
+                    continue
+                game_seq, stats = item
+                if isinstance(game_seq, GameSlot):
+                    try:
+                        ingest_game(game_ring.get(game_seq), stats)
+                    finally:
+                        game_ring.release(game_seq)
+                else:
+                    ingest_game(game_seq, stats)
+        except Exception as error:
+            ingestion_error = error
+            train_event.set()
+
+    ingestion_thread = threading.Thread(target=run_ingestion, name='LearnerIngestion', daemon=True)
+    ingestion_thread.start()
 
-                with lock:
-                    var_ckpt.value = _encode_bytes(ckpt_file)
-                    ckpt_event.clear()
+    with lock:
+        ckpt_ready_event.set()
+
+    while training_steps < max_training_steps:
+        if not train_event.wait(timeout=1):
+            continue
+        train_event.clear()
+        if ingestion_error is not None:
+            raise RuntimeError('Learner ingestion thread failed') from ingestion_error
+
+        with replay_lock:
+            logger.debug(
+                f'Collected {last_ckpt_games} games, {last_ckpt_samples} samples from last checkpoint (training steps {training_steps})'
+            )
+
+        with lock:
+            ckpt_ready_event.clear()
+
+        network.train()
+
+        target_t = training_steps + ckpt_interval
+
+        if prefetcher is not None:
+            prefetcher.start()
+
+        while training_steps < target_t:
+            start_time = time.perf_counter()
+            if prefetcher is not None:
+                # The prefetched batches are already augmented
+                transitions, should_argument = prefetcher.get(), False
+            else:
+                with replay_lock:
+                    transitions, should_argument = replay.sample(batch_size), argument_data
+            if transitions is None:
+                continue
+            compute_start_time = time.perf_counter()
+
+            optimizer.zero_grad()
+            pi_loss, v_loss = compute_losses(network, device, transitions, should_argument, use_bf16, channels_last)
+            loss = pi_loss + v_loss
+            loss.backward()
+            optimizer.step()
+            lr_scheduler.step()
+            training_steps += 1
+
+            # The compute time only includes the device work which Python waited on
+            data_wait_time += compute_start_time - start_time
+            compute_time += time.perf_counter() - compute_start_time
+            num_timed_steps += 1
+
+            # Logging statistics
+            if training_steps % log_interval == 0 or training_steps % ckpt_interval == 0:
+                stats = {
+                    'datetime': get_time_stamp(),
+                    'training_steps': training_steps,
+                    'policy_loss': pi_loss.detach().item(),
+                    'value_loss': v_loss.detach().item(),
+                    'learning_rate': lr_scheduler.get_last_lr()[0],
+                    'total_games': replay.num_games_added,
+                    'total_samples': replay.num_samples_added,
+                    'data_wait_ms': round_it(data_wait_time / num_timed_steps * 1000),
+                    'compute_ms': round_it(compute_time / num_timed_steps * 1000),
+                    'actor_stall_time': round_it(np.mean(actor_stall_que)) if len(actor_stall_que) > 0 else 0,
+                    'accepted_games': num_accepted_games,
+                    'down_weighted_games': num_down_weighted_games,
+                    'discarded_games': num_discarded_games,
+                }
+                writer.write(OrderedDict((n, v) for n, v in stats.items()))
+                data_wait_time = compute_time = 0.0
+                num_timed_steps = 0
+
+        # Drop the batches sampled ahead, the replay will have the new games from this checkpoint before the next training
+        if prefetcher is not None:
+            prefetcher.stop()
+
+        # Check the reduced precision outputs are still close to float32 outputs
+        if use_bf16 or channels_last:
+            network.eval()
+            with replay_lock:
+                # The sampled arrays are reused by the replay
+                drift_states = replay.sample(min(batch_size, 256)).state.copy()
+            policy_drift, value_drift = compute_inference_drift(
+                network,
+                AutocastNetwork(network, use_bf16, channels_last),
+                drift_states,
+            )
+            network.train()
+            if policy_drift > max_policy_drift or value_drift > max_value_drift:
+                logger.warning(
+                    f'Reduced precision outputs drifted from float32 at training steps {training_steps}, '
+                    f'policy drift {policy_drift:.4f}, value drift {value_drift:.4f}'
+                )
+            else:
+                logger.debug(f'Reduced precision policy drift {policy_drift:.4f}, value drift {value_drift:.4f}')
+
+        # Create checkpoint
+        ckpt_file = os.path.join(ckpt_dir, f'training_steps_{training_steps}.ckpt')
+        torch.save(
+            {
+                'network': network.state_dict(),
+                'optimizer': optimizer.state_dict(),
+                'lr_scheduler': lr_scheduler.state_dict(),
+                'training_steps': training_steps,
+            },
+            ckpt_file,
+        )
+        if shared_weights is not None:
+            shared_weights.publish(network, training_steps)
 
-                logger.debug(f'New checkpoint for training steps {training_steps} is created at "{ckpt_file}"')
+        with replay_lock:
+            last_ckpt_games = 0
+            last_ckpt_samples = 0
+            recent_ckpt_steps.appendleft(training_steps)
+            is_training = False
 
-                last_ckpt_games = 0
-                last_ckpt_samples = 0
+        with lock:
+            var_ckpt.value = _encode_bytes(ckpt_file)
+            ckpt_ready_event.set()
 
-            if training_steps >= max_training_steps:
-                break
+        logger.debug(f'New checkpoint for training steps {training_steps} is created at "{ckpt_file}"')
 
-        except (queue.Empty, EOFError) as error:  # noqa: F841
-            pass
+    stop_ingestion_event.set()
+    ingestion_thread.join()
+    # The memory mapped replay is resumed from the last flush
+    replay.flush()
 
     writer.close()
     time.sleep(30)
@@ -649,18 +952,32 @@ def run_learner_loop(  # noqa: C901
         pass
 
 
-def compute_losses(network, device, transitions, argumentation=False) -> Tuple[torch.Tensor, torch.Tensor]:
-    # [B, C, N, N]
-    state = torch.from_numpy(transitions.state).to(device=device, dtype=torch.float32, non_blocking=True)
+def compute_losses(
+    network, device, transitions, argumentation=False, use_bf16=False, channels_last=False
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Compute the policy and value losses, optionally run the forward pass with bfloat16 autocast and/or
+    channels_last memory format, the losses are always computed in float32."""
+    # The transitions are NumPy arrays sampled from the replay, or tensors from the prefetcher
+    # [B, C, N, N], or bit packed states [B, ceil(C * N * N / 8)] which are unpacked by the network
+    state = torch.as_tensor(transitions.state).to(device=device, non_blocking=True)
     # [B, num_actions]
-    target_pi = torch.from_numpy(transitions.pi_prob).to(device=device, dtype=torch.float32, non_blocking=True)
+    target_pi = torch.as_tensor(transitions.pi_prob).to(device=device, dtype=torch.float32, non_blocking=True)
     # [B, ]
-    target_v = torch.from_numpy(transitions.value).to(device=device, dtype=torch.float32, non_blocking=True)
+    target_v = torch.as_tensor(transitions.value).to(device=device, dtype=torch.float32, non_blocking=True)
 
     if argumentation:
+        # The random transformation works on the feature planes, so unpack the states first
+        state = network.unpack_states(state)
         state, target_pi, target_v = apply_random_transformation(state, target_pi, target_v)
 
-    pred_pi_logits, pred_v = network(state)
+    if channels_last and state.dim() == 4:
+        state = state.contiguous(memory_format=torch.channels_last)
+
+    with torch.autocast(device_type=state.device.type, dtype=torch.bfloat16, enabled=use_bf16):
+        pred_pi_logits, pred_v = network(state)
+
+    pred_pi_logits = pred_pi_logits.float()
+    pred_v = pred_v.float()
 
     # Policy cross-entropy loss
     policy_loss = F.cross_entropy(pred_pi_logits, target_pi, reduction='mean')
@@ -714,9 +1031,14 @@ def run_evaluator_loop(
     log_level: str,
     var_ckpt: mp.Value,
     stop_event: mp.Event,
+    threat_solver: Callable[[BoardGameEnv], Any] = None,
+    shared_weights: SharedWeights = None,
 ) -> None:
     """Evaluate the latest neural network by paying against network from last checkpoint.
     Also compute the prediction accuracy on human games if applicable.
+
+    If `shared_weights` is provided, the evaluator copies the weights of each new checkpoint in place from the shared memory,
+    instead of loading the checkpoint file in `var_ckpt`.
     """
     assert num_simulations > 1
 
@@ -729,7 +1051,7 @@ def run_evaluator_loop(
     writer = CsvWriter(os.path.join(logs_dir, 'evaluation.csv'), buffer_size=1)
 
     last_ckpt = None
-    last_ckpt_step = 0
+    last_ckpt_step = last_version = 0
 
     if load_ckpt is not None and os.path.exists(load_ckpt):
         loaded_state = torch.load(load_ckpt, map_location=device)
@@ -738,14 +1060,11 @@ def run_evaluator_loop(
         last_ckpt = load_ckpt
         logger.info(f'Evaluator loaded state from checkpoint "{load_ckpt}"')
 
-    prev_ckpt_network = deepcopy(network).to(device=device)
-    disable_auto_grad(prev_ckpt_network)
     network.eval()
-    prev_ckpt_network.eval()
 
     dataloader = None
     if eval_games_dir is not None and eval_games_dir != '' and os.path.exists(eval_games_dir):
-        eval_dataset = build_eval_dataset(eval_games_dir, env.num_stack, logger)
+        eval_dataset = build_eval_dataset(eval_games_dir, env.num_stack, logger, board_size=env.board_size)
         dataloader = DataLoader(
             eval_dataset,
             batch_size=1024,
@@ -759,42 +1078,47 @@ def run_evaluator_loop(
     black_elo = EloRating(rating=default_rating)
     white_elo = EloRating(rating=default_rating)
 
-    black_player = create_mcts_player(
-        network=network,
-        device=device,
-        num_simulations=num_simulations,
-        num_parallel=num_parallel,
-        k_best=k_best,
-        depth=depth,
-        root_noise=False,
-        deterministic=True,
-        use_minimax=use_minimax,
-    )
-
-    white_player = create_mcts_player(
-        network=prev_ckpt_network,
-        device=device,
-        num_simulations=num_simulations,
-        num_parallel=num_parallel,
-        k_best=k_best,
-        depth=depth,
-        root_noise=False,
-        deterministic=True,
-        use_minimax=use_minimax,
-    )
+    def create_player(inference_network):
+        return create_mcts_player(
+            network=inference_network,
+            device=device,
+            num_simulations=num_simulations,
+            num_parallel=num_parallel,
+            k_best=k_best,
+            depth=depth,
+            root_noise=False,
+            deterministic=True,
+            use_minimax=use_minimax,
+            threat_solver=threat_solver,
+        )
+
+    # Players use the fused copy of the networks, which are created again after each checkpoint load,
+    # the copy is a snapshot, so white keeps playing with the previous checkpoint when the network is loaded again
+    white_player = create_player(fuse_network(network))
 
     while not stop_event.is_set():
-        ckpt_file = _decode_bytes(var_ckpt.value)
-        if ckpt_file == '' or ckpt_file == last_ckpt or not os.path.exists(ckpt_file):
-            time.sleep(30)
-            continue
+        if shared_weights is not None:
+            if shared_weights.version == last_version:
+                time.sleep(30)
+                continue
 
-        # Load states from checkpoint file
-        loaded_state = torch.load(ckpt_file, map_location=torch.device(device))
-        training_steps = loaded_state['training_steps']
-        network.load_state_dict(loaded_state['network'])
+            # Copy the weights in place from the shared memory
+            last_version, training_steps = shared_weights.load(network)
+        else:
+            ckpt_file = _decode_bytes(var_ckpt.value)
+            if ckpt_file == '' or ckpt_file == last_ckpt or not os.path.exists(ckpt_file):
+                time.sleep(30)
+                continue
+
+            # Load states from checkpoint file
+            loaded_state = torch.load(ckpt_file, map_location=torch.device(device))
+            training_steps = loaded_state['training_steps']
+            network.load_state_dict(loaded_state['network'])
+            last_ckpt = ckpt_file
         network.eval()
-        last_ckpt = ckpt_file
+
+        inference_network = fuse_network(network)
+        black_player = create_player(inference_network)
 
         selfplay_game_stats = eval_against_prev_ckpt(
             env,
@@ -806,7 +1130,7 @@ def run_evaluator_loop(
             c_puct_init,
         )
 
-        pro_game_stats = eval_on_pro_games(network, device, dataloader)
+        pro_game_stats = eval_on_pro_games(inference_network, device, dataloader)
 
         stats = {
             'datetime': get_time_stamp(),
@@ -829,8 +1153,7 @@ def run_evaluator_loop(
                 f.close()
 
         # Switching to new model
-        prev_ckpt_network.load_state_dict(loaded_state['network'])
-        prev_ckpt_network.eval()
+        white_player = create_player(inference_network)
         # We assume the new model will be the same level as previous model, since they are pretty close
         white_elo = deepcopy(black_elo)
         last_ckpt_step = training_steps
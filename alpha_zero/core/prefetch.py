@@ -0,0 +1,151 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Background batch prefetching for the learner.
+
+A background thread samples the replay, unpacks and augments the states, and stages the batches in pinned memory,
+then copies them to the device ahead of time. So the training step only waits on the data when the sampling
+can't keep up with the device. Most of the work is in NumPy and PyTorch ops which release the GIL.
+"""
+import queue
+import threading
+import time
+from typing import Optional, Tuple
+import torch
+
+from alpha_zero.core.network import UnpackStates
+from alpha_zero.core.replay import Transition, UniformReplay
+from alpha_zero.utils.transformation import apply_random_transformation
+
+
+class BatchPrefetcher:
+    """Keeps a queue of ready batches sampled from the replay, as tensors on the device."""
+
+    def __init__(
+        self,
+        replay: UniformReplay,
+        batch_size: int,
+        device: torch.device,
+        input_shape: Tuple[int, int, int],
+        argumentation: bool = False,
+        num_batches: int = 2,
+        lock: Optional[threading.Lock] = None,
+    ) -> None:
+        """
+        Args:
+            replay: the replay to sample the batches from.
+            batch_size: the batch size.
+            device: the device for the batches, the batches are staged in pinned memory if the device is CUDA.
+            input_shape: the shape of the unpacked states, only used if argumentation is true.
+            argumentation: apply random transformation to the batches, default off.
+            num_batches: the number of ready batches to keep in the queue, default 2.
+            lock: a lock to protect the replay, which should also be held when adding games to the replay,
+                default None means the replay is not accessed by other threads while prefetching.
+
+        Raises:
+            ValueError:
+                if batch_size or num_batches is not a positive integer.
+        """
+        if batch_size <= 0:
+            raise ValueError(f'Expect batch_size to be a positive integer, got {batch_size}')
+        if num_batches <= 0:
+            raise ValueError(f'Expect num_batches to be a positive integer, got {num_batches}')
+
+        self.replay = replay
+        self.batch_size = batch_size
+        self.device = device
+        self.argumentation = argumentation
+        self.lock = lock if lock is not None else threading.Lock()
+        self.pin_memory = device.type == 'cuda'
+        self.unpack_states = UnpackStates(input_shape) if argumentation else None
+
+        self.batches = queue.Queue(maxsize=num_batches)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.error = None
+
+        # Total seconds the learner waited for a batch
+        self.wait_time = 0.0
+        self.num_batches_taken = 0
+
+    def start(self) -> 'BatchPrefetcher':
+        if self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name='BatchPrefetcher', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops the thread and drops the queued batches, so the batches after the next start are sampled afresh."""
+        self.stop_event.set()
+        if self.thread is not None:
+            # Unblock the thread if it's waiting to put a batch
+            while self.thread.is_alive():
+                try:
+                    self.batches.get_nowait()
+                except queue.Empty:
+                    pass
+                self.thread.join(timeout=0.1)
+            self.thread = None
+        while True:
+            try:
+                self.batches.get_nowait()
+            except queue.Empty:
+                break
+
+    def get(self) -> Transition:
+        """Returns the next batch on the device, blocks until one is ready."""
+        start = time.perf_counter()
+        while True:
+            try:
+                batch = self.batches.get(timeout=1)
+                break
+            except queue.Empty:
+                if self.error is not None:
+                    raise RuntimeError('Batch prefetching thread failed') from self.error
+        self.wait_time += time.perf_counter() - start
+        self.num_batches_taken += 1
+        return batch
+
+    def make_batch(self) -> Optional[Transition]:
+        """Samples one batch from the replay, and returns it as tensors on the device,
+        or None if the replay doesn't have enough samples."""
+        # The augmented batches are pinned after the transformation
+        pin_samples = self.pin_memory and not self.argumentation
+        with self.lock:
+            transitions = self.replay.sample(self.batch_size)
+            if transitions is None:
+                return None
+            # The sampled arrays are reused by the replay, so copy them while holding the lock
+            state, pi_prob, value = (
+                torch.from_numpy(x).pin_memory() if pin_samples else torch.from_numpy(x).clone() for x in transitions
+            )
+
+        if self.argumentation:
+            state, pi_prob, value = apply_random_transformation(self.unpack_states(state), pi_prob, value)
+            if self.pin_memory:
+                state, pi_prob, value = state.pin_memory(), pi_prob.pin_memory(), value.pin_memory()
+
+        return Transition(*(x.to(device=self.device, non_blocking=True) for x in (state, pi_prob, value)))
+
+    def _run(self) -> None:
+        try:
+            self._prefetch()
+        except Exception as error:
+            self.error = error
+
+    def _prefetch(self) -> None:
+        while not self.stop_event.is_set():
+            batch = self.make_batch()
+            if batch is None:
+                time.sleep(0.1)
+                continue
+            while not self.stop_event.is_set():
+                try:
+                    self.batches.put(batch, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
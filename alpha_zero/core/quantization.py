@@ -0,0 +1,100 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""INT8 quantization of the AlphaZero network for CPU inference.
+
+The residual tower and the conv layers of the heads use post-training static quantization (FX graph mode),
+where the Conv/BN/ReLU layers are fused and the activation ranges are calibrated on real game positions.
+The linear layers of the heads use dynamic quantization, since their activations are small and
+vary a lot between positions. The final Tanh of the value head stays in float32.
+"""
+import copy
+from typing import List, Union
+import numpy as np
+import torch
+from torch import nn
+from torch.ao.quantization import default_dynamic_qconfig, get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from alpha_zero.core.network import UnpackStates
+
+
+def _head_linear_module_names(network: nn.Module) -> List[str]:
+    """Returns the names of the linear layers inside the heads, and any ReLU directly after them,
+    as the ReLU is fused into the linear layer and must share the same qconfig."""
+    names = []
+    for head_name in ('policy_head', 'value_head'):
+        head = getattr(network, head_name)
+        layers = list(head.named_children())
+        for i, (name, module) in enumerate(layers):
+            if isinstance(module, nn.Linear):
+                names.append(f'{head_name}.{name}')
+                if i + 1 < len(layers) and isinstance(layers[i + 1][1], nn.ReLU):
+                    names.append(f'{head_name}.{layers[i + 1][0]}')
+    return names
+
+
+def _float_module_names(network: nn.Module) -> List[str]:
+    """Returns the names of the output activations which should stay in float32."""
+    return [f'value_head.{name}' for name, module in network.value_head.named_children() if isinstance(module, nn.Tanh)]
+
+
+def quantize_network(
+    network: nn.Module,
+    calibration_states: Union[np.ndarray, torch.Tensor],
+    batch_size: int = 64,
+    backend: str = 'x86',
+) -> nn.Module:
+    """Returns an INT8 quantized copy of the AlphaZero network for CPU inference.
+
+    Args:
+        network: the float32 AlphaZero network, which is left unchanged.
+        calibration_states: a batch of game positions [N, C, H, W] or bit packed states to calibrate the activation ranges,
+            for example sampled from the replay or the professional games.
+        batch_size: the batch size for running the calibration, default 64.
+        backend: the quantized engine, 'x86', 'fbgemm' for x86 CPU or 'qnnpack' for ARM CPU, default 'x86'.
+
+    Returns:
+        the quantized network, which runs on CPU and outputs the same (pi_logits, value) tuple as the network.
+
+    Raises:
+        ValueError:
+            if backend is not supported by the PyTorch build.
+            if calibration_states is empty.
+    """
+    if backend not in torch.backends.quantized.supported_engines:
+        raise ValueError(f'Expect backend to be one of {torch.backends.quantized.supported_engines}, got "{backend}"')
+    if len(calibration_states) == 0:
+        raise ValueError('Expect calibration_states to have at least one position, got none')
+
+    torch.backends.quantized.engine = backend
+
+    float_network = copy.deepcopy(network).to(device=torch.device('cpu'))
+    float_network.eval()
+
+    qconfig_mapping = get_default_qconfig_mapping(backend)
+    for name in _head_linear_module_names(float_network):
+        qconfig_mapping = qconfig_mapping.set_module_name(name, default_dynamic_qconfig)
+    for name in _float_module_names(float_network):
+        qconfig_mapping = qconfig_mapping.set_module_name(name, None)
+
+    calibration_states = torch.as_tensor(calibration_states)
+    # The unpacking has data dependent control flow, which can't be traced, it runs in float32 anyway
+    prepare_custom_config = {'non_traceable_module_class': [UnpackStates]}
+
+    with torch.no_grad():
+        prepared = prepare_fx(
+            float_network,
+            qconfig_mapping,
+            example_inputs=(calibration_states[:1],),
+            prepare_custom_config=prepare_custom_config,
+        )
+        for i in range(0, len(calibration_states), batch_size):
+            prepared(calibration_states[i : i + batch_size])
+        quantized = convert_fx(prepared)
+
+    quantized.eval()
+    return quantized
@@ -6,10 +6,14 @@
 
 """Replay components for training agents."""
 
-from typing import Mapping, Text, Any, NamedTuple, Optional, Sequence
+from typing import Mapping, Text, Any, NamedTuple, Optional, Sequence, Tuple, Union
+import json
+import os
 import numpy as np
 import snappy
 
+from alpha_zero.core.network import pack_states, unpack_states
+
 
 class Transition(NamedTuple):
     state: Optional[np.ndarray]
@@ -20,6 +24,18 @@ class Transition(NamedTuple):
 TransitionStructure = Transition(state=None, pi_prob=None, value=None)
 
 
+def stack_game(game_seq: Union[Sequence[Transition], Transition]) -> Transition:
+    """Stacks the transitions of a game into a single transition of arrays [L, ...],
+    a game which is already stacked (for example in shared memory) is returned as it is."""
+    if isinstance(game_seq, Transition):
+        return game_seq
+    return Transition(
+        state=np.stack([transition.state for transition in game_seq], axis=0),
+        pi_prob=np.stack([transition.pi_prob for transition in game_seq], axis=0),
+        value=np.array([transition.value for transition in game_seq], dtype=np.float32),
+    )
+
+
 def compress_array(array):
     """Compresses a numpy array with snappy."""
     return snappy.compress(array), array.shape, array.dtype
@@ -32,68 +48,275 @@ def uncompress_array(compressed):
     return np.frombuffer(byte_string, dtype=dtype).reshape(shape)
 
 
+def encode_sparse_policies(pi_probs: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Encodes a batch of dense policies [B, num_actions] into the top k action indices as uint16,
+    and their probabilities as float16, which are renormalized to sum to one."""
+    pi_probs = np.asarray(pi_probs, dtype=np.float32).reshape(-1, pi_probs.shape[-1])
+    if pi_probs.shape[-1] > np.iinfo(np.uint16).max + 1:
+        raise ValueError(f'Expect at most 65536 actions for the sparse policies, got {pi_probs.shape[-1]}')
+    if not 0 < top_k <= pi_probs.shape[-1]:
+        raise ValueError(f'Expect top_k to be in the range (0, {pi_probs.shape[-1]}], got {top_k}')
+
+    # The k indices are distinct, the ones with zero probability are harmless when decoding
+    indices = np.argpartition(-pi_probs, top_k - 1, axis=-1)[:, :top_k]
+    probs = np.take_along_axis(pi_probs, indices, axis=-1)
+    sums = probs.sum(axis=-1, keepdims=True)
+    probs = np.divide(probs, sums, out=probs, where=sums > 0)
+    return indices.astype(np.uint16), probs.astype(np.float16)
+
+
+def decode_sparse_policies(indices: np.ndarray, probs: np.ndarray, num_actions: int, out: np.ndarray = None) -> np.ndarray:
+    """Reverse of `encode_sparse_policies`, returns the dense float32 policies [B, num_actions],
+    optionally written into the `out` array."""
+    if out is None:
+        out = np.empty((len(indices), num_actions), dtype=np.float32)
+    out.fill(0)
+    np.put_along_axis(out, indices.astype(np.int64), probs.astype(np.float32), axis=-1)
+    return out
+
+
 class UniformReplay:
-    """Uniform replay, with circular buffer storage for flat named tuples."""
+    """Uniform replay, with circular buffer storage for flat named tuples.
+
+    The transitions are written in place into three preallocated arrays, the states as bit packed uint8,
+    the policies as float32 and the values as float32. The arrays are allocated on the first add,
+    once the shapes of the state and policy are known.
+
+    If `policy_top_k` is positive, the policies are stored sparsely as the top k action indices (uint16)
+    and probabilities (float16), and only densified when sampling. The MCTS search policy usually has
+    almost all the mass on a handful of moves, the rest is dropped and the kept probabilities are renormalized.
+
+    If `storage_dir` is set, the arrays are memory mapped `.npy` files in the directory, next to a small
+    `header.json` file with the write cursor and counters, which is only updated on `flush()`. A new instance
+    with the same `storage_dir` resumes from the files instantly, from the state of the last flush, and the buffer
+    can exceed the RAM, as the OS page cache keeps the hot data in memory. The learner flushes the replay every
+    `save_replay_interval` games, so the games added after the last flush are lost if the learner crashes.
+    """
+
+    header_file_name = 'header.json'
+    storage_array_names = ('states', 'pi_probs', 'pi_indices', 'values')
 
     def __init__(
         self,
         capacity: int,
         random_state: np.random.RandomState,  # pylint: disable=no-member
-        compress_data: bool = True,
+        policy_top_k: int = 0,
+        storage_dir: str = None,
     ):
         if capacity <= 0:
             raise ValueError(f'Expect capacity to be a positive integer, got {capacity}')
+        if policy_top_k < 0:
+            raise ValueError(f'Expect policy_top_k to be a non-negative integer, got {policy_top_k}')
         self.structure = TransitionStructure
         self.capacity = capacity
         self.random_state = random_state
-        self.compress_data = compress_data
-        self.storage = [None] * capacity
+        self.policy_top_k = policy_top_k
+        self.storage_dir = storage_dir
+
+        self.states = None
+        self.pi_probs = None
+        # The action indices of sparse policies
+        self.pi_indices = None
+        self.num_actions = None
+        self.values = None
+        # Names of the allocated storage arrays
+        self.array_names = []
+        # Reusable batch buffers, one for each batch size
+        self._batches = {}
 
         self.num_games_added = 0
         self.num_samples_added = 0
 
-    def add_game(self, game_seq: Sequence[Transition]) -> None:
-        """Add an entire game to replay."""
+        if self.storage_dir is not None:
+            os.makedirs(self.storage_dir, exist_ok=True)
+            if os.path.exists(os.path.join(self.storage_dir, self.header_file_name)):
+                self._open_storage()
 
-        for transition in game_seq:
-            self.add(transition)
+    def _allocate(self, name: str, shape: Tuple[int, ...], dtype: np.dtype) -> None:
+        """Allocates a zero filled storage array as attribute `name`, in memory or as a memory mapped file."""
+        if self.storage_dir is None:
+            array = np.zeros(shape, dtype=dtype)
+        else:
+            array = np.lib.format.open_memmap(os.path.join(self.storage_dir, f'{name}.npy'), 'w+', dtype, shape)
+        setattr(self, name, array)
+        self.array_names.append(name)
+
+    def _stored_state_shape(self) -> Optional[Tuple[int, ...]]:
+        """Returns the shape of a stored state, or None if it's only known from the first added state."""
+        return None
+
+    def _array_specs(self, state_shape: Tuple[int, ...], num_actions: int) -> Mapping[Text, Tuple[Tuple[int, ...], np.dtype]]:
+        """Returns the shape and dtype of each storage array, in the order of allocation."""
+        specs = {'states': ((self.capacity, *state_shape), np.dtype(np.uint8))}
+        if self.policy_top_k > 0:
+            top_k = min(self.policy_top_k, num_actions)
+            specs['pi_indices'] = ((self.capacity, top_k), np.dtype(np.uint16))
+            specs['pi_probs'] = ((self.capacity, top_k), np.dtype(np.float16))
+        else:
+            specs['pi_probs'] = ((self.capacity, num_actions), np.dtype(np.float32))
+        specs['values'] = ((self.capacity,), np.dtype(np.float32))
+        return specs
+
+    def _maybe_allocate(self, state: np.ndarray, pi_prob: np.ndarray) -> None:
+        if self.states is not None:
+            if state.shape != self.states.shape[1:] or pi_prob.shape[-1] != self.num_actions:
+                raise ValueError(
+                    f'Expect states of shape {self.states.shape[1:]} and policies of {self.num_actions} actions, '
+                    f'got {state.shape} and {pi_prob.shape[-1]}'
+                )
+            return
+        self.num_actions = pi_prob.shape[-1]
+        for name, (shape, dtype) in self._array_specs(state.shape, self.num_actions).items():
+            self._allocate(name, shape, dtype)
+
+    def _storage_config(self) -> Mapping[Text, Any]:
+        """Returns the replay options which must match when resuming from the storage directory, as JSON values."""
+        return {'replay_class': type(self).__name__, 'capacity': self.capacity, 'policy_top_k': self.policy_top_k}
+
+    def _open_storage(self) -> None:
+        """Resumes from the memory mapped arrays and the header in the storage directory."""
+        with open(os.path.join(self.storage_dir, self.header_file_name), 'r') as f:
+            header = json.load(f)
+        config = self._storage_config()
+        mismatches = [
+            f'{name} {value} (got {header.get(name)})' for name, value in config.items() if header.get(name) != value
+        ]
+        if mismatches:
+            raise ValueError(f'Expect replay storage "{self.storage_dir}" to have {", ".join(mismatches)}')
+
+        arrays = {
+            name: np.load(os.path.join(self.storage_dir, f'{name}.npy'), mmap_mode='r+') for name in header['arrays']
+        }
+        state_shape = self._stored_state_shape() or (arrays['states'].shape[1:] if 'states' in arrays else ())
+        expected_specs = self._array_specs(state_shape, header['num_actions'])
+        for name, (shape, dtype) in expected_specs.items():
+            if name not in arrays:
+                raise ValueError(f'Expect replay storage "{self.storage_dir}" to have array {name}, got none')
+            for spec in ((arrays[name].shape, arrays[name].dtype), tuple(header['arrays'][name])):
+                if tuple(spec[0]) != shape or np.dtype(spec[1]) != dtype:
+                    raise ValueError(
+                        f'Expect array {name} of replay storage "{self.storage_dir}" to have shape {shape} and dtype {dtype}, '
+                        f'got {tuple(spec[0])} and {np.dtype(spec[1])}'
+                    )
+
+        self.num_games_added = header['num_games_added']
+        self.num_samples_added = header['num_samples_added']
+        self.num_actions = header['num_actions']
+        self.array_names = list(expected_specs.keys())
+        for name in self.array_names:
+            setattr(self, name, arrays[name])
+
+    def _write_header(self) -> None:
+        """Writes the options, counters and array specs to the header file, it's synced to disk then replaced atomically,
+        so a crash never leaves a partial header."""
+        header = {
+            **self._storage_config(),
+            'num_games_added': self.num_games_added,
+            'num_samples_added': self.num_samples_added,
+            'num_actions': self.num_actions,
+            'arrays': {name: [list(getattr(self, name).shape), getattr(self, name).dtype.str] for name in self.array_names},
+        }
+        header_file = os.path.join(self.storage_dir, self.header_file_name)
+        with open(header_file + '.tmp', 'w') as f:
+            json.dump(header, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(header_file + '.tmp', header_file)
+
+    def flush(self) -> None:
+        """Writes the memory mapped arrays to disk, then the header. The replay is resumed from the last flush,
+        even if the OS crashes, as the header is only written after the arrays."""
+        if self.storage_dir is None:
+            return
+        for name in self.array_names:
+            getattr(self, name).flush()
+        self._write_header()
+
+    def _write_policies(self, indices: np.ndarray, pi_probs: np.ndarray) -> None:
+        if self.pi_indices is None:
+            self.pi_probs[indices] = pi_probs
+            return
+        self.pi_indices[indices], self.pi_probs[indices] = encode_sparse_policies(pi_probs, self.pi_probs.shape[-1])
+
+    def _read_policies(self, indices: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        if self.pi_indices is None:
+            return np.take(self.pi_probs, indices, axis=0, out=out)
+        return decode_sparse_policies(self.pi_indices[indices], self.pi_probs[indices], self.num_actions, out)
+
+    def add_game(self, game_seq: Union[Sequence[Transition], Transition]) -> None:
+        """Add an entire game to replay, either a sequence of transitions, or a single transition of stacked arrays."""
+        if len(game_seq) == 0:
+            return
+
+        states, pi_probs, values = stack_game(game_seq)
+        if len(states) == 0:
+            return
+        # The actors send the states as packed bits already
+        if states.dtype != np.uint8:
+            states = pack_states(states)
+        self._maybe_allocate(states[0], pi_probs[0])
+
+        # Only the most recent transitions are kept if the game is longer than the capacity
+        game_length = len(states)
+        indices = (self.num_samples_added + np.arange(game_length)) % self.capacity
+        self.states[indices[-self.capacity :]] = states[-self.capacity :]
+        self._write_policies(indices[-self.capacity :], pi_probs[-self.capacity :])
+        self.values[indices[-self.capacity :]] = values[-self.capacity :]
+        self.num_samples_added += game_length
 
         self.num_games_added += 1
 
     def add(self, transition: Any) -> None:
         """Adds single transition to replay."""
+        transition = self.encoder(transition)
+        self._maybe_allocate(transition.state, transition.pi_prob)
+
         index = self.num_samples_added % self.capacity
-        self.storage[index] = self.encoder(transition)
+        self.states[index] = transition.state
+        self._write_policies([index], transition.pi_prob[None, ...])
+        self.values[index] = transition.value
         self.num_samples_added += 1
 
     def get(self, indices: Sequence[int]) -> Sequence[Transition]:
-        """Retrieves items by indices."""
-        return [self.decoder(self.storage[i]) for i in indices]
+        """Retrieves items by indices, the states are bit packed."""
+        indices = np.asarray(indices, dtype=np.int64)
+        pi_probs = self._read_policies(indices)
+        return [
+            Transition(state=self.states[i], pi_prob=pi_prob, value=float(self.values[i]))
+            for i, pi_prob in zip(indices, pi_probs)
+        ]
 
     def sample(self, batch_size: int) -> Transition:
-        """Samples batch of items from replay uniformly, with replacement."""
+        """Samples batch of items from replay uniformly, with replacement.
+
+        The states are bit packed, see `alpha_zero.core.network.UnpackStates`. The returned arrays are reused,
+        and overwritten by the next call with the same batch size.
+        """
         if self.size < batch_size:
             return
 
         indices = self.random_state.randint(low=0, high=self.size, size=batch_size)
-        samples = self.get(indices)
 
-        transposed = zip(*samples)
-        stacked = [np.stack(xs, axis=0) for xs in transposed]  # Stack on batch dimension (0)
-        return type(self.structure)(*stacked)
+        batch = self.get_batch_buffers(batch_size, self.states.shape[1:])
+        np.take(self.states, indices, axis=0, out=batch.state)
+        self._read_policies(indices, out=batch.pi_prob)
+        np.take(self.values, indices, axis=0, out=batch.value)
+        return batch
 
-    def encoder(self, transition: Transition) -> Transition:
-        if self.compress_data:
-            return transition._replace(
-                state=compress_array(transition.state),
+    def get_batch_buffers(self, batch_size: int, state_shape: Tuple[int, ...]) -> Transition:
+        """Returns the reusable batch buffers for the batch size."""
+        if batch_size not in self._batches:
+            self._batches[batch_size] = Transition(
+                state=np.empty((batch_size, *state_shape), dtype=np.uint8),
+                pi_prob=np.empty((batch_size, self.num_actions), dtype=np.float32),
+                value=np.empty((batch_size,), dtype=self.values.dtype),
             )
-        return transition
+        return self._batches[batch_size]
 
-    def decoder(self, transition: Transition) -> Transition:
-        if self.compress_data:
-            return transition._replace(
-                state=uncompress_array(transition.state),
-            )
+    def encoder(self, transition: Transition) -> Transition:
+        # The actors send the states as packed bits already
+        if transition.state.dtype != np.uint8:
+            return transition._replace(state=pack_states(transition.state))
         return transition
 
     def get_state(self) -> Mapping[Text, Any]:
@@ -101,16 +324,239 @@ class UniformReplay:
         return {
             'num_games_added': self.num_games_added,
             'num_samples_added': self.num_samples_added,
-            'storage': self.storage,
+            'states': self.states,
+            'pi_probs': self.pi_probs,
+            'pi_indices': self.pi_indices,
+            'num_actions': self.num_actions,
+            'values': self.values,
         }
 
     def set_state(self, state: Mapping[Text, Any]) -> None:
         """Sets replay state from a (potentially de-serialized) dictionary."""
         self.num_games_added = state['num_games_added']
         self.num_samples_added = state['num_samples_added']
-        self.storage = state['storage']
+        self._batches = {}
+
+        for name in self.storage_array_names:
+            setattr(self, name, None)
+        self.array_names = []
+
+        if 'storage' in state:
+            # Replay state saved by older versions, which stores a list of transitions
+            for i, transition in enumerate(state['storage']):
+                if transition is None:
+                    continue
+                if isinstance(transition.state, tuple):  # Compressed
+                    transition = transition._replace(state=uncompress_array(transition.state))
+                transition = self.encoder(transition)
+                self._maybe_allocate(transition.state, transition.pi_prob)
+                index = i % self.capacity
+                self.states[index] = transition.state
+                self._write_policies([index], transition.pi_prob[None, ...])
+                self.values[index] = transition.value
+            self.flush()
+            return
+
+        for name in self.storage_array_names:
+            array = state.get(name, None)
+            if array is None:
+                continue
+            if self.storage_dir is None:
+                setattr(self, name, array)
+                self.array_names.append(name)
+            else:
+                self._allocate(name, array.shape, array.dtype)
+                getattr(self, name)[:] = array
+        self.num_actions = state.get('num_actions', None)
+        if self.num_actions is None and self.pi_probs is not None:
+            self.num_actions = self.pi_probs.shape[-1]
+        self.flush()
 
     @property
     def size(self) -> int:
         """Number of items currently contained in replay."""
         return min(self.num_samples_added, self.capacity)
+
+
+class GameReplay(UniformReplay):
+    """Uniform replay which stores the board position of each move only once, instead of the stacked history planes.
+
+    For each transition, it stores the black and white stones of the latest board position as bit packed planes,
+    the color to play, and the move number in the game. The stacked observation of a sampled transition
+    is rebuilt from the board positions of the previous moves in the same game, following `BoardGameEnv.stack_planes`.
+    This assumes the transitions of a game are added in order, one for each move, as recorded by the actors,
+    either as an entire game with `add_game`, or one by one with `add`.
+    """
+
+    storage_array_names = UniformReplay.storage_array_names + ('black_to_play', 'move_numbers')
+
+    def __init__(
+        self,
+        capacity: int,
+        random_state: np.random.RandomState,  # pylint: disable=no-member
+        input_shape: Tuple[int, int, int],
+        policy_top_k: int = 0,
+        storage_dir: str = None,
+    ):
+        if len(input_shape) != 3 or input_shape[0] % 2 != 1:
+            raise ValueError(f'Expect input_shape to be (2 * num_stack + 1, board_size, board_size), got {input_shape}')
+
+        self.input_shape = tuple(input_shape)
+        self.num_stack = (input_shape[0] - 1) // 2
+        self.board_shape = tuple(input_shape[1:])
+
+        self.black_to_play = None
+        self.move_numbers = None
+        # The arrays are opened by the base class when resuming from the storage directory
+        super().__init__(capacity, random_state, policy_top_k, storage_dir)
+
+    def _stored_state_shape(self) -> Optional[Tuple[int, ...]]:
+        return ((2 * int(np.prod(self.board_shape)) + 7) // 8,)
+
+    def _array_specs(self, state_shape: Tuple[int, ...], num_actions: int) -> Mapping[Text, Tuple[Tuple[int, ...], np.dtype]]:
+        specs = super()._array_specs(state_shape, num_actions)
+        specs['black_to_play'] = ((self.capacity,), np.dtype(np.bool_))
+        specs['move_numbers'] = ((self.capacity,), np.dtype(np.int32))
+        return specs
+
+    def _storage_config(self) -> Mapping[Text, Any]:
+        return {**super()._storage_config(), 'input_shape': list(self.input_shape)}
+
+    def _encode_boards(self, states: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the packed [black stones, white stones] planes of the latest board position,
+        and the color to play for the batch of stacked observations."""
+        if states.dtype == np.uint8:
+            states = unpack_states(states, self.input_shape)
+        black_to_play = states[:, -1, 0, 0] == 1
+        to_play_stones, opponent_stones = states[:, 0], states[:, 1]
+        black_to_play_mask = black_to_play[:, None, None]
+        boards = np.stack(
+            [
+                np.where(black_to_play_mask, to_play_stones, opponent_stones),
+                np.where(black_to_play_mask, opponent_stones, to_play_stones),
+            ],
+            axis=1,
+        )
+        return pack_states(boards), black_to_play
+
+    def _write(self, indices: np.ndarray, game: Transition, move_numbers: np.ndarray) -> None:
+        boards, black_to_play = self._encode_boards(game.state)
+        self._maybe_allocate(boards[0], game.pi_prob[0])
+
+        self.states[indices] = boards
+        self.black_to_play[indices] = black_to_play
+        self.move_numbers[indices] = move_numbers
+        self._write_policies(indices, game.pi_prob)
+        self.values[indices] = game.value
+
+    def add_game(self, game_seq: Union[Sequence[Transition], Transition]) -> None:
+        """Add an entire game to replay, either a sequence of transitions, or a single transition of stacked arrays,
+        the transitions must be in the order of the moves."""
+        if len(game_seq) == 0:
+            return
+
+        game = stack_game(game_seq)
+        if len(game.state) == 0:
+            return
+
+        # Only the most recent transitions are kept if the game is longer than the capacity
+        game_length = len(game.state)
+        indices = (self.num_samples_added + np.arange(game_length)) % self.capacity
+        move_numbers = np.arange(game_length)
+        game = Transition(*(x[-self.capacity :] for x in game))
+        self._write(indices[-self.capacity :], game, move_numbers[-self.capacity :])
+        self.num_samples_added += game_length
+
+        self.num_games_added += 1
+
+    def add(self, transition: Any) -> None:
+        """Adds single transition to replay, the transitions of a game must be added in the order of the moves.
+
+        The move number is one after the previous transition in storage, or zero if the stacked observation has no stones,
+        which is the start of a new game.
+        """
+        state = transition.state
+        if state.dtype == np.uint8:
+            state = unpack_states(state, self.input_shape)
+        if self.num_samples_added == 0 or not state[:-1].any():
+            move_number = 0
+        else:
+            move_number = self.move_numbers[(self.num_samples_added - 1) % self.capacity] + 1
+
+        index = self.num_samples_added % self.capacity
+        game = Transition(state=state[None, ...], pi_prob=transition.pi_prob[None, ...], value=transition.value)
+        self._write(np.array([index]), game, np.array([move_number]))
+        self.num_samples_added += 1
+
+    def stack_planes(self, indices: np.ndarray) -> np.ndarray:
+        """Returns the bit packed stacked observations for the storage indices, vectorized over the batch."""
+        batch_size = len(indices)
+        history = np.arange(self.num_stack)
+        # [B, num_stack], the storage index for each history board, the latest one first
+        history_indices = (indices[:, None] - history[None, :]) % self.capacity
+        # Boards before the start of the game are empty
+        is_valid = history[None, :] <= self.move_numbers[indices][:, None]
+
+        num_bits = 2 * int(np.prod(self.board_shape))
+        boards = np.unpackbits(self.states[history_indices], axis=-1, count=num_bits)
+        boards = boards.reshape(batch_size, self.num_stack, 2, *self.board_shape)
+        boards *= is_valid[:, :, None, None, None]
+
+        black_to_play = self.black_to_play[indices]
+        black_to_play_mask = black_to_play[:, None, None, None]
+        features = np.empty((batch_size, *self.input_shape), dtype=np.uint8)
+        # Current player first, then the opponent
+        features[:, :-1:2] = np.where(black_to_play_mask, boards[:, :, 0], boards[:, :, 1])
+        features[:, 1:-1:2] = np.where(black_to_play_mask, boards[:, :, 1], boards[:, :, 0])
+        features[:, -1] = black_to_play[:, None, None]
+        return pack_states(features)
+
+    def _sample_range(self) -> Tuple[int, int]:
+        """Returns the range of the positions to sample, counting from the oldest position in storage."""
+        if self.num_samples_added <= self.capacity:
+            return 0, self.size
+        # Once the storage wraps around, the history of the oldest positions could have been overwritten
+        return self.num_stack - 1, self.capacity
+
+    def get(self, indices: Sequence[int]) -> Sequence[Transition]:
+        """Retrieves items by indices, the stacked states are bit packed."""
+        indices = np.asarray(indices, dtype=np.int64)
+        states = self.stack_planes(indices)
+        pi_probs = self._read_policies(indices)
+        return [
+            Transition(state=state, pi_prob=pi_prob, value=float(self.values[i]))
+            for state, pi_prob, i in zip(states, pi_probs, indices)
+        ]
+
+    def sample(self, batch_size: int) -> Transition:
+        """Samples batch of items from replay uniformly, with replacement.
+
+        The states are bit packed, see `alpha_zero.core.network.UnpackStates`. The returned arrays are reused,
+        and overwritten by the next call with the same batch size.
+        """
+        low, high = self._sample_range()
+        if high - low < batch_size:
+            return
+
+        oldest = self.num_samples_added % self.capacity if self.num_samples_added > self.capacity else 0
+        indices = (oldest + self.random_state.randint(low=low, high=high, size=batch_size)) % self.capacity
+
+        batch = self.get_batch_buffers(batch_size, ((int(np.prod(self.input_shape)) + 7) // 8,))
+        batch.state[:] = self.stack_planes(indices)
+        self._read_policies(indices, out=batch.pi_prob)
+        np.take(self.values, indices, axis=0, out=batch.value)
+        return batch
+
+    def get_state(self) -> Mapping[Text, Any]:
+        """Retrieves replay state as a dictionary (e.g. for serialization)."""
+        return {
+            **super().get_state(),
+            'black_to_play': self.black_to_play,
+            'move_numbers': self.move_numbers,
+        }
+
+    def set_state(self, state: Mapping[Text, Any]) -> None:
+        """Sets replay state from a (potentially de-serialized) dictionary."""
+        if 'move_numbers' not in state:
+            raise ValueError('Expect replay state saved by GameReplay, got replay state without the move numbers')
+        super().set_state(state)
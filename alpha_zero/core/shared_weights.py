@@ -0,0 +1,101 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Shared memory buffer to broadcast the network weights of each checkpoint from the learner to the actors and evaluator.
+
+The learner publishes the weights once into the buffer and increases the version counter. The actors and evaluator
+copy the weights in place into their own networks when the version changes. So there's no file I/O and unpickling
+for each checkpoint, and the optimizer and learning rate scheduler states are never loaded.
+"""
+import ctypes
+import multiprocessing as mp
+from typing import Any, Mapping, Text, Tuple
+import torch
+from torch import nn
+
+
+class SharedWeights:
+    """The state dict of a network in shared memory with a version counter, which can be passed to the child processes."""
+
+    def __init__(self, network: nn.Module) -> None:
+        """
+        Args:
+            network: the network to create the buffer for, only the names, shapes and dtypes of its state dict are used.
+        """
+        # The offset of each tensor in the buffer, aligned to 8 bytes
+        self.layout = []
+        num_bytes = 0
+        for name, tensor in network.state_dict().items():
+            self.layout.append((name, tuple(tensor.shape), tensor.dtype, num_bytes))
+            num_bytes += (tensor.numel() * tensor.element_size() + 7) // 8 * 8
+
+        # Version 0 means no weights have been published
+        self.buffer = mp.RawArray(ctypes.c_uint8, max(num_bytes, 1))
+        self.raw_version = mp.RawValue(ctypes.c_int64, 0)
+        self.raw_training_steps = mp.RawValue(ctypes.c_int64, 0)
+        self.lock = mp.Lock()
+
+        self._tensors = None
+
+    def __getstate__(self) -> Mapping[Text, Any]:
+        # The tensor views are created again in the child process
+        state = self.__dict__.copy()
+        state['_tensors'] = None
+        return state
+
+    @property
+    def tensors(self) -> Mapping[Text, torch.Tensor]:
+        """The tensor views of the shared buffer, by the names of the state dict."""
+        if self._tensors is None:
+            buffer = torch.frombuffer(self.buffer, dtype=torch.uint8)
+            self._tensors = {}
+            for name, shape, dtype, offset in self.layout:
+                num_bytes = int(torch.Size(shape).numel()) * torch.empty((), dtype=dtype).element_size()
+                self._tensors[name] = buffer[offset : offset + num_bytes].view(dtype).view(shape)
+        return self._tensors
+
+    @property
+    def version(self) -> int:
+        """The version of the published weights, which is cheap to poll."""
+        return self.raw_version.value
+
+    def _check_network(self, network: nn.Module) -> Mapping[Text, torch.Tensor]:
+        state_dict = network.state_dict()
+        if [(name, tuple(tensor.shape)) for name, tensor in state_dict.items()] != [
+            (name, shape) for name, shape, *_ in self.layout
+        ]:
+            raise ValueError('Expect the network to have the same state dict names and shapes as the shared weights')
+        return state_dict
+
+    @torch.no_grad()
+    def publish(self, network: nn.Module, training_steps: int) -> int:
+        """Copies the weights of the network into the shared buffer, and returns the new version.
+
+        Raises:
+            ValueError:
+                if the state dict of the network doesn't match the shared weights.
+        """
+        state_dict = self._check_network(network)
+        with self.lock:
+            for name, tensor in state_dict.items():
+                self.tensors[name].copy_(tensor)
+            self.raw_training_steps.value = training_steps
+            self.raw_version.value += 1
+            return self.raw_version.value
+
+    @torch.no_grad()
+    def load(self, network: nn.Module) -> Tuple[int, int]:
+        """Copies the published weights in place into the network, and returns the version and training steps.
+
+        Raises:
+            ValueError:
+                if the state dict of the network doesn't match the shared weights.
+        """
+        state_dict = self._check_network(network)
+        with self.lock:
+            for name, tensor in state_dict.items():
+                tensor.copy_(self.tensors[name])
+            return self.raw_version.value, self.raw_training_steps.value
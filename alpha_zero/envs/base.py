@@ -4,6 +4,7 @@
 # See the accompanying LICENSE file for details.
 
 
+import abc
 from typing import Iterable, Tuple, Mapping, Text
 from collections import deque, namedtuple
 import os
@@ -23,6 +24,104 @@ class PlayerMove(namedtuple('PlayerMove', ['color', 'move'])):
     pass
 
 
+class MoveHistory:
+    """A persistent list of the game moves, which supports append and cheap cloning.
+
+    The moves are stored as a linked list of immutable nodes (move, previous node), so a cloned history shares
+    all the existing nodes with the original one, and appending to one of them does not affect the other.
+    """
+
+    __slots__ = ('_head', '_len')
+
+    def __init__(self, moves: Iterable[PlayerMove] = ()) -> None:
+        self._head = None
+        self._len = 0
+        for move in moves:
+            self.append(move)
+
+    def append(self, move: PlayerMove) -> None:
+        self._head = (move, self._head)
+        self._len += 1
+
+    def clear(self) -> None:
+        self._head = None
+        self._len = 0
+
+    def clone(self) -> 'MoveHistory':
+        history = object.__new__(MoveHistory)
+        history._head = self._head
+        history._len = self._len
+        return history
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self):
+        moves = []
+        node = self._head
+        while node is not None:
+            moves.append(node[0])
+            node = node[1]
+        return reversed(moves)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('MoveHistory index out of range')
+        # Recent moves are closest to the head
+        node = self._head
+        for _ in range(self._len - 1 - index):
+            node = node[1]
+        return node[0]
+
+    def __deepcopy__(self, memodict={}):
+        # The nodes are immutable, so it's safe to share them
+        return self.clone()
+
+    def __reduce__(self):
+        return (MoveHistory, (list(self),))
+
+    def __repr__(self) -> str:
+        return f'MoveHistory({list(self)})'
+
+
+class LazyObservation:
+    """A handle to the stacked observation of a state, the feature planes are only built when materialized.
+
+    This is used during MCTS search, where most of the intermediate positions
+    are never sent to the neural network for evaluation.
+    """
+
+    __slots__ = ('env', 'board_deltas', 'to_play', 'obs')
+
+    def __init__(self, env: 'BoardGameEnv', board_deltas: Tuple[np.ndarray], to_play: int) -> None:
+        """
+        Args:
+            env: the environment which created the handle.
+            board_deltas: a snapshot of the last N board positions, the latest one at index 0.
+            to_play: the id of the current player.
+        """
+        self.env = env
+        self.board_deltas = board_deltas
+        self.to_play = to_play
+        self.obs = None
+
+    def materialize(self) -> np.ndarray:
+        """Returns the stacked observation, the planes are built once on the first call."""
+        if self.obs is None:
+            self.obs = self.env.stack_planes(self.board_deltas, self.to_play)
+        return self.obs
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        obs = self.materialize()
+        if dtype is not None:
+            return obs.astype(dtype)
+        return obs
+
+
 class BoardGameEnv(gym.Env):
     """Basic board game environment implemented using OpenAI Gym api."""
 
@@ -76,6 +175,9 @@ class BoardGameEnv(gym.Env):
         # Legal actions mask, where '1' represents a legal action and '0' represents a illegal action
         self.legal_actions = np.ones(self.action_dim, dtype=np.int8).flatten()
 
+        # If true, `step` returns a `LazyObservation` handle instead of the stacked observation
+        self.return_lazy_obs = False
+
         self.to_play = self.black_player
 
         self.steps = 0
@@ -86,7 +188,7 @@ class BoardGameEnv(gym.Env):
         # Save last N board, so we can stack history planes
         self.board_deltas = self.get_empty_queue()
 
-        self.history: Iterable[PlayerMove] = []
+        self.history = MoveHistory()
 
         self.gtp_columns = 'ABCDEFGHJKLMNOPQRSTUVWXYZ'
         self.gtp_rows = [str(i) for i in range(self.board_size, -1, -1)]
@@ -153,13 +255,30 @@ class BoardGameEnv(gym.Env):
 
         self.board_deltas = self.get_empty_queue()
 
-        del self.history[:]
+        self.history.clear()
 
         # Reset Zobrist hash
         self.current_hash = self.compute_zobrist_hash()
 
         return self.observation()
 
+    def clone(self) -> 'BoardGameEnv':
+        """Returns a copy of the environment for simulation, which is much cheaper than `copy.deepcopy`.
+
+        The immutable states like the zobrist tables, coords convertor and gym spaces are shared by reference,
+        the move history is shared by the persistent storage, and only the mutable board states are copied.
+        Subclasses with additional mutable states should override this method.
+        """
+        env = object.__new__(type(self))
+        env.__dict__.update(self.__dict__)
+
+        env.board = self.board.copy()
+        env.legal_actions = self.legal_actions.copy()
+        # The board positions inside the queue are never modified in place, so no need to copy them
+        env.board_deltas = deque(self.board_deltas, maxlen=self.num_stack)
+        env.history = self.history.clone()
+        return env
+
     def render(self, mode='terminal'):
         """Prints out the board to terminal or ansi."""
         board = np.copy(self.board)
@@ -277,12 +396,12 @@ class BoardGameEnv(gym.Env):
         else:
             self.current_hash ^= self.zobrist_player[-1]
 
-        return self.observation(), 0, False, {}
+        return self.step_observation(), 0, False, {}
 
     def close(self):
         """Clean up deques"""
         self.board_deltas.clear()
-        del self.history[:]
+        self.history.clear()
 
         return super().close()
 
@@ -304,18 +423,35 @@ class BoardGameEnv(gym.Env):
         Returns a 3D tensor with the dimension [N, board_size, board_size],
             where N = 2 x num_stack + 1
         """
+        return self.stack_planes(self.board_deltas, self.to_play)
+
+    def lazy_observation(self) -> LazyObservation:
+        """Returns a handle to the current observation, which only stacks the planes when materialized."""
+        # The board deltas are always new copies, so a shallow snapshot of the queue is enough
+        return LazyObservation(self, tuple(self.board_deltas), self.to_play)
+
+    def step_observation(self) -> np.ndarray:
+        """Returns the observation for the `step` method, which could be a lazy handle."""
+        if self.return_lazy_obs:
+            return self.lazy_observation()
+        return self.observation()
+
+    def stack_planes(self, board_deltas: Iterable[np.ndarray], to_play: int) -> np.ndarray:
+        """Stack the history board positions into feature planes from the `to_play` player's perspective."""
+        opponent_player = self.white_player if to_play == self.black_player else self.black_player
+
         # Create an empty array to hold the stacked planes, with shape (16, 19, 19)
         features = np.zeros((self.num_stack * 2, self.board_size, self.board_size), dtype=np.int8)
 
-        deltas = np.array(self.board_deltas)
+        deltas = np.array(board_deltas)
 
         # Current player first, then the opponent
-        features[::2] = deltas == self.to_play
-        features[1::2] = deltas == self.opponent_player
+        features[::2] = deltas == to_play
+        features[1::2] = deltas == opponent_player
 
         # Color to play is a plane with all zeros for white, ones for black.
         color_to_play = np.zeros((1, self.board_size, self.board_size), dtype=np.int8)
-        if self.to_play == self.black_player:
+        if to_play == self.black_player:
             color_to_play += 1
 
         # Using [C, H, W] channel first for PyTorch
@@ -426,4 +562,185 @@ class BoardGameEnv(gym.Env):
 
     def to_sgf(self) -> str:
         """Game record to sgf content"""
-        return
\ No newline at end of file
+        return
+
+
+class VecBoardGameEnv(abc.ABC):
+    """Steps a batch of B games of the same board game in lockstep.
+
+    All the games are stored in batched NumPy arrays, like the boards with shape [B, N, N],
+    the legal actions masks with shape [B, action_dim], and the last N board positions with shape [B, num_stack, N, N].
+    So the per-move work like updating the boards and building the observations are done as a few NumPy ops over all games.
+
+    Games that are already over are not stepped, their actions are ignored and the rewards are always zero,
+    call `reset` with the indices of those games to start new ones.
+    """
+
+    def __init__(
+        self,
+        num_envs: int,
+        board_size: int = 15,
+        num_stack: int = 8,
+        black_player_id: int = 1,
+        white_player_id: int = 2,
+        has_pass_move: bool = False,
+        has_resign_move: bool = False,
+        id: str = '',
+    ) -> None:
+        """
+        Args:
+            num_envs: number of games B.
+            board_size: board size, default 15.
+            num_stack: stack last N history states, default 8.
+            black_player_id: id and the stone color for black player, default 1.
+            white_player_id: id and the stone color for white player, default 2.
+            has_pass_move: the game has pass move, default off.
+            has_resign_move: the game has resign move, default off.
+            id: environment id or name.
+        """
+        assert black_player_id != white_player_id != 0, 'player ids can not be the same, and can not be zero'
+        if num_envs < 1:
+            raise ValueError(f'Expect num_envs to be positive integer, got {num_envs}')
+
+        self.id = id
+        self.num_envs = num_envs
+        self.board_size = board_size
+        self.num_stack = num_stack
+
+        self.black_player = black_player_id
+        self.white_player = white_player_id
+
+        # The spaces are for a single game
+        self.observation_space = Box(
+            low=0,
+            high=1,
+            shape=(self.num_stack * 2 + 1, self.board_size, self.board_size),
+            dtype=np.int8,
+        )
+
+        self.has_pass_move = has_pass_move
+        self.has_resign_move = has_resign_move
+
+        self.action_dim = self.board_size**2 + 1 if self.has_pass_move else self.board_size**2
+        self.action_space = Discrete(self.action_dim)
+
+        self.pass_move = self.action_space.n - 1 if self.has_pass_move else None
+        self.resign_move = -1 if self.has_resign_move else None
+
+        self.cc = CoordsConvertor(self.board_size)
+
+        self.boards = np.zeros((self.num_envs, self.board_size, self.board_size), dtype=np.int8)
+        self.board_deltas = np.zeros((self.num_envs, self.num_stack, self.board_size, self.board_size), dtype=np.int8)
+        self.legal_actions = np.ones((self.num_envs, self.action_dim), dtype=np.int8)
+        self.to_play = np.full(self.num_envs, self.black_player, dtype=np.int8)
+        self.steps = np.zeros(self.num_envs, dtype=np.int64)
+        self.dones = np.zeros(self.num_envs, dtype=np.bool_)
+        # Zero means no winner
+        self.winner = np.zeros(self.num_envs, dtype=np.int8)
+        self.last_player = np.zeros(self.num_envs, dtype=np.int8)
+        self.last_move = np.full(self.num_envs, -2, dtype=np.int64)
+
+        # Moves played in every game, for making sgf records
+        self.moves = [[] for _ in range(self.num_envs)]
+
+    def reset(self, indices: Iterable[int] = None) -> np.ndarray:
+        """Reset the games at the given indices to initial state, or all games if indices is None.
+
+        Returns:
+            the observations of all games.
+        """
+        indices = self._get_indices(indices)
+
+        self.boards[indices] = 0
+        self.board_deltas[indices] = 0
+        self.legal_actions[indices] = 1
+        self.to_play[indices] = self.black_player
+        self.steps[indices] = 0
+        self.dones[indices] = False
+        self.winner[indices] = 0
+        self.last_player[indices] = 0
+        self.last_move[indices] = -2
+        for i in indices:
+            self.moves[i] = []
+
+        return self.observation()
+
+    @abc.abstractmethod
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+        """Plays one move for every game which is not over.
+
+        Args:
+            actions: the actions for all the games with shape [B, ].
+
+        Returns:
+            a tuple of (observations, rewards, dones, info), where the rewards are from the last player's perspective.
+        """
+
+    def _get_indices(self, indices: Iterable[int] = None) -> np.ndarray:
+        if indices is None:
+            return np.arange(self.num_envs)
+        return np.asarray(indices, dtype=np.int64).reshape(-1)
+
+    def _check_actions(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the indices of the games which are not over, and their actions."""
+        actions = np.asarray(actions, dtype=np.int64).reshape(-1)
+        if actions.shape != (self.num_envs,):
+            raise ValueError(f'Expect actions to have shape ({self.num_envs},), got {actions.shape}')
+
+        indices = np.flatnonzero(~self.dones)
+        actions = actions[indices]
+
+        is_resign = actions == self.resign_move if self.has_resign_move else np.zeros(len(actions), dtype=np.bool_)
+        moves = actions[~is_resign]
+        if np.any((moves < 0) | (moves >= self.action_dim)):
+            raise ValueError(f'Invalid actions. The actions {moves} are out of bound.')
+        if np.any(self.legal_actions[indices[~is_resign], moves] != 1):
+            raise ValueError(f'Illegal actions {moves}.')
+
+        return indices, actions
+
+    def _push_boards(self, indices: np.ndarray) -> None:
+        """Make sure the latest board position is always at index 0 for the given games."""
+        self.board_deltas[indices, 1:] = self.board_deltas[indices, :-1]
+        self.board_deltas[indices, 0] = self.boards[indices]
+
+    def _record_moves(self, indices: np.ndarray, players: np.ndarray, actions: np.ndarray) -> None:
+        for i, player, action in zip(indices.tolist(), players.tolist(), actions.tolist()):
+            if action != self.resign_move:
+                self.moves[i].append(PlayerMove(color=self.get_player_name_by_id(player), move=action))
+
+    def observation(self) -> np.ndarray:
+        """Stack N history of feature planes and one plane represent the color to play for all games.
+
+        Same as `BoardGameEnv.observation`, the stack order is [Xt, Yt, Xt-1, Yt-1, Xt-2, Yt-2, ..., C]
+
+        Returns a 4D tensor with the dimension [B, N, board_size, board_size], where N = 2 x num_stack + 1
+        """
+        to_play = self.to_play[:, None, None, None]
+        opponent = np.where(to_play == self.black_player, self.white_player, self.black_player)
+
+        stacked_obs = np.empty((self.num_envs, self.num_stack * 2 + 1, self.board_size, self.board_size), dtype=np.int8)
+        stacked_obs[:, 0:-1:2] = self.board_deltas == to_play
+        stacked_obs[:, 1:-1:2] = self.board_deltas == opponent
+        stacked_obs[:, -1] = to_play[:, 0] == self.black_player
+        return stacked_obs
+
+    @property
+    def opponent_player(self) -> np.ndarray:
+        return np.where(self.to_play == self.black_player, self.white_player, self.black_player).astype(np.int8)
+
+    def get_player_name_by_id(self, id) -> str:
+        if id == self.black_player:
+            return 'B'
+        elif id == self.white_player:
+            return 'W'
+        else:
+            return None
+
+    def get_result_string(self, index: int) -> str:
+        """Game result for the game at index, where B+ indicates black won, W+ white won."""
+        return ''
+
+    def to_sgf(self, index: int) -> str:
+        """Game record to sgf content for the game at index."""
+        return
@@ -5,12 +5,12 @@
 
 
 """Go env class."""
-from typing import Tuple, Mapping, Text
+from typing import Iterable, Tuple, Mapping, Text
 import re
-from copy import copy
+from copy import copy, deepcopy
 import numpy as np
 
-from alpha_zero.envs.base import BoardGameEnv
+from alpha_zero.envs.base import BoardGameEnv, VecBoardGameEnv
 from alpha_zero.envs import go_engine as go
 from alpha_zero.utils import sgf_wrapper
 from alpha_zero.utils.util import get_time_stamp
@@ -32,7 +32,8 @@ class GoEnv(BoardGameEnv):
     Failure to capture these stones will result in them being scored as if they were alive.
     Additionally, empty regions bordering stones of both colors are considered nobody's territory, just like they would be in a seki situation.
 
-    However, it's important to be aware that this implementation cannot handle dead stones before counting the areas.
+    However, it's important to be aware that this implementation can only remove the dead stones inside pass-alive territory
+    (found by Benson's algorithm) before counting the areas, other dead stones are still scored as if they were alive.
     Because accurately detecting dead stones at the end of a game is a complex task that often requires the use of additional techniques
     such as use simulation to play more moves, or use neural networks to prediction the score.
     Consequently, there is a possibility of incorrect scores for certain games.
@@ -43,22 +44,27 @@ class GoEnv(BoardGameEnv):
 
     def __init__(
         self,
+        board_size: int = go.DEFAULT_BOARD_SIZE,
         komi: float = 7.5,
         num_stack: int = 8,
-        max_steps: int = go.N * go.N * 2,
+        max_steps: int = None,
+        early_termination: bool = False,
     ) -> None:
         """
         Args:
+            board_size: board size, default 19.
             komi: default 7.5
             num_stack: stack last N history states,
                 the final state is a image contains N x 2 + 1 binary planes,
                 default 8.
-            max_steps: maximum steps per game, default N x N x 2.
+            max_steps: maximum steps per game, default None means N x N x 2.
+            early_termination: end the game once the outcome is settled by the pass-alive areas (Benson's algorithm),
+                instead of playing until both players passed, default off.
         """
 
         super().__init__(
             id='Go',
-            board_size=go.N,
+            board_size=board_size,
             num_stack=num_stack,
             black_player_id=go.BLACK,
             white_player_id=go.WHITE,
@@ -67,9 +73,11 @@ class GoEnv(BoardGameEnv):
         )
 
         self.komi = komi
-        self.max_steps = max_steps
+        self.max_steps = max_steps if max_steps is not None else board_size * board_size * 2
+        self.early_termination = early_termination
+        self.is_settled = False
 
-        self.position = go.Position(komi=self.komi)
+        self.position = go.Position(komi=self.komi, board_size=self.board_size)
 
         self.board = self.position.board
         self.legal_actions = self.position.all_legal_moves()
@@ -78,13 +86,23 @@ class GoEnv(BoardGameEnv):
         """Reset game to initial state."""
         super().reset(**kwargs)
 
-        self.position = go.Position(komi=self.komi)
+        self.position = go.Position(komi=self.komi, board_size=self.board_size)
+        self.is_settled = False
 
         self.board = self.position.board
         self.legal_actions = self.position.all_legal_moves()
 
         return self.observation()
 
+    def clone(self) -> 'GoEnv':
+        env = super().clone()
+        env.position = deepcopy(self.position)
+        env.board = env.position.board
+        # The settled check runs Benson's algorithm twice per move, which is too slow for the search simulations,
+        # so only the real game is ended early, and the search plays on until both players passed
+        env.early_termination = False
+        return env
+
     def step(self, action: int) -> Tuple[np.ndarray, float, bool, dict]:
         """Plays one move."""
         if self.is_game_over():
@@ -116,7 +134,7 @@ class GoEnv(BoardGameEnv):
             # Switch next player
             self.to_play = self.position.to_play
 
-            return self.observation(), -1, True, {}
+            return self.step_observation(), -1, True, {}
 
         # All other moves, including pass move need to be recorded into to history to make a valid sgf record
         self.add_to_history(self.last_player, self.last_move)
@@ -132,6 +150,9 @@ class GoEnv(BoardGameEnv):
         # Make sure the latest board position is always at index 0
         self.board_deltas.appendleft(np.copy(self.board))
 
+        if self.early_termination:
+            self.is_settled = go.settled_winner(self.board, self.komi) is not None
+
         done = self.is_game_over()
 
         # Rewards are zero except for the final terminal state.
@@ -158,7 +179,7 @@ class GoEnv(BoardGameEnv):
         # Switch next player
         self.to_play = self.position.to_play
 
-        return self.observation(), reward, done, {}
+        return self.step_observation(), reward, done, {}
 
     def render_additional_header(self, outfile, black_stone, white_stone):
         caps = self.get_captures()
@@ -179,6 +200,7 @@ class GoEnv(BoardGameEnv):
             * Some one resigned
             * Reached maximum steps
             * Both players passed
+            * The outcome is settled by the pass-alive areas, if early termination is enabled
         """
 
         if self.last_move == self.resign_move:
@@ -188,6 +210,8 @@ class GoEnv(BoardGameEnv):
         # Game is over if two players played pass move in the last two consecutive turns
         if len(self.history) >= 2 and self.history[-1].move == self.pass_move and self.history[-2].move == self.pass_move:
             return True
+        if self.early_termination and self.is_settled:
+            return True
 
         return False
 
@@ -208,3 +232,170 @@ class GoEnv(BoardGameEnv):
             komi=self.komi,
             date=get_time_stamp(),
         )
+
+
+class VecGoEnv(VecBoardGameEnv):
+    """Go for a batch of games stepped in lockstep, see `GoEnv` for the rules.
+
+    The boards, board history, legal actions masks, observations and final scoring are batched NumPy arrays.
+    The captures and suicide checks still use one go_engine.Position per game, whose board is a view into the batched boards,
+    so the captures made by the engine are written directly into the batched boards.
+    """
+
+    def __init__(
+        self,
+        num_envs: int,
+        board_size: int = go.DEFAULT_BOARD_SIZE,
+        komi: float = 7.5,
+        num_stack: int = 8,
+        max_steps: int = None,
+        early_termination: bool = False,
+    ) -> None:
+        """
+        Args:
+            num_envs: number of games B.
+            board_size: board size, default 19.
+            komi: default 7.5
+            num_stack: stack last N history states,
+                the final state is a image contains N x 2 + 1 binary planes,
+                default 8.
+            max_steps: maximum steps per game, default None means N x N x 2.
+            early_termination: end the game once the outcome is settled by the pass-alive areas, default off.
+        """
+        super().__init__(
+            num_envs=num_envs,
+            id='Go',
+            board_size=board_size,
+            num_stack=num_stack,
+            black_player_id=go.BLACK,
+            white_player_id=go.WHITE,
+            has_pass_move=True,
+            has_resign_move=True,
+        )
+
+        self.komi = komi
+        self.max_steps = max_steps if max_steps is not None else board_size * board_size * 2
+        self.early_termination = early_termination
+
+        self.positions = [None] * self.num_envs
+        self.consecutive_passes = np.zeros(self.num_envs, dtype=np.int64)
+        self.resigned = np.zeros(self.num_envs, dtype=np.bool_)
+        # Final scores from black's perspective
+        self.scores = np.zeros(self.num_envs, dtype=np.float64)
+
+        self.reset()
+
+    def reset(self, indices: Iterable[int] = None) -> np.ndarray:
+        """Reset the games at the given indices to initial state, or all games if indices is None."""
+        indices = self._get_indices(indices)
+        obs = super().reset(indices)
+
+        self.consecutive_passes[indices] = 0
+        self.resigned[indices] = False
+        self.scores[indices] = 0
+        for i in indices:
+            self.positions[i] = go.Position(board=self.boards[i], komi=self.komi)
+
+        return obs
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+        """Plays one move for every game which is not over."""
+        indices, actions = self._check_actions(actions)
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        if len(indices) == 0:
+            return self.observation(), rewards, self.dones.copy(), {}
+
+        players = self.to_play[indices]
+        opponents = np.where(players == self.black_player, self.white_player, self.black_player).astype(np.int8)
+        self._record_moves(indices, players, actions)
+        self.last_move[indices] = actions
+        self.last_player[indices] = players
+        self.steps[indices] += 1
+
+        is_resign = actions == self.resign_move
+        is_pass = actions == self.pass_move
+
+        # Make a move on the go.Position, this will also handle pass move
+        for i, action in zip(indices.tolist(), actions.tolist()):
+            if action == self.resign_move:
+                self.positions[i].flip_playerturn(mutate=True)
+            else:
+                self.positions[i].play_move(c=self.cc.from_flat(action), mutate=True)
+
+        self._push_boards(indices)
+        self.consecutive_passes[indices] = np.where(is_pass, self.consecutive_passes[indices] + 1, 0)
+        self.legal_actions[indices] = self.compute_legal_actions(indices)
+
+        done = is_resign | (self.consecutive_passes[indices] >= 2) | (self.steps[indices] >= self.max_steps)
+        if self.early_termination:
+            done |= np.array([go.settled_winner(self.boards[i], self.komi) is not None for i in indices.tolist()])
+
+        # Resign is always a loss for the player, no need to evaluate the board for score
+        self.resigned[indices[is_resign]] = True
+        self.winner[indices[is_resign]] = opponents[is_resign]
+        rewards[indices[is_resign]] = -1.0
+
+        # Score all finished games in one batch
+        scored = done & ~is_resign
+        if np.any(scored):
+            boards = np.stack([go.fill_pass_alive_areas(self.boards[i]) for i in indices[scored].tolist()], axis=0)
+            scores = go.batch_score(boards, self.komi)
+            winners = np.sign(scores).astype(np.int8) * self.black_player
+            self.scores[indices[scored]] = scores
+            self.winner[indices[scored]] = winners
+            # The reward is for the last player, not `to_play` player
+            rewards[indices[scored]] = np.where(winners == players[scored], 1.0, np.where(winners == 0, 0.0, -1.0))
+
+        # After game ended, no move should be allowed.
+        self.legal_actions[indices[done]] = 0
+        self.dones[indices] = done
+
+        # Switch next player
+        self.to_play[indices] = opponents
+
+        return self.observation(), rewards, self.dones.copy(), {}
+
+    def compute_legal_actions(self, indices: np.ndarray) -> np.ndarray:
+        """Returns the legal actions masks for the games at the given indices, same as `go.Position.all_legal_moves`."""
+        boards = self.boards[indices]
+        num_boards = len(indices)
+
+        # by default, every move on empty points is legal
+        legal_moves = boards == go.EMPTY
+        # calculate which spots have 4 stones next to them
+        # padding is because the edge always counts as a lost liberty.
+        adjacent = np.ones((num_boards, self.board_size + 2, self.board_size + 2), dtype=np.int8)
+        adjacent[:, 1:-1, 1:-1] = np.abs(boards)
+        num_adjacent_stones = adjacent[:, :-2, 1:-1] + adjacent[:, 1:-1, :-2] + adjacent[:, 2:, 1:-1] + adjacent[:, 1:-1, 2:]
+        # Surrounded spots are possibly illegal, unless they are capturing something.
+        for k, row, col in np.argwhere(legal_moves & (num_adjacent_stones == 4)).tolist():
+            if self.positions[indices[k]].is_move_suicidal((row, col)):
+                legal_moves[k, row, col] = False
+
+        # ...and retaking ko is always illegal
+        for k, i in enumerate(indices.tolist()):
+            ko = self.positions[i].ko
+            if ko is not None:
+                legal_moves[k][ko] = False
+
+        # and pass is always legal
+        legal_actions = np.ones((num_boards, self.action_dim), dtype=np.int8)
+        legal_actions[:, :-1] = legal_moves.reshape(num_boards, -1)
+        return legal_actions
+
+    def get_result_string(self, index: int) -> str:
+        if not self.dones[index]:
+            return ''
+        if self.resigned[index]:
+            return 'B+R' if self.winner[index] == self.black_player else 'W+R'
+        return go.score_to_result_string(self.scores[index])
+
+    def to_sgf(self, index: int) -> str:
+        return sgf_wrapper.make_sgf(
+            board_size=self.board_size,
+            move_history=self.moves[index],
+            result_string=self.get_result_string(index),
+            ruleset='Chinese',
+            komi=self.komi,
+            date=get_time_stamp(),
+        )
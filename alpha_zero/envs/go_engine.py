@@ -24,14 +24,9 @@ from collections import namedtuple
 import copy
 import itertools
 import numpy as np
-import os
 
 from alpha_zero.envs.coords import CoordsConvertor
 
-N = int(os.environ.get('BOARD_SIZE', 19))
-
-cc = CoordsConvertor(N)
-
 # Represent a board as a numpy array, with 0 empty, 1 is black, -1 is white.
 # This means that swapping colors is as simple as multiplying array by -1.
 WHITE, EMPTY, BLACK, FILL, KO, UNKNOWN = range(-1, 5)
@@ -39,24 +34,52 @@ WHITE, EMPTY, BLACK, FILL, KO, UNKNOWN = range(-1, 5)
 # Represents "group not found" in the LibertyTracker object
 MISSING_GROUP_ID = -1
 
-ALL_COORDS = [(i, j) for i in range(N) for j in range(N)]
-EMPTY_BOARD = np.zeros([N, N], dtype=np.int8)
+DEFAULT_BOARD_SIZE = 19
+
+
+class BoardTables:
+    """Precomputed coordinates and neighbor tables for one board size, use `get_board_tables` to get the shared instance."""
+
+    def __init__(self, board_size):
+        n = board_size
+        self.board_size = n
+        self.cc = CoordsConvertor(n)
+        self.all_coords = [(i, j) for i in range(n) for j in range(n)]
+        self.empty_board = np.zeros([n, n], dtype=np.int8)
+        # The empty board is shared by all positions of this size, make sure no one writes to it.
+        self.empty_board.flags.writeable = False
+
+        def check_bounds(c):
+            return 0 <= c[0] < n and 0 <= c[1] < n
+
+        self.neighbors = {
+            (x, y): list(filter(check_bounds, [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)])) for x, y in self.all_coords
+        }
+        # Neighbors for flat indices (row * N + col) of the points on the board
+        self.neighbor_indices = [[nx * n + ny for nx, ny in self.neighbors[(x, y)]] for x, y in self.all_coords]
+        self.diagonals = {
+            (x, y): list(
+                filter(
+                    check_bounds,
+                    [(x + 1, y + 1), (x + 1, y - 1), (x - 1, y + 1), (x - 1, y - 1)],
+                )
+            )
+            for x, y in self.all_coords
+        }
 
 
-def _check_bounds(c):
-    return 0 <= c[0] < N and 0 <= c[1] < N
+# Registry of the board tables for each board size, so different board sizes can be used in the same process.
+_BOARD_TABLES = {}
 
 
-NEIGHBORS = {(x, y): list(filter(_check_bounds, [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)])) for x, y in ALL_COORDS}
-DIAGONALS = {
-    (x, y): list(
-        filter(
-            _check_bounds,
-            [(x + 1, y + 1), (x + 1, y - 1), (x - 1, y + 1), (x - 1, y - 1)],
-        )
-    )
-    for x, y in ALL_COORDS
-}
+def get_board_tables(board_size):
+    """Returns the precomputed tables for the board size, which are built on first use and cached."""
+    tables = _BOARD_TABLES.get(board_size)
+    if tables is None:
+        if not 2 <= board_size <= 25:
+            raise ValueError(f'Expect `board_size` to be in the range [2, 25], got {board_size}')
+        tables = _BOARD_TABLES[board_size] = BoardTables(board_size)
+    return tables
 
 
 class IllegalMove(Exception):
@@ -73,6 +96,7 @@ def place_stones(board, color, stones):
 
 
 def find_reached(board, c):
+    neighbors = get_board_tables(board.shape[0]).neighbors
     color = board[c]
     chain = set([c])
     reached = set()
@@ -80,7 +104,7 @@ def find_reached(board, c):
     while frontier:
         current = frontier.pop()
         chain.add(current)
-        for n in NEIGHBORS[current]:
+        for n in neighbors[current]:
             if board[n] == color and n not in chain:
                 frontier.append(n)
             elif board[n] != color:
@@ -92,7 +116,7 @@ def is_koish(board, c):
     'Check if c is surrounded on all sides by 1 color, and return that color'
     if board[c] != EMPTY:
         return None
-    neighbors = {board[n] for n in NEIGHBORS[c]}
+    neighbors = {board[n] for n in get_board_tables(board.shape[0]).neighbors[c]}
     if len(neighbors) == 1 and EMPTY not in neighbors:
         return list(neighbors)[0]
     else:
@@ -108,7 +132,7 @@ def is_eyeish(board, c):
     if color is None:
         return None
     diagonal_faults = 0
-    diagonals = DIAGONALS[c]
+    diagonals = get_board_tables(board.shape[0]).diagonals[c]
     if len(diagonals) < 4:
         diagonal_faults += 1
     for d in diagonals:
@@ -120,6 +144,108 @@ def is_eyeish(board, c):
         return color
 
 
+def _pad_boards(boards):
+    """Pad boards with a one point border of FILL and flatten them, so no bound checks are needed for the neighbors."""
+    num_boards, num_rows, num_cols = boards.shape
+    padded = np.full((num_boards, num_rows + 2, num_cols + 2), FILL, dtype=np.int8)
+    padded[:, 1:-1, 1:-1] = boards
+    neighbor_offsets = (1, -1, num_cols + 2, -(num_cols + 2))
+    return padded.ravel(), neighbor_offsets
+
+
+def _label_connected_points(num_points, points, neighbor_offsets):
+    """Label the connected components for the given points (indices into the padded flat boards).
+
+    Every point starts with its own index as the label, then repeatedly takes the minimum label of its
+    neighbors in the same set, followed by a pointer jumping step (label = label[label]) so long chains collapse quickly.
+
+    Returns:
+        the label (index of the smallest point in the component) for every point.
+    """
+    # Points not in the set are labeled with the sentinel (larger than any index), so they never win the minimum.
+    sentinel = num_points
+    all_labels = np.full(num_points, sentinel, dtype=np.int64)
+    all_labels[points] = points
+    labels = points
+
+    while True:
+        new_labels = labels
+        for offset in neighbor_offsets:
+            new_labels = np.minimum(new_labels, all_labels[points + offset])
+        all_labels[points] = new_labels
+        # Pointer jumping, labels are always index of points in the set.
+        new_labels = all_labels[new_labels]
+        all_labels[points] = new_labels
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+    return labels
+
+
+def label_empty_regions(boards):
+    """Label the connected empty regions for a batch of boards in one pass.
+
+    Args:
+        boards: a batch of boards with shape [B, N, N], with 0 empty, 1 is black, -1 is white.
+
+    Returns:
+        a tuple of (padded, empty_idx, labels), where
+            padded is the flattened boards padded with a one point border of FILL,
+            empty_idx is the index into `padded` for every empty point,
+            labels is the region label (index into `padded` of the smallest point in the region) for every empty point.
+    """
+    padded, neighbor_offsets = _pad_boards(boards)
+    empty_idx = np.flatnonzero(padded == EMPTY)
+    labels = _label_connected_points(padded.size, empty_idx, neighbor_offsets)
+    return padded, empty_idx, labels
+
+
+def batch_area_score(boards):
+    """Calculate the area scores for both players for a batch of boards, using Tromp-Taylor's method.
+
+    This is the vectorized version of `area_score`, the empty regions are labeled with `label_empty_regions`,
+    and the border colors for each region are computed with bincount reductions over the region labels.
+
+    Args:
+        boards: a batch of boards with shape [B, N, N], with 0 empty, 1 is black, -1 is white.
+
+    Returns:
+        a tuple of (black_scores, white_scores), each is a int array with shape [B, ].
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    if boards.ndim != 3:
+        raise ValueError(f'Expect boards to be a 3D array, got {boards.shape}')
+
+    num_boards, num_rows, num_cols = boards.shape
+    black_scores = np.count_nonzero(boards == BLACK, axis=(1, 2))
+    white_scores = np.count_nonzero(boards == WHITE, axis=(1, 2))
+
+    padded, empty_idx, labels = label_empty_regions(boards)
+    if len(empty_idx) == 0:
+        return black_scores, white_scores
+
+    touch_black = np.zeros(len(empty_idx), dtype=np.bool_)
+    touch_white = np.zeros(len(empty_idx), dtype=np.bool_)
+    for offset in (1, -1, num_cols + 2, -(num_cols + 2)):
+        neighbors = padded[empty_idx + offset]
+        touch_black |= neighbors == BLACK
+        touch_white |= neighbors == WHITE
+
+    # Whether each region reaches black or white stones.
+    region_black = np.bincount(labels, weights=touch_black, minlength=padded.size) > 0
+    region_white = np.bincount(labels, weights=touch_white, minlength=padded.size) > 0
+
+    # Empty regions reaching both colors are dame, or seki
+    black_territory = region_black[labels] & ~region_white[labels]
+    white_territory = region_white[labels] & ~region_black[labels]
+
+    board_idx = empty_idx // ((num_rows + 2) * (num_cols + 2))
+    black_scores += np.bincount(board_idx[black_territory], minlength=num_boards)
+    white_scores += np.bincount(board_idx[white_territory], minlength=num_boards)
+    return black_scores, white_scores
+
+
 def area_score(board):
     """Calculate the area scores for both players using Tromp-Taylor's method,
     a simplified variant of the area scoring system based on Chinese rules.
@@ -130,26 +256,164 @@ def area_score(board):
     Accurately detecting dead stones at the end of a game is a complex task that often requires the use of additional techniques
     such as use simulation to play more moves, or use neural networks to prediction the score.
     """
-    board = np.copy(board)
-
-    while EMPTY in board:
-        unassigned_spaces = np.where(board == EMPTY)
-        c = unassigned_spaces[0][0], unassigned_spaces[1][0]
-        territory, borders = find_reached(board, c)
-        border_colors = set(board[b] for b in borders)
-        X_border = BLACK in border_colors
-        O_border = WHITE in border_colors
-        if X_border and not O_border:
-            territory_color = BLACK
-        elif O_border and not X_border:
-            territory_color = WHITE
-        else:
-            territory_color = UNKNOWN  # dame, or seki
-        place_stones(board, territory_color, territory)
+    black_scores, white_scores = batch_area_score(np.asarray(board)[None, ...])
+    return int(black_scores[0]), int(white_scores[0])
+
+
+def batch_score(boards, komi):
+    """Return the scores from black's perspective for a batch of boards. If white is winning, score is negative.
+
+    Args:
+        boards: a batch of boards with shape [B, N, N].
+        komi: komi for the games, either a scalar or an array with shape [B, ].
+
+    Returns:
+        a float array with shape [B, ].
+    """
+    black_scores, white_scores = batch_area_score(boards)
+    return black_scores - (white_scores + np.asarray(komi, dtype=np.float64))
+
+
+def score_to_result_string(score):
+    if score > 0:
+        return 'B+' + '%.1f' % score
+    elif score < 0:
+        return 'W+' + '%.1f' % abs(score)
+    else:
+        return 'DRAW'
+
+
+def batch_result_string(boards, komi):
+    """Return the result strings like 'B+3.5' for a batch of boards."""
+    return [score_to_result_string(score) for score in batch_score(boards, komi)]
+
 
-    black_score = np.count_nonzero(board == BLACK)
-    white_score = np.count_nonzero(board == WHITE)
-    return black_score, white_score
+def pass_alive(board, color):
+    """Find the unconditionally alive (pass-alive) stones and the pass-alive territory for one player, using Benson's algorithm.
+
+    A chain of `color` is unconditionally alive if it can never be captured, even if the player keeps passing.
+    Benson's algorithm works on the chains of `color`, and the regions (connected non-`color` points) enclosed by them:
+        * A region is vital to a chain if all the empty points of the region are liberties of that chain.
+        * Repeatedly remove the chains which have less than two vital regions,
+          and remove the regions bordering any of the removed chains, until nothing changes.
+    The remaining chains are unconditionally alive. A remaining region is pass-alive territory if every empty point in it
+    is adjacent to some alive chain, so the opponent can never make an eye inside, and any opponent stones in it are dead.
+
+    Args:
+        board: the board with shape [N, N], with 0 empty, 1 is black, -1 is white.
+        color: the player to check, BLACK or WHITE.
+
+    Returns:
+        a tuple of (alive, territory), each is a bool array with shape [N, N].
+    """
+    board = np.asarray(board, dtype=np.int8)
+    padded, neighbor_offsets = _pad_boards(board[None, ...])
+
+    alive = np.zeros(padded.size, dtype=np.bool_)
+    territory = np.zeros(padded.size, dtype=np.bool_)
+
+    chain_idx = np.flatnonzero(padded == color)
+    region_idx = np.flatnonzero((padded == EMPTY) | (padded == -color))
+    if len(chain_idx) == 0 or len(region_idx) == 0:
+        return _unpad(alive, board.shape), _unpad(territory, board.shape)
+
+    # Compact ids for the chains and regions, -1 for points not in any chain or region.
+    _, chain_ids = np.unique(_label_connected_points(padded.size, chain_idx, neighbor_offsets), return_inverse=True)
+    _, region_ids = np.unique(_label_connected_points(padded.size, region_idx, neighbor_offsets), return_inverse=True)
+    chain_at = np.full(padded.size, -1, dtype=np.int64)
+    chain_at[chain_idx] = chain_ids
+    num_chains = chain_ids.max() + 1
+    num_regions = region_ids.max() + 1
+
+    is_empty = padded[region_idx] == EMPTY
+    num_empty = np.bincount(region_ids[is_empty], minlength=num_regions)
+
+    # All (region, chain) pairs for bordering points, and for empty points which are liberties of the chain.
+    border_pairs = set()
+    liberty_pairs = set()
+    for offset in neighbor_offsets:
+        neighbor_chains = chain_at[region_idx + offset]
+        has_chain = neighbor_chains >= 0
+        border_pairs.update(zip(region_ids[has_chain].tolist(), neighbor_chains[has_chain].tolist()))
+        liberty_pairs.update(zip(np.flatnonzero(is_empty & has_chain).tolist(), neighbor_chains[is_empty & has_chain].tolist()))
+
+    region_borders = [set() for _ in range(num_regions)]
+    for region, chain in border_pairs:
+        region_borders[region].add(chain)
+
+    # Number of empty points in each region that are liberties of the chain, a point is counted once per chain.
+    liberty_counts = {}
+    for point, chain in liberty_pairs:
+        key = (region_ids[point], chain)
+        liberty_counts[key] = liberty_counts.get(key, 0) + 1
+
+    vital_regions = [set() for _ in range(num_chains)]
+    for (region, chain), count in liberty_counts.items():
+        if count == num_empty[region]:
+            vital_regions[chain].add(region)
+
+    chains = set(range(num_chains))
+    regions = set(region for region in range(num_regions) if region_borders[region])
+    while True:
+        removed = set(chain for chain in chains if len(vital_regions[chain] & regions) < 2)
+        if not removed:
+            break
+        chains -= removed
+        regions = set(region for region in regions if region_borders[region] <= chains)
+
+    alive_chains = np.zeros(num_chains, dtype=np.bool_)
+    alive_chains[list(chains)] = True
+    alive[chain_idx] = alive_chains[chain_ids]
+
+    # Empty points not adjacent to any alive chain, the opponent might still make an eye there.
+    near_alive = np.zeros(len(region_idx), dtype=np.bool_)
+    for offset in neighbor_offsets:
+        neighbor_chains = chain_at[region_idx + offset]
+        near_alive |= (neighbor_chains >= 0) & alive_chains[neighbor_chains]
+    open_regions = np.bincount(region_ids[is_empty & ~near_alive], minlength=num_regions) > 0
+
+    settled_regions = np.zeros(num_regions, dtype=np.bool_)
+    settled_regions[list(regions)] = True
+    settled_regions &= ~open_regions
+    territory[region_idx] = settled_regions[region_ids]
+
+    return _unpad(alive, board.shape), _unpad(territory, board.shape)
+
+
+def _unpad(padded, shape):
+    return padded.reshape(shape[0] + 2, shape[1] + 2)[1:-1, 1:-1]
+
+
+def fill_pass_alive_areas(board):
+    """Return a copy of the board where the pass-alive territory of both players is filled with the owner's stones,
+    this removes the dead stones inside the pass-alive territory before computing the area scores."""
+    working_board = np.copy(board)
+    for color in (BLACK, WHITE):
+        _, territory = pass_alive(board, color)
+        working_board[territory] = color
+    return working_board
+
+
+def settled_winner(board, komi):
+    """Check if the outcome of the game is already settled by the pass-alive areas.
+
+    The guaranteed area for a player is the pass-alive stones plus the pass-alive territory,
+    the outcome is settled if a player still wins when all the remaining points on the board go to the opponent.
+
+    Returns:
+        BLACK or WHITE if the outcome is settled, otherwise None.
+    """
+    black_alive, black_territory = pass_alive(board, BLACK)
+    white_alive, white_territory = pass_alive(board, WHITE)
+    black_area = np.count_nonzero(black_alive | black_territory)
+    white_area = np.count_nonzero(white_alive | white_territory)
+    unsettled = board.size - black_area - white_area
+
+    if black_area - (white_area + unsettled) - komi > 0:
+        return BLACK
+    elif white_area + komi - (black_area + unsettled) > 0:
+        return WHITE
+    return None
 
 
 class Group(namedtuple('Group', ['id', 'stones', 'liberties', 'color'])):
@@ -163,138 +427,216 @@ class Group(namedtuple('Group', ['id', 'stones', 'liberties', 'color'])):
         return self.stones == other.stones and self.liberties == other.liberties and self.color == other.color
 
 
+# Number of set bits for every byte value, used to count the liberties from the packed liberty bitmasks.
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.int32)
+
+
 class LibertyTracker:
+    """Tracks the groups and their liberties with flat arrays indexed by the points on the board (row * N + col).
+
+    The groups are maintained as a union-find forest with union by size. The stones of a group are also linked in
+    a circular list, so a captured group can be removed without scanning the board. The liberties of every group
+    are kept in a packed bitmask on the root of the group.
+
+    All the states are stored in two contiguous buffers, so cloning the tracker is just two `np.copy` calls.
+    """
+
+    # Rows of the int32 state buffer
+    PARENT, NEXT_STONE, SIZE, LIB_COUNT, COLOR = range(5)
+
     @staticmethod
     def from_board(board):
-        board = np.copy(board)
-        curr_group_id = 0
-        lib_tracker = LibertyTracker()
-        for color in (WHITE, BLACK):
-            while color in board:
-                curr_group_id += 1
-                found_color = np.where(board == color)
-                coord = found_color[0][0], found_color[1][0]
-                chain, reached = find_reached(board, coord)
-                liberties = frozenset(r for r in reached if board[r] == EMPTY)
-                new_group = Group(curr_group_id, frozenset(chain), liberties, color)
-                lib_tracker.groups[curr_group_id] = new_group
-                for s in chain:
-                    lib_tracker.group_index[s] = curr_group_id
-                place_stones(board, FILL, chain)
-
-        lib_tracker.max_group_id = curr_group_id
-
-        liberty_counts = np.zeros([N, N], dtype=np.uint8)
-        for group in lib_tracker.groups.values():
-            num_libs = len(group.liberties)
-            for s in group.stones:
-                liberty_counts[s] = num_libs
-        lib_tracker.liberty_cache = liberty_counts
-
+        lib_tracker = LibertyTracker(board_size=board.shape[0])
+        neighbor_indices = lib_tracker._neighbor_indices
+        flat_board = board.ravel()
+        stones = np.flatnonzero(flat_board != EMPTY).tolist()
+        for p in stones:
+            lib_tracker._new_group(p, int(flat_board[p]))
+        for p in stones:
+            for q in neighbor_indices[p]:
+                if flat_board[q] == EMPTY:
+                    lib_tracker._add_liberty(lib_tracker.find(p), q)
+                elif flat_board[q] == flat_board[p]:
+                    lib_tracker._union(lib_tracker.find(p), lib_tracker.find(q))
         return lib_tracker
 
-    def __init__(self, group_index=None, groups=None, liberty_cache=None, max_group_id=1):
-        # group_index: a NxN numpy array of group_ids. -1 means no group
-        # groups: a dict of group_id to groups
-        # liberty_cache: a NxN numpy array of liberty counts
-        self.group_index = group_index if group_index is not None else -np.ones([N, N], dtype=np.int32)
-        self.groups = groups or {}
-        self.liberty_cache = liberty_cache if liberty_cache is not None else np.zeros([N, N], dtype=np.uint8)
-        self.max_group_id = max_group_id
+    def __init__(self, state=None, liberties=None, board_size=DEFAULT_BOARD_SIZE):
+        # state: a [5, N*N] int32 array, with rows for parent (-1 means no group), next stone in the same group,
+        #   group size, liberty count and group color. Only the root of a group holds valid size, liberty count and color.
+        # liberties: a [N*N, (N*N + 7) // 8] uint8 array of packed liberty bitmasks, only valid on the root of a group.
+        num_points = board_size * board_size
+        if state is None:
+            state = np.zeros([5, num_points], dtype=np.int32)
+            state[self.PARENT] = MISSING_GROUP_ID
+        if liberties is None:
+            liberties = np.zeros([num_points, (num_points + 7) // 8], dtype=np.uint8)
+        self._set_buffers(state, liberties, board_size)
+
+    def _set_buffers(self, state, liberties, board_size):
+        self.state = state
+        self.liberties = liberties
+        self.board_size = board_size
+        self._neighbor_indices = get_board_tables(board_size).neighbor_indices
+
+        self._parent = state[self.PARENT]
+        self._next_stone = state[self.NEXT_STONE]
+        self._size = state[self.SIZE]
+        self._lib_count = state[self.LIB_COUNT]
+        self._color = state[self.COLOR]
+
+    def clone(self):
+        tracker = object.__new__(LibertyTracker)
+        tracker._set_buffers(self.state.copy(), self.liberties.copy(), self.board_size)
+        return tracker
 
     def __deepcopy__(self, memodict={}):
-        new_group_index = np.copy(self.group_index)
-        new_lib_cache = np.copy(self.liberty_cache)
-        # shallow copy
-        new_groups = copy.copy(self.groups)
-        return LibertyTracker(
-            new_group_index,
-            new_groups,
-            liberty_cache=new_lib_cache,
-            max_group_id=self.max_group_id,
+        return self.clone()
+
+    @property
+    def group_index(self):
+        """A NxN numpy array of group ids (the root of the group), -1 means no group."""
+        roots = np.copy(self._parent)
+        has_group = roots != MISSING_GROUP_ID
+        while True:
+            next_roots = np.where(has_group, self._parent[roots], MISSING_GROUP_ID)
+            if np.array_equal(next_roots, roots):
+                break
+            roots = next_roots
+        return roots.reshape(self.board_size, self.board_size)
+
+    @property
+    def liberty_cache(self):
+        """A NxN numpy array of liberty counts for the group at each point."""
+        roots = self.group_index.ravel()
+        liberty_counts = np.where(roots != MISSING_GROUP_ID, self._lib_count[roots], 0)
+        return liberty_counts.astype(np.uint8).reshape(self.board_size, self.board_size)
+
+    def find(self, p):
+        parent = self._parent
+        while parent[p] != p:
+            # Path halving
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+
+    def get_group(self, group_id):
+        """Returns the Group for the given group id, the stones and liberties are coordinates."""
+        n = self.board_size
+        libs = np.flatnonzero(np.unpackbits(self.liberties[group_id], bitorder='little')[: n * n])
+        return Group(
+            group_id,
+            frozenset(divmod(p, n) for p in self.stones(group_id)),
+            frozenset(divmod(int(p), n) for p in libs),
+            int(self._color[group_id]),
         )
 
+    def stones(self, group_id):
+        """Returns the flat indices of the stones in the group."""
+        group_id = int(group_id)
+        stones = [group_id]
+        p = int(self._next_stone[group_id])
+        while p != group_id:
+            stones.append(p)
+            p = int(self._next_stone[p])
+        return stones
+
+    def is_suicidal(self, color, c):
+        p = c[0] * self.board_size + c[1]
+        potential_libs = np.zeros(self.liberties.shape[1], dtype=np.uint8)
+        for q in self._neighbor_indices[p]:
+            if self._parent[q] == MISSING_GROUP_ID:
+                # at least one liberty after playing here, so not a suicide
+                return False
+            root = self.find(q)
+            if self._color[root] == color:
+                potential_libs |= self.liberties[root]
+            elif self._lib_count[root] == 1:
+                # would capture an opponent group if they only had one lib.
+                return False
+        # it's possible to suicide by connecting several friendly groups
+        # each of which had one liberty.
+        potential_libs[p >> 3] &= ~np.uint8(1 << (p & 7))
+        return not potential_libs.any()
+
     def add_stone(self, color, c):
-        assert self.group_index[c] == MISSING_GROUP_ID
+        p = c[0] * self.board_size + c[1]
+        assert self._parent[p] == MISSING_GROUP_ID
         captured_stones = set()
-        opponent_neighboring_group_ids = set()
-        friendly_neighboring_group_ids = set()
-        empty_neighbors = set()
-
-        for n in NEIGHBORS[c]:
-            neighbor_group_id = self.group_index[n]
-            if neighbor_group_id != MISSING_GROUP_ID:
-                neighbor_group = self.groups[neighbor_group_id]
-                if neighbor_group.color == color:
-                    friendly_neighboring_group_ids.add(neighbor_group_id)
-                else:
-                    opponent_neighboring_group_ids.add(neighbor_group_id)
+        opponent_neighboring_roots = set()
+        friendly_neighboring_roots = set()
+
+        self._new_group(p, color)
+        for q in self._neighbor_indices[p]:
+            if self._parent[q] == MISSING_GROUP_ID:
+                self._add_liberty(p, q)
             else:
-                empty_neighbors.add(n)
+                root = self.find(q)
+                if self._color[root] == color:
+                    friendly_neighboring_roots.add(root)
+                else:
+                    opponent_neighboring_roots.add(root)
 
-        new_group = self._merge_from_played(color, c, empty_neighbors, friendly_neighboring_group_ids)
+        root = p
+        for other in friendly_neighboring_roots:
+            self._remove_liberty(other, p)
+            root = self._union(root, other)
 
-        # new_group becomes stale as _update_liberties and
-        # _handle_captures are called; must refetch with self.groups[new_group.id]
-        for group_id in opponent_neighboring_group_ids:
-            neighbor_group = self.groups[group_id]
-            if len(neighbor_group.liberties) == 1:
-                captured = self._capture_group(group_id)
-                captured_stones.update(captured)
-            else:
-                self._update_liberties(group_id, remove={c})
+        for other in opponent_neighboring_roots:
+            self._remove_liberty(other, p)
+            if self._lib_count[other] == 0:
+                captured_stones.update(self._capture_group(other))
 
         self._handle_captures(captured_stones)
 
         # suicide is illegal
-        if len(self.groups[new_group.id].liberties) == 0:
+        if self._lib_count[root] == 0:
             raise IllegalMove('Move at {} would commit suicide!\n'.format(c))
 
-        return captured_stones
-
-    def _merge_from_played(self, color, played, libs, other_group_ids):
-        stones = {played}
-        liberties = set(libs)
-        for group_id in other_group_ids:
-            other = self.groups.pop(group_id)
-            stones.update(other.stones)
-            liberties.update(other.liberties)
-
-        if other_group_ids:
-            liberties.remove(played)
-        assert stones.isdisjoint(liberties)
-        self.max_group_id += 1
-        result = Group(self.max_group_id, frozenset(stones), frozenset(liberties), color)
-        self.groups[result.id] = result
-
-        for s in result.stones:
-            self.group_index[s] = result.id
-            self.liberty_cache[s] = len(result.liberties)
-
-        return result
-
-    def _capture_group(self, group_id):
-        dead_group = self.groups.pop(group_id)
-        for s in dead_group.stones:
-            self.group_index[s] = MISSING_GROUP_ID
-            self.liberty_cache[s] = 0
-        return dead_group.stones
-
-    def _update_liberties(self, group_id, add=set(), remove=set()):
-        group = self.groups[group_id]
-        new_libs = (group.liberties | add) - remove
-        self.groups[group_id] = Group(group_id, group.stones, new_libs, group.color)
-
-        new_lib_count = len(new_libs)
-        for s in self.groups[group_id].stones:
-            self.liberty_cache[s] = new_lib_count
+        return set(divmod(s, self.board_size) for s in captured_stones)
+
+    def _new_group(self, p, color):
+        self._parent[p] = p
+        self._next_stone[p] = p
+        self._size[p] = 1
+        self._lib_count[p] = 0
+        self._color[p] = color
+        self.liberties[p] = 0
+
+    def _add_liberty(self, root, q):
+        byte, bit = q >> 3, np.uint8(1 << (q & 7))
+        if not self.liberties[root, byte] & bit:
+            self.liberties[root, byte] |= bit
+            self._lib_count[root] += 1
+
+    def _remove_liberty(self, root, q):
+        byte, bit = q >> 3, np.uint8(1 << (q & 7))
+        if self.liberties[root, byte] & bit:
+            self.liberties[root, byte] &= ~bit
+            self._lib_count[root] -= 1
+
+    def _union(self, a, b):
+        if a == b:
+            return a
+        if self._size[a] < self._size[b]:
+            a, b = b, a
+        self._parent[b] = a
+        self._size[a] += self._size[b]
+        # Splice the two circular lists of stones
+        self._next_stone[a], self._next_stone[b] = self._next_stone[b], self._next_stone[a]
+        self.liberties[a] |= self.liberties[b]
+        self._lib_count[a] = POPCOUNT_TABLE[self.liberties[a]].sum()
+        return a
+
+    def _capture_group(self, root):
+        stones = self.stones(root)
+        self._parent[stones] = MISSING_GROUP_ID
+        return stones
 
     def _handle_captures(self, captured_stones):
         for s in captured_stones:
-            for n in NEIGHBORS[s]:
-                group_id = self.group_index[n]
-                if group_id != MISSING_GROUP_ID:
-                    self._update_liberties(group_id, add={s})
+            for q in self._neighbor_indices[s]:
+                if self._parent[q] != MISSING_GROUP_ID:
+                    self._add_liberty(self.find(q), s)
 
 
 class Position:
@@ -308,9 +650,10 @@ class Position:
         ko=None,
         recent=tuple(),
         to_play=BLACK,
+        board_size=DEFAULT_BOARD_SIZE,
     ):
         """
-        board: a numpy array
+        board: a numpy array, if given, the board size is taken from its shape
         n: an int representing moves played so far
         komi: a float, representing points given to the second player.
         caps: a (int, int) tuple of captures for B, W.
@@ -318,9 +661,13 @@ class Position:
         ko: a Move
         recent: a tuple of PlayerMoves, such that recent[-1] is the last move.
         to_play: BLACK or WHITE
+        board_size: an int for the size of an empty board, only used if board is None
         """
         assert type(recent) is tuple
-        self.board = board if board is not None else np.copy(EMPTY_BOARD)
+        if board is None:
+            board = np.copy(get_board_tables(board_size).empty_board)
+        self.board = board
+        self.board_size = board.shape[0]
         # With a full history, self.n == len(self.recent) == num moves played
         self.n = n
         self.komi = komi
@@ -331,8 +678,8 @@ class Position:
         self.to_play = to_play
 
     def __deepcopy__(self, memodict={}):
-        new_board = np.copy(self.board)
-        new_lib_tracker = copy.deepcopy(self.lib_tracker)
+        new_board = self.board.copy()
+        new_lib_tracker = self.lib_tracker.clone()
         return Position(
             new_board,
             self.n,
@@ -366,9 +713,10 @@ class Position:
         if self.ko is not None:
             place_stones(board, KO, [self.ko])
         raw_board_contents = []
-        for i in range(N):
+        n = self.board_size
+        for i in range(n):
             row = [' ']
-            for j in range(N):
+            for j in range(n):
                 appended = '<' if (self.recent and (i, j) == self.recent[-1].move) else ' '
                 row.append(pretty_print_map[board[i, j]] + appended)
                 if colors:
@@ -376,30 +724,15 @@ class Position:
 
             raw_board_contents.append(''.join(row))
 
-        row_labels = ['%2d' % i for i in range(N, 0, -1)]
+        row_labels = ['%2d' % i for i in range(n, 0, -1)]
         annotated_board_contents = [''.join(r) for r in zip(row_labels, raw_board_contents, row_labels)]
-        header_footer_rows = ['   ' + ' '.join('ABCDEFGHJKLMNOPQRST'[:N]) + '   ']
+        header_footer_rows = ['   ' + ' '.join('ABCDEFGHJKLMNOPQRSTUVWXYZ'[:n]) + '   ']
         annotated_board = '\n'.join(itertools.chain(header_footer_rows, annotated_board_contents, header_footer_rows))
         details = '\nMove: {}. Captures X: {} O: {}\n'.format(self.n, *captures)
         return annotated_board + details
 
     def is_move_suicidal(self, move):
-        potential_libs = set()
-        for n in NEIGHBORS[move]:
-            neighbor_group_id = self.lib_tracker.group_index[n]
-            if neighbor_group_id == MISSING_GROUP_ID:
-                # at least one liberty after playing here, so not a suicide
-                return False
-            neighbor_group = self.lib_tracker.groups[neighbor_group_id]
-            if neighbor_group.color == self.to_play:
-                potential_libs |= neighbor_group.liberties
-            elif len(neighbor_group.liberties) == 1:
-                # would capture an opponent group if they only had one lib.
-                return False
-        # it's possible to suicide by connecting several friendly groups
-        # each of which had one liberty.
-        potential_libs -= set([move])
-        return not potential_libs
+        return self.lib_tracker.is_suicidal(self.to_play, move)
 
     def is_move_legal(self, move):
         'Checks that a move is on an empty space, not on ko, and not suicide'
@@ -415,14 +748,15 @@ class Position:
         return True
 
     def all_legal_moves(self):
-        'Returns a np.array of size go.N**2 + 1, with 1 = legal, 0 = illegal'
+        'Returns a np.array of size N**2 + 1, with 1 = legal, 0 = illegal'
+        n = self.board_size
         # by default, every move is legal
-        legal_moves = np.ones([N, N], dtype=np.int8)
+        legal_moves = np.ones([n, n], dtype=np.int8)
         # ...unless there is already a stone there
         legal_moves[self.board != EMPTY] = 0
         # calculate which spots have 4 stones next to them
         # padding is because the edge always counts as a lost liberty.
-        adjacent = np.ones([N + 2, N + 2], dtype=np.int8)
+        adjacent = np.ones([n + 2, n + 2], dtype=np.int8)
         adjacent[1:-1, 1:-1] = np.abs(self.board)
         num_adjacent_stones = adjacent[:-2, 1:-1] + adjacent[1:-1, :-2] + adjacent[2:, 1:-1] + adjacent[1:-1, 2:]
         # Surrounded spots are those that are empty and have 4 adjacent stones.
@@ -473,7 +807,9 @@ class Position:
 
         if not self.is_move_legal(c):
             raise IllegalMove(
-                '{} move at {} is illegal: \n{}'.format('Black' if self.to_play == BLACK else 'White', cc.to_gtp(c), self)
+                '{} move at {} is illegal: \n{}'.format(
+                    'Black' if self.to_play == BLACK else 'White', get_board_tables(self.board_size).cc.to_gtp(c), self
+                )
             )
 
         potential_ko = is_koish(self.board, c)
@@ -484,7 +820,7 @@ class Position:
 
         opp_color = color * -1
 
-        new_board_delta = np.zeros([N, N], dtype=np.int8)
+        new_board_delta = np.zeros_like(pos.board)
         new_board_delta[c] = color
         place_stones(new_board_delta, color, captured_stones)
 
@@ -508,7 +844,7 @@ class Position:
 
     def score(self):
         """Return estimated score from black's perspective. If white is winning, score is negative."""
-        working_board = np.copy(self.board)
+        working_board = fill_pass_alive_areas(self.board)
 
         black_score, white_score = area_score(working_board)
 
@@ -525,10 +861,4 @@ class Position:
             return 0
 
     def result_string(self):
-        score = self.score()
-        if score > 0:
-            return 'B+' + '%.1f' % score
-        elif score < 0:
-            return 'W+' + '%.1f' % abs(score)
-        else:
-            return 'DRAW'
+        return score_to_result_string(self.score())
@@ -9,7 +9,7 @@ from typing import Tuple
 import numpy as np
 from copy import copy
 
-from alpha_zero.envs.base import BoardGameEnv
+from alpha_zero.envs.base import BoardGameEnv, VecBoardGameEnv
 from alpha_zero.utils import sgf_wrapper
 from alpha_zero.utils.util import get_time_stamp
 
@@ -42,6 +42,23 @@ class GomokuEnv(BoardGameEnv):
 
         self.num_to_win = num_to_win
 
+        # Directions for the four lines: horizontal, vertical, and the two diagonals
+        self.line_dirs = ((0, 1), (1, 0), (1, 1), (1, -1))
+        # Length of the line runs at the end points for each direction, see `_update_runs`
+        self.runs = np.zeros((len(self.line_dirs), self.board_size, self.board_size), dtype=np.int16)
+        self.num_stones = 0
+
+    def reset(self, **kwargs) -> np.ndarray:
+        """Reset game to initial state."""
+        self.runs = np.zeros_like(self.runs)
+        self.num_stones = 0
+        return super().reset(**kwargs)
+
+    def clone(self) -> 'GomokuEnv':
+        env = super().clone()
+        env.runs = self.runs.copy()
+        return env
+
     def step(self, action: int) -> Tuple[np.ndarray, float, bool, dict]:
         """Plays one move."""
         if self.is_game_over():
@@ -65,6 +82,8 @@ class GomokuEnv(BoardGameEnv):
         # Update board state.
         row_index, col_index = self.action_to_coords(action)
         self.board[row_index, col_index] = self.to_play
+        self._update_runs(row_index, col_index, self.to_play)
+        self.num_stones += 1
 
         # Make sure the latest board position is always at index 0
         self.board_deltas.appendleft(np.copy(self.board))
@@ -80,53 +99,40 @@ class GomokuEnv(BoardGameEnv):
         # Switch next player
         self.to_play = self.opponent_player
 
-        return self.observation(), reward, done, {}
+        return self.step_observation(), reward, done, {}
 
     def is_current_player_won(self) -> bool:
-        """This is a simple and quick way to check N connected sequence of stones,
-        by starting from the last postion, without doing a full scan of the board."""
-        # Less than num_to_win steps for each player.
-        if self.steps < (self.num_to_win - 1) * 2:
-            return False
-
+        """Check N connected sequence of stones through the last move, this is O(1) as the line runs
+        are maintained incrementally by `_update_runs` on each placement."""
         x_last, y_last = self.action_to_coords(self.last_move)
-        color = self.to_play
-
-        board = np.copy(self.board)
-
-        # Check vertical
-        vertical_dirs = (
-            (0, -1),  # left
-            (0, 1),  # right
-        )
-        if count_sequence_length_on_dir(board, x_last, y_last, color, vertical_dirs) >= self.num_to_win:
-            return True
+        return self.runs[:, x_last, y_last].max() >= self.num_to_win
 
-        # Check horizontal
-        horizontal_dirs = (
-            (-1, 0),  # up
-            (1, 0),  # down
-        )
-        if count_sequence_length_on_dir(board, x_last, y_last, color, horizontal_dirs) >= self.num_to_win:
-            return True
-
-        # Check diagonal top-left to bottom-right
-        diagonal_dirs_1 = (
-            (-1, -1),  # to top-left
-            (1, 1),  # to down-right
-        )
-        if count_sequence_length_on_dir(board, x_last, y_last, color, diagonal_dirs_1) >= self.num_to_win:
-            return True
-
-        # Check diagonal top-right to bottom-left
-        diagonal_dirs_2 = (
-            (-1, 1),  # to top-right
-            (1, -1),  # to down-left
-        )
-        if count_sequence_length_on_dir(board, x_last, y_last, color, diagonal_dirs_2) >= self.num_to_win:
-            return True
+    def _update_runs(self, x: int, y: int, color: int) -> None:
+        """Update the line runs after placing a stone at (x, y).
 
-        return False
+        For each direction, a run is a maximal sequence of connected same color stones, and only the two end points
+        of a run hold the up to date run length. Since the new stone is placed on an empty point, the neighbors
+        on both sides are end points of their runs, so the new run length is simply left + right + 1,
+        which is then written to the two new end points and the new stone itself.
+        """
+        board = self.board
+        runs = self.runs
+        n = self.board_size
+        for d, (d_x, d_y) in enumerate(self.line_dirs):
+            left = 0
+            x_left, y_left = x - d_x, y - d_y
+            if 0 <= x_left < n and 0 <= y_left < n and board[x_left, y_left] == color:
+                left = runs[d, x_left, y_left]
+
+            right = 0
+            x_right, y_right = x + d_x, y + d_y
+            if 0 <= x_right < n and 0 <= y_right < n and board[x_right, y_right] == color:
+                right = runs[d, x_right, y_right]
+
+            length = left + right + 1
+            runs[d, x, y] = length
+            runs[d, x - left * d_x, y - left * d_y] = length
+            runs[d, x + right * d_x, y + right * d_y] = length
 
     def is_game_over(self) -> bool:
         if self.winner is not None:
@@ -135,6 +141,9 @@ class GomokuEnv(BoardGameEnv):
             return True
         return False
 
+    def is_board_full(self) -> bool:
+        return self.num_stones == self.board_size**2
+
     def get_result_string(self) -> str:
         if not self.is_game_over():
             return ''
@@ -157,6 +166,107 @@ class GomokuEnv(BoardGameEnv):
         )
 
 
+class VecGomokuEnv(VecBoardGameEnv):
+    """Free-style Gomoku for a batch of games stepped in lockstep, see `GomokuEnv` for the rules."""
+
+    def __init__(self, num_envs: int, board_size: int = 15, num_to_win: int = 5, num_stack: int = 8) -> None:
+        """
+        Args:
+            num_envs: number of games B.
+            board_size: board size, default 15.
+            num_to_win: number of connected stones to win, default 5.
+            num_stack: stack last N history states, default 8.
+        """
+        super().__init__(
+            num_envs=num_envs,
+            id='Freestyle Gomoku',
+            board_size=board_size,
+            num_stack=num_stack,
+            has_pass_move=False,
+            has_resign_move=False,
+        )
+
+        self.num_to_win = num_to_win
+
+        # Offsets along the four lines through a point, shape [4, 2 x num_to_win - 1], the point itself at the center.
+        steps = np.arange(-(num_to_win - 1), num_to_win)
+        line_dirs = np.array([(0, 1), (1, 0), (1, 1), (1, -1)])
+        self.line_row_offsets = line_dirs[:, :1] * steps
+        self.line_col_offsets = line_dirs[:, 1:] * steps
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+        """Plays one move for every game which is not over."""
+        indices, actions = self._check_actions(actions)
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        if len(indices) == 0:
+            return self.observation(), rewards, self.dones.copy(), {}
+
+        players = self.to_play[indices]
+        self._record_moves(indices, players, actions)
+        self.last_move[indices] = actions
+        self.last_player[indices] = players
+        self.steps[indices] += 1
+
+        # Update board states, and make sure the actions are illegal from now on.
+        rows, cols = np.divmod(actions, self.board_size)
+        self.boards[indices, rows, cols] = players
+        self.legal_actions[indices, actions] = 0
+
+        self._push_boards(indices)
+
+        won = self.is_players_won(indices, rows, cols, players)
+        self.winner[indices[won]] = players[won]
+        rewards[indices[won]] = 1.0
+
+        board_full = np.all(self.boards[indices] != 0, axis=(1, 2))
+        self.dones[indices] = won | board_full
+
+        # Switch next player
+        self.to_play[indices] = np.where(players == self.black_player, self.white_player, self.black_player)
+
+        return self.observation(), rewards, self.dones.copy(), {}
+
+    def is_players_won(self, indices: np.ndarray, rows: np.ndarray, cols: np.ndarray, players: np.ndarray) -> np.ndarray:
+        """Check N connected sequence of stones along the four lines through the last moves, for all games at once."""
+        line_rows = rows[:, None, None] + self.line_row_offsets
+        line_cols = cols[:, None, None] + self.line_col_offsets
+        on_board = (line_rows >= 0) & (line_rows < self.board_size) & (line_cols >= 0) & (line_cols < self.board_size)
+
+        stones = self.boards[
+            indices[:, None, None],
+            np.clip(line_rows, 0, self.board_size - 1),
+            np.clip(line_cols, 0, self.board_size - 1),
+        ]
+        same_color = on_board & (stones == players[:, None, None])
+
+        # Connected stones starting from the last move, on both sides of the line.
+        center = self.num_to_win - 1
+        forward = np.cumprod(same_color[..., center:], axis=-1).sum(axis=-1)
+        backward = np.cumprod(same_color[..., center::-1], axis=-1).sum(axis=-1)
+        return np.any(forward + backward - 1 >= self.num_to_win, axis=-1)
+
+    def get_result_string(self, index: int) -> str:
+        if not self.dones[index]:
+            return ''
+
+        if self.winner[index] == self.black_player:
+            return 'B+1.0'
+        elif self.winner[index] == self.white_player:
+            return 'W+1.0'
+        else:
+            return 'DRAW'
+
+    def to_sgf(self, index: int) -> str:
+        return sgf_wrapper.make_sgf(
+            board_size=self.board_size,
+            move_history=self.moves[index],
+            result_string=self.get_result_string(index),
+            ruleset='',
+            komi='',
+            date=get_time_stamp(),
+        )
+
+
 # Extra functions for evaluation board positions and calculate score.
 def is_bounded(board: np.ndarray, x: int, y: int) -> bool:
     """Returns whether the point in the format of (x, y) is on board.
@@ -0,0 +1,204 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Threat-space tactical solver for freestyle Gomoku.
+
+The solver works on a table of all the line windows of `num_to_win` points on the board,
+so a threat is simply a window with no opponent stone, where:
+    - a window with `num_to_win - 1` own stones and one empty point is a four, the empty point is a winning move.
+    - a window with `num_to_win - 2` own stones and two empty points is a three, playing either empty point makes a four.
+
+On top of that, it runs a depth-limited victory by continuous fours (VCF) search,
+where the attacker keeps making fours and the defender is forced to block each of them,
+until the attacker has two winning moves at the same time.
+
+Since the forced moves are decided by a few table lookups, the MCTS search can use these results to
+play the forced moves instantly, and to prune the root node when the opponent has a VCF.
+"""
+from typing import List, NamedTuple, Optional
+import numpy as np
+
+from alpha_zero.envs.gomoku import GomokuEnv
+
+
+class ThreatResult(NamedTuple):
+    move: Optional[int]  # the forced move to play, None if there's no forced move
+    value: Optional[float]  # the value for the forced move from current player's perspective, None if unknown
+    root_mask: Optional[np.ndarray]  # 1D bool mask for the candidate moves at the root node, None means all legal moves
+
+
+def build_line_windows(board_size: int, num_to_win: int) -> np.ndarray:
+    """Returns the flat indices of all the line windows of `num_to_win` points on the board,
+    for the four directions: horizontal, vertical, and the two diagonals, shape [num_windows, num_to_win]."""
+    steps = np.arange(num_to_win)
+    rows, cols = np.meshgrid(np.arange(board_size), np.arange(board_size), indexing='ij')
+    rows, cols = rows.reshape(-1, 1), cols.reshape(-1, 1)
+
+    windows = []
+    for d_x, d_y in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        line_rows = rows + d_x * steps
+        line_cols = cols + d_y * steps
+        on_board = np.all((line_rows >= 0) & (line_rows < board_size) & (line_cols >= 0) & (line_cols < board_size), axis=1)
+        windows.append(line_rows[on_board] * board_size + line_cols[on_board])
+    return np.concatenate(windows, axis=0)
+
+
+class GomokuThreatSolver:
+    """Recognizes immediate wins, forced blocks and short VCF sequences for freestyle Gomoku."""
+
+    def __init__(self, board_size: int = 15, num_to_win: int = 5, max_vcf_depth: int = 8, max_nodes: int = 1000) -> None:
+        """
+        Args:
+            board_size: board size, default 15.
+            num_to_win: number of connected stones to win, default 5.
+            max_vcf_depth: maximum number of fours the attacker can make in a VCF sequence, default 8.
+            max_nodes: maximum number of positions to visit for each VCF search, default 1000.
+        """
+        if not 3 <= num_to_win <= board_size:
+            raise ValueError(f'Expect `num_to_win` to be in the range [3, {board_size}], got {num_to_win}')
+        if max_vcf_depth < 0:
+            raise ValueError(f'Expect `max_vcf_depth` to be a non-negative integer, got {max_vcf_depth}')
+
+        self.board_size = board_size
+        self.num_to_win = num_to_win
+        self.max_vcf_depth = max_vcf_depth
+        self.max_nodes = max_nodes
+
+        self.windows = build_line_windows(board_size, num_to_win)
+        # Incidence of points and windows, shape [board_size**2, num_windows]
+        self.point_windows = np.zeros((board_size**2, len(self.windows)), dtype=bool)
+        self.point_windows[self.windows, np.arange(len(self.windows))[:, None]] = True
+
+        self._num_nodes = 0
+
+    def __call__(self, env: GomokuEnv) -> ThreatResult:
+        """Look for forced moves for the current player in the environment, in the following order:
+        - an immediate win.
+        - block the opponent's only winning move.
+        - the first move of a VCF sequence.
+
+        If there's no forced move, but the opponent has a VCF (if we were to pass), the root mask
+        restricts the candidate moves to those that can break the opponent's VCF sequence,
+        and our own fours which force the opponent to respond first.
+        """
+        if not isinstance(env, GomokuEnv):
+            raise ValueError(f'Expect `env` to be a valid GomokuEnv instance, got {env}')
+        if env.board_size != self.board_size or env.num_to_win != self.num_to_win:
+            raise ValueError(
+                f'Expect `env` with board size {self.board_size} and num_to_win {self.num_to_win}, '
+                f'got {env.board_size} and {env.num_to_win}'
+            )
+
+        board = env.board.flatten()
+        player, opponent = env.to_play, env.opponent_player
+
+        wins = self.winning_moves(board, player)
+        if len(wins) > 0:
+            return ThreatResult(int(wins[0]), 1.0, None)
+
+        blocks = self.winning_moves(board, opponent)
+        if len(blocks) == 1:
+            return ThreatResult(int(blocks[0]), None, None)
+        if len(blocks) > 1:
+            # The game is lost, but keep searching the blocking moves, in case the opponent makes mistakes.
+            return ThreatResult(None, None, self._to_mask(blocks, env.legal_actions))
+
+        sequence = self.find_vcf(board, player, opponent)
+        if sequence is not None:
+            return ThreatResult(int(sequence[0]), 1.0, None)
+
+        opponent_sequence = self.find_vcf(board, opponent, player)
+        if opponent_sequence is not None:
+            defenses = np.concatenate([self._vcf_defenses(board, opponent_sequence, player), self.four_moves(board, player)])
+            return ThreatResult(None, None, self._to_mask(defenses, env.legal_actions))
+
+        return ThreatResult(None, None, None)
+
+    def winning_moves(self, board: np.ndarray, color: int) -> np.ndarray:
+        """Returns the empty points where the stone `color` makes `num_to_win` connected stones."""
+        return self._threat_points(board, color, 1)
+
+    def four_moves(self, board: np.ndarray, color: int) -> np.ndarray:
+        """Returns the empty points where the stone `color` makes a four, the points which
+        belong to more threat windows come first, since they're more likely to make a double four."""
+        return self._threat_points(board, color, 2)
+
+    def find_vcf(self, board: np.ndarray, attacker: int, defender: int) -> Optional[List[int]]:
+        """Search for victory by continuous fours for the attacker, assuming it's the attacker's turn to move.
+
+        Args:
+            board: 1D numpy.array flat board, which is left unchanged.
+            attacker: the stone color of the attacker.
+            defender: the stone color of the defender.
+
+        Returns:
+            the moves of the VCF sequence, alternating attacker and defender, ending with the attacker's move
+            that makes two winning moves (or wins the game), None if no VCF is found within the limits.
+        """
+        self._num_nodes = 0
+        return self._vcf(board.copy(), attacker, defender, self.max_vcf_depth)
+
+    def _vcf(self, board: np.ndarray, attacker: int, defender: int, depth: int) -> Optional[List[int]]:
+        self._num_nodes += 1
+
+        wins = self.winning_moves(board, attacker)
+        if len(wins) > 0:
+            return [int(wins[0])]
+        if depth == 0 or self._num_nodes > self.max_nodes:
+            return None
+
+        # The attacker's four must also block the defender's four, if there's any.
+        candidates = self.four_moves(board, attacker)
+        defender_wins = self.winning_moves(board, defender)
+        if len(defender_wins) > 1:
+            return None
+        if len(defender_wins) == 1:
+            candidates = candidates[candidates == defender_wins[0]]
+
+        for move in candidates:
+            board[move] = attacker
+            threats = self.winning_moves(board, attacker)
+            sequence = None
+            if len(threats) > 1:
+                sequence = [int(move)]
+            elif len(threats) == 1:
+                reply = threats[0]
+                board[reply] = defender
+                sub_sequence = self._vcf(board, attacker, defender, depth - 1)
+                board[reply] = 0
+                if sub_sequence is not None:
+                    sequence = [int(move), int(reply)] + sub_sequence
+            board[move] = 0
+
+            if sequence is not None:
+                return sequence
+        return None
+
+    def _vcf_defenses(self, board: np.ndarray, sequence: List[int], defender: int) -> np.ndarray:
+        """Returns the empty points in the windows through the attacker's moves of the VCF sequence,
+        which the defender has not blocked yet. Placing a stone anywhere else can't stop these fours."""
+        attacker_moves = sequence[::2]
+        windows = self.windows[np.any(self.point_windows[attacker_moves], axis=0)]
+        cells = board[windows]
+        windows = windows[np.all(cells != defender, axis=1)]
+        points = windows.ravel()
+        return np.unique(points[board[points] == 0])
+
+    def _threat_points(self, board: np.ndarray, color: int, num_empty: int) -> np.ndarray:
+        cells = board[self.windows]
+        own = np.count_nonzero(cells == color, axis=1)
+        empty = np.count_nonzero(cells == 0, axis=1)
+        threat_windows = self.windows[(own == self.num_to_win - num_empty) & (empty == num_empty)]
+        points = threat_windows.ravel()
+        points, counts = np.unique(points[board[points] == 0], return_counts=True)
+        return points[np.argsort(-counts, kind='stable')]
+
+    def _to_mask(self, points: np.ndarray, legal_actions: np.ndarray) -> Optional[np.ndarray]:
+        mask = np.zeros_like(legal_actions, dtype=bool)
+        mask[points] = True
+        mask &= legal_actions == 1
+        # Don't restrict the search if none of the candidates is legal.
+        return mask if mask.any() else None
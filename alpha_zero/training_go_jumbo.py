@@ -38,6 +38,11 @@ from torch.optim.lr_scheduler import MultiStepLR
 FLAGS = flags.FLAGS
 flags.DEFINE_integer('board_size', 19, 'Board size for Go.')
 flags.DEFINE_float('komi', 7.5, 'Komi rule for Go.')
+flags.DEFINE_bool(
+    'early_termination',
+    False,
+    'End self-play games once the outcome is settled by the pass-alive areas, instead of playing until both players passed.',
+)
 flags.DEFINE_integer(
     'num_stack',
     8,
@@ -57,11 +62,42 @@ flags.DEFINE_integer(
     25000,
     'Collect minimum number of self-play games using the last checkpoint before creating the next checkpoint.',
 )
+flags.DEFINE_integer(
+    'max_ckpt_staleness',
+    1,
+    'Also accept self-play games played with the last N checkpoints before the current one, '
+    'instead of discarding them, these games do not count towards games_per_ckpt. 0 means only the current checkpoint.',
+)
+flags.DEFINE_float(
+    'stale_game_weight',
+    1.0,
+    'Down-weight the stale self-play games, a game which is N checkpoints old is kept with probability weight**N.',
+)
 flags.DEFINE_integer(
     'replay_capacity',
     500000 * 100,
     'Replay buffer capacity is number of game * average game length. ',
 )
+flags.DEFINE_bool(
+    'game_replay',
+    False,
+    'Store the board position of each move only once in the replay, and rebuild the stacked history planes '
+    'when sampling, which takes ~8x less memory for the states, default off.',
+)
+flags.DEFINE_integer(
+    'policy_top_k',
+    0,
+    'Store only the top K moves of the MCTS search policy in the replay, as uint16 indices and float16 probabilities, '
+    'which are renormalized and densified when sampling. 0 means store the dense policy, default 0.',
+)
+flags.DEFINE_string(
+    'replay_dir',
+    '',
+    'Keep the replay buffer as memory mapped files in this directory, which is appended in place, '
+    'flushed every save_replay_interval games, and resumed instantly from the last flush when restarting with the same '
+    'directory. The buffer could exceed the RAM. '
+    'Default empty means keep the replay in memory.',
+)
 flags.DEFINE_integer('batch_size', 2048, '')
 
 flags.DEFINE_bool(
@@ -69,7 +105,24 @@ flags.DEFINE_bool(
     True,
     'Apply random rotation and mirroring to the training data, default on.',
 )
-flags.DEFINE_bool('compress_data', False, 'Compress state when saving in replay buffer, default off.')
+flags.DEFINE_integer(
+    'prefetch_batches',
+    2,
+    'Number of batches the learner samples and augments ahead of the training step in a background thread, '
+    '0 means sample on the training thread, default 2.',
+)
+flags.DEFINE_integer(
+    'game_ring_slots',
+    2,
+    'Number of shared memory game slots per actor, the actors write the finished games into the slots '
+    'and only send the slot descriptors to the learner. 0 means send the games through the queue, default 2.',
+)
+flags.DEFINE_bool(
+    'shared_weights',
+    True,
+    'Publish the network weights of each checkpoint into shared memory, where the actors and evaluator copy them from, '
+    'instead of loading the checkpoint files, default on.',
+)
 
 flags.DEFINE_float('init_lr', 0.2, 'Initial learning rate.')
 flags.DEFINE_float('lr_decay', 0.1, 'Learning rate decay rate.')
@@ -109,6 +162,28 @@ flags.DEFINE_float(
     'Exploration constants balancing priors vs. search values. Original paper use 1.25',
 )
 
+flags.DEFINE_bool('use_minimax', False, 'Use minimax search to evaluate the leaf nodes during MCTS search, default off.')
+flags.DEFINE_integer('depth', 2, 'Depth limit for the minimax search, only applicable if "use_minimax" is on.')
+flags.DEFINE_integer('k_best', 5, 'Number of best moves to consider at each depth of the minimax search.')
+flags.DEFINE_bool(
+    'quantize_actors',
+    False,
+    'Self-play actors on CPU use an INT8 quantized copy of the network, calibrated on their recent self-play positions, '
+    'default off.',
+)
+flags.DEFINE_bool(
+    'actor_bf16',
+    False,
+    'Self-play actors run the network with bfloat16 autocast, only use it if the device supports bfloat16 natively, '
+    'default off.',
+)
+flags.DEFINE_bool('learner_bf16', False, 'Learner runs the training step with bfloat16 autocast, default off.')
+flags.DEFINE_bool(
+    'channels_last',
+    False,
+    'Use channels_last memory format for the self-play actors and the learner, default off.',
+)
+
 flags.DEFINE_integer(
     'warm_up_steps',
     30,
@@ -194,13 +269,16 @@ flags.register_multi_flags_validator(
     lambda flags: flags['c_puct_base'] >= 19652 * (flags['num_parallel'] / 800),
     '',
 )
+flags.register_multi_flags_validator(
+    ['quantize_actors', 'actor_bf16', 'channels_last'],
+    lambda flags: not (flags['quantize_actors'] and (flags['actor_bf16'] or flags['channels_last'])),
+    '"quantize_actors" can not be used together with "actor_bf16" or "channels_last".',
+)
 
 
 # Initialize flags
 FLAGS(sys.argv)
 
-os.environ['BOARD_SIZE'] = str(FLAGS.board_size)
-
 from alpha_zero.envs.go import GoEnv
 from alpha_zero.core.pipeline import (
     run_learner_loop,
@@ -209,8 +287,10 @@ from alpha_zero.core.pipeline import (
     set_seed,
     maybe_create_dir,
 )
+from alpha_zero.core.game_ring import SharedGameRing
 from alpha_zero.core.network import AlphaZeroNet
-from alpha_zero.core.replay import UniformReplay
+from alpha_zero.core.replay import GameReplay, UniformReplay
+from alpha_zero.core.shared_weights import SharedWeights
 from alpha_zero.utils.util import extract_args_from_flags_dict, create_logger
 
 
@@ -243,7 +323,12 @@ def main():
         actor_devices = [torch.device(f'cuda:{i % num_gpus}') for i in range(FLAGS.num_actors)]
 
     def env_builder():
-        return GoEnv(komi=FLAGS.komi, num_stack=FLAGS.num_stack)
+        return GoEnv(
+            board_size=FLAGS.board_size,
+            komi=FLAGS.komi,
+            num_stack=FLAGS.num_stack,
+            early_termination=FLAGS.early_termination,
+        )
 
     eval_env = env_builder()
 
@@ -270,40 +355,65 @@ def main():
 
     # Use the events to synchronize work between learner and actors.
     stop_event = mp.Event()
-    ckpt_event = mp.Event()
+    ckpt_ready_event = mp.Event()
     # Transfer samples from self-play process to training process.
     data_queue = mp.Queue(maxsize=FLAGS.num_actors)
+    # Transfer the games through shared memory, so only the small slot descriptors go through the data queue.
+    game_ring = None
+    if FLAGS.game_ring_slots > 0:
+        game_ring = SharedGameRing(
+            num_slots=FLAGS.game_ring_slots * FLAGS.num_actors,
+            max_game_length=eval_env.max_steps,
+            state_size=(int(np.prod(input_shape)) + 7) // 8,
+            num_actions=num_actions,
+        )
+    # Broadcast the weights of each checkpoint to the actors and evaluator.
+    shared_weights = SharedWeights(network) if FLAGS.shared_weights else None
 
     with mp.Manager() as manager:
         var_ckpt = manager.Value('s', b'')
         var_resign_threshold = manager.Value('d', FLAGS.init_resign_threshold)
 
-        replay = UniformReplay(
-            capacity=FLAGS.replay_capacity,
-            random_state=np.random.RandomState(),
-            compress_data=FLAGS.compress_data,
-        )
+        if FLAGS.game_replay:
+            replay = GameReplay(
+                capacity=FLAGS.replay_capacity,
+                random_state=np.random.RandomState(),
+                input_shape=input_shape,
+                policy_top_k=FLAGS.policy_top_k,
+                storage_dir=FLAGS.replay_dir if FLAGS.replay_dir else None,
+            )
+        else:
+            replay = UniformReplay(
+                capacity=FLAGS.replay_capacity,
+                random_state=np.random.RandomState(),
+                policy_top_k=FLAGS.policy_top_k,
+                storage_dir=FLAGS.replay_dir if FLAGS.replay_dir else None,
+            )
 
         # Start evaluator
         evaluator = mp.Process(
             target=run_evaluator_loop,
-            args=(
-                FLAGS.seed,
-                network_builder(),
-                eval_device,
-                eval_env,
-                FLAGS.eval_games_dir,
-                FLAGS.num_simulations,
-                FLAGS.num_parallel,
-                FLAGS.c_puct_base,
-                FLAGS.c_puct_init,
-                FLAGS.default_rating,
-                FLAGS.logs_dir,
-                FLAGS.save_sgf_dir,
-                FLAGS.load_ckpt,
-                FLAGS.log_level,
-                var_ckpt,
-                stop_event,
+            kwargs=dict(
+                seed=FLAGS.seed,
+                network=network_builder(),
+                device=eval_device,
+                env=eval_env,
+                eval_games_dir=FLAGS.eval_games_dir,
+                num_simulations=FLAGS.num_simulations,
+                num_parallel=FLAGS.num_parallel,
+                k_best=FLAGS.k_best,
+                depth=FLAGS.depth,
+                use_minimax=FLAGS.use_minimax,
+                c_puct_base=FLAGS.c_puct_base,
+                c_puct_init=FLAGS.c_puct_init,
+                default_rating=FLAGS.default_rating,
+                logs_dir=FLAGS.logs_dir,
+                save_sgf_dir=FLAGS.save_sgf_dir,
+                load_ckpt=FLAGS.load_ckpt,
+                log_level=FLAGS.log_level,
+                var_ckpt=var_ckpt,
+                stop_event=stop_event,
+                shared_weights=shared_weights,
             ),
         )
 
@@ -314,29 +424,37 @@ def main():
         for i in range(FLAGS.num_actors):
             actor = mp.Process(
                 target=run_selfplay_actor_loop,
-                args=(
-                    FLAGS.seed,
-                    i,
-                    network_builder(),
-                    actor_devices[i],
-                    data_queue,
-                    env_builder(),
-                    FLAGS.num_simulations,
-                    FLAGS.num_parallel,
-                    FLAGS.c_puct_base,
-                    FLAGS.c_puct_init,
-                    FLAGS.warm_up_steps,
-                    FLAGS.check_resign_after_steps,
-                    FLAGS.disable_resign_ratio,
-                    FLAGS.save_sgf_dir,
-                    FLAGS.save_sgf_interval,
-                    FLAGS.logs_dir,
-                    FLAGS.load_ckpt,
-                    FLAGS.log_level,
-                    var_ckpt,
-                    var_resign_threshold,
-                    ckpt_event,
-                    stop_event,
+                kwargs=dict(
+                    seed=FLAGS.seed,
+                    rank=i,
+                    network=network_builder(),
+                    device=actor_devices[i],
+                    data_queue=data_queue,
+                    env=env_builder(),
+                    num_simulations=FLAGS.num_simulations,
+                    num_parallel=FLAGS.num_parallel,
+                    c_puct_base=FLAGS.c_puct_base,
+                    c_puct_init=FLAGS.c_puct_init,
+                    k_best=FLAGS.k_best,
+                    depth=FLAGS.depth,
+                    use_minimax=FLAGS.use_minimax,
+                    warm_up_steps=FLAGS.warm_up_steps,
+                    check_resign_after_steps=FLAGS.check_resign_after_steps,
+                    disable_resign_ratio=FLAGS.disable_resign_ratio,
+                    save_sgf_dir=FLAGS.save_sgf_dir,
+                    save_sgf_interval=FLAGS.save_sgf_interval,
+                    logs_dir=FLAGS.logs_dir,
+                    load_ckpt=FLAGS.load_ckpt,
+                    log_level=FLAGS.log_level,
+                    var_ckpt=var_ckpt,
+                    var_resign_threshold=var_resign_threshold,
+                    ckpt_ready_event=ckpt_ready_event,
+                    stop_event=stop_event,
+                    game_ring=game_ring,
+                    shared_weights=shared_weights,
+                    quantize=FLAGS.quantize_actors and actor_devices[i].type == 'cpu',
+                    use_bf16=FLAGS.actor_bf16,
+                    channels_last=FLAGS.channels_last,
                 ),
             )
             actor.start()
@@ -372,8 +490,15 @@ def main():
             data_queue=data_queue,
             var_ckpt=var_ckpt,
             var_resign_threshold=var_resign_threshold,
-            ckpt_event=ckpt_event,
+            ckpt_ready_event=ckpt_ready_event,
             stop_event=stop_event,
+            use_bf16=FLAGS.learner_bf16,
+            channels_last=FLAGS.channels_last,
+            prefetch_batches=FLAGS.prefetch_batches,
+            max_ckpt_staleness=FLAGS.max_ckpt_staleness,
+            stale_game_weight=FLAGS.stale_game_weight,
+            game_ring=game_ring,
+            shared_weights=shared_weights,
         )
 
         # Wait for all actors to finish
@@ -4,8 +4,8 @@
 # See the accompanying LICENSE file for details.
 
 
-from typing import Tuple
-import random
+from typing import Optional, Tuple
+import functools
 import torch
 from torchvision.transforms.functional import rotate, hflip, vflip
 
@@ -157,11 +157,73 @@ SUPPORTED_TRANSFORMATIONS = {
 TRANSFORMATIONS = list(SUPPORTED_TRANSFORMATIONS.keys())
 
 
+# The 8 symmetries of the square board, as functions of the [..., H, W] tensors
+DIHEDRAL_SYMMETRIES = {
+    'identity': lambda x: x,
+    'rotate90': lambda x: torch.rot90(x, k=1, dims=[-2, -1]),
+    'rotate180': lambda x: torch.rot90(x, k=2, dims=[-2, -1]),
+    'rotate270': lambda x: torch.rot90(x, k=3, dims=[-2, -1]),
+    'h_flip': lambda x: torch.flip(x, dims=[-1]),
+    'v_flip': lambda x: torch.flip(x, dims=[-2]),
+    'transpose': lambda x: torch.transpose(x, -2, -1),
+    'anti_transpose': lambda x: torch.rot90(torch.transpose(x, -2, -1), k=2, dims=[-2, -1]),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def dihedral_permutations(board_size: int, has_pass_move: bool, device: Optional[torch.device] = None) -> torch.Tensor:
+    """Returns the flat index permutation tables [8, H*W] or [8, H*W+1] for the symmetries in `DIHEDRAL_SYMMETRIES`,
+    where `x[..., permutation]` applies the symmetry to the flattened board `x`. The pass move maps to itself."""
+    board = torch.arange(board_size * board_size).reshape(board_size, board_size)
+    permutations = [symmetry(board).reshape(-1) for symmetry in DIHEDRAL_SYMMETRIES.values()]
+    if has_pass_move:
+        pass_move = torch.tensor([board_size * board_size])
+        permutations = [torch.cat([permutation, pass_move]) for permutation in permutations]
+    return torch.stack(permutations, dim=0).to(device=device)
+
+
+def apply_dihedral_transformation(
+    states: torch.Tensor, pi_probs: torch.Tensor, symmetries: torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Returns the states and action probabilities transformed by a symmetry for each sample, with one gather each.
+
+    Args:
+        states: the states [B, C, H, W] of any dtype, on any device.
+        pi_probs: the action probabilities [B, H*W] or [B, H*W+1], where the last one is the pass move.
+        symmetries: the index of the symmetry in `DIHEDRAL_SYMMETRIES` [B] for each sample.
+
+    Returns:
+        the transformed states and action probabilities.
+
+    Raises:
+        ValueError:
+            if states is not a 4D torch.Tensor with square boards.
+            if pi_probs is not a 2D torch.Tensor for the board size.
+    """
+    if not isinstance(states, torch.Tensor) or len(states.shape) != 4 or states.shape[-1] != states.shape[-2]:
+        raise ValueError(f'Expect states to be a 4D torch.Tensor with square boards, got {states}')
+    board_size = states.shape[-1]
+    if (
+        not isinstance(pi_probs, torch.Tensor)
+        or len(pi_probs.shape) != 2
+        or pi_probs.shape[-1] not in (board_size**2, board_size**2 + 1)
+    ):
+        raise ValueError(f'Expect pi_probs to be a 2D torch.Tensor of [B, {board_size**2}(+1)], got {pi_probs}')
+
+    B, C, H, W = states.shape
+    permutations = dihedral_permutations(board_size, pi_probs.shape[-1] == board_size**2 + 1, states.device)
+    # [B, H*W(+1)]
+    indices = permutations[symmetries.to(device=states.device)]
+
+    states = torch.gather(states.reshape(B, C, H * W), 2, indices[:, None, : H * W].expand(B, C, H * W))
+    pi_probs = torch.gather(pi_probs, 1, indices.to(device=pi_probs.device))
+    return states.reshape(B, C, H, W), pi_probs
+
+
 def apply_random_transformation(
     states: torch.Tensor, pi_probs: torch.Tensor, values: torch.Tensor
 ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
-    if random.random() > 0.5:
-        transformation = random.choice(TRANSFORMATIONS)
-        states, pi_probs, values = SUPPORTED_TRANSFORMATIONS[transformation](states, pi_probs, values)
-
+    """Applies a random symmetry out of the 8 dihedral symmetries (including identity) to each sample independently."""
+    symmetries = torch.randint(len(DIHEDRAL_SYMMETRIES), (states.shape[0],), device=states.device)
+    states, pi_probs = apply_dihedral_transformation(states, pi_probs, symmetries)
     return states, pi_probs, values
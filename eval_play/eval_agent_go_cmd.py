@@ -56,10 +56,9 @@ flags.DEFINE_integer('seed', 1, 'Seed the runtime.')
 # Initialize flags
 FLAGS(sys.argv)
 
-os.environ['BOARD_SIZE'] = str(FLAGS.board_size)
-
 from alpha_zero.envs.go import GoEnv
 from alpha_zero.core.network import AlphaZeroNet
+from alpha_zero.core.inference import fuse_network
 from alpha_zero.core.pipeline import create_mcts_player, set_seed, disable_auto_grad
 from alpha_zero.utils.util import create_logger
 
@@ -74,7 +73,7 @@ def main():
     elif torch.backends.mps.is_available():
         runtime_device = 'mps'
 
-    eval_env = GoEnv(komi=FLAGS.komi, num_stack=FLAGS.num_stack)
+    eval_env = GoEnv(board_size=FLAGS.board_size, komi=FLAGS.komi, num_stack=FLAGS.num_stack)
 
     input_shape = eval_env.observation_space.shape
     num_actions = eval_env.action_space.n
@@ -102,7 +101,7 @@ def main():
         network.eval()
 
         return create_mcts_player(
-            network=network,
+            network=fuse_network(network),
             device=device,
             num_simulations=FLAGS.num_simulations,
             num_parallel=FLAGS.num_parallel,
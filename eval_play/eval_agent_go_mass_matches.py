@@ -84,10 +84,9 @@ flags.register_validator('num_games', lambda x: x >= 1)
 # Initialize flags
 FLAGS(sys.argv)
 
-os.environ['BOARD_SIZE'] = str(FLAGS.board_size)
-
 from alpha_zero.envs.go import GoEnv
 from alpha_zero.core.network import AlphaZeroNet
+from alpha_zero.core.inference import fuse_network
 from alpha_zero.core.pipeline import create_mcts_player, set_seed, disable_auto_grad, maybe_create_dir
 from alpha_zero.utils.util import create_logger, get_time_stamp
 from alpha_zero.utils.csv_writer import CsvWriter
@@ -108,7 +107,7 @@ def mcts_player_builder(network, ckpt_file, device, num_simulations, use_minimax
     network.eval()
 
     return create_mcts_player(
-        network=network,
+        network=fuse_network(network),
         device=device,
         num_simulations=num_simulations,
         num_parallel=FLAGS.num_parallel,
@@ -186,7 +185,7 @@ def main():
         runtime_device = 'mps'
 
     def env_builder():
-        return GoEnv(komi=FLAGS.komi, num_stack=FLAGS.num_stack)
+        return GoEnv(board_size=FLAGS.board_size, komi=FLAGS.komi, num_stack=FLAGS.num_stack)
 
     eval_env = env_builder()
     input_shape = eval_env.observation_space.shape
@@ -46,6 +46,12 @@ flags.DEFINE_integer(
 
 flags.DEFINE_float('c_puct_base', 19652, 'Exploration constants balancing priors vs. search values.')
 flags.DEFINE_float('c_puct_init', 1.25, 'Exploration constants balancing priors vs. search values.')
+flags.DEFINE_bool(
+    'use_threat_solver',
+    True,
+    'Use the threat-space solver to play immediate wins, forced blocks and VCF moves without MCTS search, default on.',
+)
+flags.DEFINE_integer('max_vcf_depth', 8, 'Maximum number of fours in a VCF sequence for the threat-space solver.')
 
 flags.DEFINE_bool('human_vs_ai', True, 'Black player is human, default on.')
 
@@ -55,7 +61,9 @@ flags.DEFINE_integer('seed', 1, 'Seed the runtime.')
 FLAGS(sys.argv)
 
 from alpha_zero.envs.gomoku import GomokuEnv
+from alpha_zero.envs.gomoku_threats import GomokuThreatSolver
 from alpha_zero.core.network import AlphaZeroNet
+from alpha_zero.core.inference import fuse_network
 from alpha_zero.core.pipeline import create_mcts_player, set_seed, disable_auto_grad
 from alpha_zero.utils.util import create_logger
 
@@ -92,6 +100,12 @@ def main():
         else:
             logger.warning(f'Invalid checkpoint file "{ckpt_file}"')
 
+    threat_solver = None
+    if FLAGS.use_threat_solver:
+        threat_solver = GomokuThreatSolver(
+            board_size=FLAGS.board_size, num_to_win=eval_env.num_to_win, max_vcf_depth=FLAGS.max_vcf_depth
+        )
+
     def mcts_player_builder(ckpt_file, device):
         network = network_builder().to(device)
         disable_auto_grad(network)
@@ -99,12 +113,13 @@ def main():
         network.eval()
 
         return create_mcts_player(
-            network=network,
+            network=fuse_network(network),
             device=device,
             num_simulations=FLAGS.num_simulations,
             num_parallel=FLAGS.num_parallel,
             root_noise=False,
             deterministic=False,
+            threat_solver=threat_solver,
         )
 
     white_player = mcts_player_builder(FLAGS.white_ckpt, runtime_device)
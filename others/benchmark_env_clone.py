@@ -0,0 +1,64 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Micro-benchmark for the cost of copying the environments during MCTS search, `copy.deepcopy(env)` vs `env.clone()`."""
+from absl import app, flags
+import copy
+import timeit
+import numpy as np
+
+from alpha_zero.envs.go import GoEnv
+from alpha_zero.envs.gomoku import GomokuEnv
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_multi_integer('go_board_sizes', [9, 13, 19], 'Board sizes for Go.')
+flags.DEFINE_multi_integer('gomoku_board_sizes', [9, 13, 15], 'Board sizes for Gomoku.')
+flags.DEFINE_float('fill_ratio', 0.3, 'Play random moves until this ratio of the board is filled before copying.')
+flags.DEFINE_integer('num_copies', 2000, 'Number of copies to measure.')
+flags.DEFINE_integer('seed', 1, 'Seed the runtime.')
+
+
+def play_random_moves(env, num_moves, seed):
+    rng = np.random.default_rng(seed)
+    env.reset()
+    for _ in range(num_moves):
+        legal_actions = np.flatnonzero(env.legal_actions)
+        if env.has_pass_move:
+            legal_actions = legal_actions[legal_actions != env.pass_move]
+        _, _, done, _ = env.step(rng.choice(legal_actions))
+        if done:
+            break
+    return env
+
+
+def measure(env, num_copies):
+    deepcopy_us = timeit.timeit(lambda: copy.deepcopy(env), number=num_copies) / num_copies * 1e6
+    clone_us = timeit.timeit(lambda: env.clone(), number=num_copies) / num_copies * 1e6
+    return deepcopy_us, clone_us
+
+
+def run_go(board_size, fill_ratio, num_copies, seed):
+    env = play_random_moves(GoEnv(board_size=board_size), int(board_size**2 * fill_ratio), seed)
+    return ('Go', board_size, env.steps) + measure(env, num_copies)
+
+
+def run_gomoku(board_size, fill_ratio, num_copies, seed):
+    env = play_random_moves(GomokuEnv(board_size=board_size), int(board_size**2 * fill_ratio), seed)
+    return ('Gomoku', board_size, env.steps) + measure(env, num_copies)
+
+
+def main(argv):
+    tasks = [(run_go, size) for size in FLAGS.go_board_sizes] + [(run_gomoku, size) for size in FLAGS.gomoku_board_sizes]
+
+    print(f'{"game":<8}{"size":>6}{"moves":>8}{"deepcopy (us)":>16}{"clone (us)":>14}{"speedup":>10}')
+    for func, board_size in tasks:
+        game, size, moves, deepcopy_us, clone_us = func(board_size, FLAGS.fill_ratio, FLAGS.num_copies, FLAGS.seed)
+        print(f'{game:<8}{size:>6}{moves:>8}{deepcopy_us:>16.2f}{clone_us:>14.2f}{deepcopy_us / clone_us:>9.1f}x')
+
+
+if __name__ == '__main__':
+    app.run(main)
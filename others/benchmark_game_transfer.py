@@ -0,0 +1,103 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Benchmark the throughput of transferring the finished self-play games from the actor processes to the learner,
+and adding them to the replay, by pickling the games through the queue or through the shared memory game ring."""
+from absl import app, flags
+import multiprocessing as mp
+import timeit
+import numpy as np
+
+from alpha_zero.core.game_ring import GameSlot, SharedGameRing
+from alpha_zero.core.network import pack_states
+from alpha_zero.core.replay import Transition, UniformReplay
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_multi_string(
+    'configs',
+    ['9x80', '19x300'],
+    'Game configurations to benchmark, in the format of "{board_size}x{game_length}" for Go.',
+)
+flags.DEFINE_integer('num_stack', 8, 'Stack N previous states.')
+flags.DEFINE_integer('num_actors', 4, 'Number of actor processes sending the games.')
+flags.DEFINE_integer('num_games', 200, 'Number of games to send from each actor.')
+
+
+def random_game(board_size, game_length, num_stack):
+    input_shape = (num_stack * 2 + 1, board_size, board_size)
+    num_actions = board_size**2 + 1
+    states = np.random.randint(0, 2, size=(game_length, *input_shape)).astype(np.int8)
+    pi_probs = np.random.dirichlet(np.ones(num_actions), size=game_length).astype(np.float32)
+    # Same as the actors, the states are sent as packed bits
+    return [Transition(state=pack_states(states[i]), pi_prob=pi_probs[i], value=1.0) for i in range(game_length)]
+
+
+def run_actor(data_queue, game_ring, board_size, game_length, num_stack, num_games):
+    game_seq = random_game(board_size, game_length, num_stack)
+    for _ in range(num_games):
+        game_slot = game_ring.put(game_seq) if game_ring is not None else None
+        data_queue.put((game_slot if game_slot is not None else game_seq, {}))
+
+
+def run_transfer(board_size, game_length, use_game_ring):
+    num_actions = board_size**2 + 1
+    state_size = ((FLAGS.num_stack * 2 + 1) * board_size**2 + 7) // 8
+    game_ring = None
+    if use_game_ring:
+        game_ring = SharedGameRing(2 * FLAGS.num_actors, game_length, state_size, num_actions)
+    data_queue = mp.Queue(maxsize=FLAGS.num_actors)
+    replay = UniformReplay(FLAGS.num_actors * FLAGS.num_games * game_length, np.random.RandomState(1))
+
+    actors = [
+        mp.Process(
+            target=run_actor,
+            args=(data_queue, game_ring, board_size, game_length, FLAGS.num_stack, FLAGS.num_games),
+        )
+        for _ in range(FLAGS.num_actors)
+    ]
+    for actor in actors:
+        actor.start()
+
+    # Start timing from the first game, so the time to start the processes is excluded
+    start = None
+    num_games = FLAGS.num_actors * FLAGS.num_games
+    for _ in range(num_games):
+        game_seq, _ = data_queue.get()
+        if start is None:
+            start = timeit.default_timer()
+        if isinstance(game_seq, GameSlot):
+            replay.add_game(game_ring.get(game_seq))
+            game_ring.release(game_seq)
+        else:
+            replay.add_game(game_seq)
+    elapsed = timeit.default_timer() - start
+
+    for actor in actors:
+        actor.join()
+
+    num_bytes = replay.states[:1].nbytes + replay.pi_probs[:1].nbytes + replay.values[:1].nbytes
+    # The first game is excluded from the timing
+    games_per_second = (num_games - 1) / elapsed
+    return games_per_second, games_per_second * game_length * num_bytes / 1e6
+
+
+def main(argv):
+    np.random.seed(1)
+
+    print(f'Transfer {FLAGS.num_games} games from each of {FLAGS.num_actors} actors')
+    print(f'{"config":<10}{"transport":<12}{"games/s":>10}{"MB/s":>10}')
+    for config in FLAGS.configs:
+        board_size, game_length = (int(v) for v in config.split('x'))
+        for use_game_ring in (False, True):
+            games_per_second, mb_per_second = run_transfer(board_size, game_length, use_game_ring)
+            print(f'{config:<10}{"game ring" if use_game_ring else "queue":<12}{games_per_second:>10.1f}{mb_per_second:>10.1f}')
+
+
+if __name__ == '__main__':
+    # Same as the training scripts
+    mp.set_start_method('spawn')
+    app.run(main)
@@ -0,0 +1,101 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Benchmark the evaluator game time for freestyle Gomoku, with and without the threat-space solver."""
+from absl import app, flags
+import os
+import timeit
+import numpy as np
+import torch
+
+from alpha_zero.envs.gomoku import GomokuEnv
+from alpha_zero.envs.gomoku_threats import GomokuThreatSolver
+from alpha_zero.core.network import AlphaZeroNet
+from alpha_zero.core.pipeline import create_mcts_player, eval_against_prev_ckpt, set_seed, disable_auto_grad
+from alpha_zero.core.rating import EloRating
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer('board_size', 13, 'Board size for freestyle Gomoku.')
+flags.DEFINE_integer('num_stack', 8, 'Stack N previous states.')
+flags.DEFINE_integer('num_res_blocks', 10, 'Number of residual blocks in the neural network.')
+flags.DEFINE_integer('num_filters', 40, 'Number of filters for the conv2d layers in the neural network.')
+flags.DEFINE_integer('num_fc_units', 80, 'Number of hidden units in the linear layer of the neural network.')
+flags.DEFINE_string('load_ckpt', '', 'Load the checkpoint file for both players, use random weights if empty.')
+flags.DEFINE_integer('num_simulations', 200, 'Number of iterations per MCTS search.')
+flags.DEFINE_integer('num_parallel', 8, 'Number of leaves to collect before using the neural network to evaluate the positions.')
+flags.DEFINE_integer('max_vcf_depth', 8, 'Maximum number of fours in a VCF sequence for the threat-space solver.')
+flags.DEFINE_integer('num_games', 10, 'Number of evaluation games for each setting.')
+flags.DEFINE_integer('seed', 1, 'Seed the runtime.')
+
+
+class CountingSolver:
+    """Wraps the threat-space solver to count the number of forced moves and pruned root nodes."""
+
+    def __init__(self, solver):
+        self.solver = solver
+        self.num_calls = self.num_forced = self.num_pruned = 0
+
+    def __call__(self, env):
+        result = self.solver(env)
+        self.num_calls += 1
+        self.num_forced += int(result.move is not None)
+        self.num_pruned += int(result.root_mask is not None)
+        return result
+
+
+def run_games(network, env, threat_solver):
+    set_seed(FLAGS.seed)
+    player = create_mcts_player(
+        network=network,
+        device=torch.device('cpu'),
+        num_simulations=FLAGS.num_simulations,
+        num_parallel=FLAGS.num_parallel,
+        root_noise=False,
+        deterministic=False,
+        threat_solver=threat_solver,
+    )
+
+    game_times, game_lengths = [], []
+    for _ in range(FLAGS.num_games):
+        start = timeit.default_timer()
+        stats = eval_against_prev_ckpt(env, player, player, EloRating(), EloRating(), 19652, 1.25)
+        game_times.append(timeit.default_timer() - start)
+        game_lengths.append(stats['game_length'])
+    return np.mean(game_times), np.mean(game_lengths)
+
+
+def main(argv):
+    torch.set_num_threads(1)
+    env = GomokuEnv(board_size=FLAGS.board_size, num_stack=FLAGS.num_stack)
+    network = AlphaZeroNet(
+        env.observation_space.shape,
+        env.action_space.n,
+        FLAGS.num_res_blocks,
+        FLAGS.num_filters,
+        FLAGS.num_fc_units,
+        True,
+    )
+    if FLAGS.load_ckpt and os.path.isfile(FLAGS.load_ckpt):
+        loaded_state = torch.load(FLAGS.load_ckpt, map_location=torch.device('cpu'))
+        network.load_state_dict(loaded_state['network'])
+    disable_auto_grad(network)
+    network.eval()
+
+    solver = CountingSolver(GomokuThreatSolver(FLAGS.board_size, env.num_to_win, FLAGS.max_vcf_depth))
+
+    print(f'{"solver":<8}{"game time (s)":>16}{"moves":>8}{"time per move (ms)":>20}{"forced":>9}{"pruned":>9}')
+    for name, threat_solver in (('off', None), ('on', solver)):
+        game_time, game_length = run_games(network, env, threat_solver)
+        forced = pruned = '-'
+        if threat_solver is not None:
+            forced = f'{threat_solver.num_forced / threat_solver.num_calls:.0%}'
+            pruned = f'{threat_solver.num_pruned / threat_solver.num_calls:.0%}'
+        print(f'{name:<8}{game_time:>16.2f}{game_length:>8.1f}{game_time / game_length * 1000:>20.1f}{forced:>9}{pruned:>9}')
+
+
+if __name__ == '__main__':
+    app.run(main)
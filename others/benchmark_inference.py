@@ -0,0 +1,76 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Benchmark the inference latency of the AlphaZero network per batch size,
+for eager PyTorch, TorchScript and torch.compile (if available)."""
+from absl import app, flags
+import timeit
+import torch
+
+from alpha_zero.core.network import AlphaZeroNet
+from alpha_zero.core.inference import export_torchscript, compile_network
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_multi_string(
+    'configs',
+    ['10x128x9', '19x256x19'],
+    'Network configurations to benchmark, in the format of "{num_res_blocks}x{num_filters}x{board_size}" for Go.',
+)
+flags.DEFINE_multi_integer('batch_sizes', [1, 8, 16, 32], 'Batch sizes to measure.')
+flags.DEFINE_integer('num_stack', 8, 'Stack N previous states.')
+flags.DEFINE_bool('use_compile', True, 'Also benchmark torch.compile, which takes a while to compile for each batch size.')
+flags.DEFINE_integer('num_threads', 1, 'Number of threads for PyTorch, actors use 1 thread each.')
+flags.DEFINE_integer('num_runs', 20, 'Number of forward passes to measure for each batch size.')
+flags.DEFINE_string('device', 'cpu', 'Device to run the benchmark.')
+
+
+def measure_ms(model, x, num_runs):
+    with torch.no_grad():
+        # Warm up, for TorchScript the first few calls run the profiling executor.
+        for _ in range(3):
+            model(x)
+        if x.is_cuda:
+            torch.cuda.synchronize()
+        start = timeit.default_timer()
+        for _ in range(num_runs):
+            model(x)
+        if x.is_cuda:
+            torch.cuda.synchronize()
+    return (timeit.default_timer() - start) / num_runs * 1000
+
+
+def main(argv):
+    torch.set_num_threads(FLAGS.num_threads)
+    device = torch.device(FLAGS.device)
+
+    print(f'{"config":<12}{"batch":>6}{"eager (ms)":>12}{"script (ms)":>13}{"compile (ms)":>14}{"speedup":>9}')
+    for config in FLAGS.configs:
+        num_res_blocks, num_filters, board_size = (int(v) for v in config.split('x'))
+        input_shape = (FLAGS.num_stack * 2 + 1, board_size, board_size)
+        network = AlphaZeroNet(input_shape, board_size**2 + 1, num_res_blocks, num_filters, num_filters).to(device=device)
+        network.eval()
+
+        scripted = export_torchscript(network, input_shape)
+        compiled = compile_network(network) if FLAGS.use_compile else None
+
+        for batch_size in FLAGS.batch_sizes:
+            x = torch.rand((batch_size, *input_shape), device=device).round()
+            eager_ms = measure_ms(network, x, FLAGS.num_runs)
+            script_ms = measure_ms(scripted, x, FLAGS.num_runs)
+            fastest_ms = script_ms
+            compile_str = '-'
+            if compiled is not None:
+                compile_ms = measure_ms(compiled, x, FLAGS.num_runs)
+                fastest_ms = min(fastest_ms, compile_ms)
+                compile_str = f'{compile_ms:.2f}'
+            print(
+                f'{config:<12}{batch_size:>6}{eager_ms:>12.2f}{script_ms:>13.2f}{compile_str:>14}{eager_ms / fastest_ms:>8.2f}x'
+            )
+
+
+if __name__ == '__main__':
+    app.run(main)
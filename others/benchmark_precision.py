@@ -0,0 +1,123 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Benchmark the throughput of the actor inference and the learner training step, using float32 or bfloat16 autocast,
+with the default or channels_last memory format, so we can decide which mode to use for each host."""
+from absl import app, flags
+import itertools
+import statistics
+import timeit
+import numpy as np
+import torch
+
+from alpha_zero.core.network import AlphaZeroNet
+from alpha_zero.core.inference import AutocastNetwork, compute_inference_drift, fuse_network
+from alpha_zero.core.pipeline import compute_losses
+from alpha_zero.core.replay import Transition
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_multi_string(
+    'configs',
+    ['10x128x9'],
+    'Network configurations to benchmark, in the format of "{num_res_blocks}x{num_filters}x{board_size}" for Go.',
+)
+flags.DEFINE_multi_integer('inference_batch_sizes', [1, 8, 32], 'Batch sizes to measure the actor inference.')
+flags.DEFINE_integer('training_batch_size', 128, 'Batch size to measure the learner training step.')
+flags.DEFINE_integer('num_stack', 8, 'Stack N previous states.')
+flags.DEFINE_integer('num_threads', 1, 'Number of threads for PyTorch.')
+flags.DEFINE_integer('num_runs', 10, 'Number of runs to measure for each mode.')
+flags.DEFINE_string('device', 'cpu', 'Device to run the benchmark.')
+
+MODES = list(itertools.product((False, True), (False, True)))  # (use_bf16, channels_last)
+
+
+def mode_name(use_bf16, channels_last):
+    return f'{"bf16" if use_bf16 else "fp32"}{"+cl" if channels_last else ""}'
+
+
+def median_ms(func, num_runs):
+    for _ in range(2):
+        func()
+    times = []
+    for _ in range(num_runs):
+        start = timeit.default_timer()
+        func()
+        times.append((timeit.default_timer() - start) * 1000)
+    return statistics.median(times)
+
+
+def random_transitions(batch_size, input_shape, num_actions):
+    pi_prob = np.random.dirichlet(np.ones(num_actions), size=batch_size).astype(np.float32)
+    return Transition(
+        state=np.random.randint(0, 2, size=(batch_size, *input_shape)).astype(np.int8),
+        pi_prob=pi_prob,
+        value=np.random.choice([-1.0, 1.0], size=batch_size).astype(np.float32),
+    )
+
+
+def main(argv):
+    torch.manual_seed(1)
+    np.random.seed(1)
+    torch.set_num_threads(FLAGS.num_threads)
+    device = torch.device(FLAGS.device)
+
+    for config in FLAGS.configs:
+        num_res_blocks, num_filters, board_size = (int(v) for v in config.split('x'))
+        input_shape = (FLAGS.num_stack * 2 + 1, board_size, board_size)
+        num_actions = board_size**2 + 1
+
+        def network_builder():
+            network = AlphaZeroNet(input_shape, num_actions, num_res_blocks, num_filters, num_filters)
+            network.load_state_dict(base_state)
+            return network.to(device=device)
+
+        base_state = AlphaZeroNet(input_shape, num_actions, num_res_blocks, num_filters, num_filters).state_dict()
+        states = torch.from_numpy(random_transitions(256, input_shape, num_actions).state).to(dtype=torch.float32)
+
+        print(f'\nInference {config} (ms per batch)')
+        batch_header = ''.join(f'{f"batch {b}":>12}' for b in FLAGS.inference_batch_sizes)
+        print(f'{"mode":<10}{batch_header}{"pi drift":>10}{"v drift":>10}')
+        float_network = fuse_network(network_builder())
+        for use_bf16, channels_last in MODES:
+            inference_network = AutocastNetwork(fuse_network(network_builder()), use_bf16, channels_last)
+            results = []
+            for batch_size in FLAGS.inference_batch_sizes:
+                x = states[:batch_size].to(device=device)
+                with torch.no_grad():
+                    results.append(median_ms(lambda: inference_network(x), FLAGS.num_runs))
+            policy_drift, value_drift = compute_inference_drift(float_network, inference_network, states)
+            print(
+                f'{mode_name(use_bf16, channels_last):<10}'
+                + ''.join(f'{ms:>12.2f}' for ms in results)
+                + f'{policy_drift:>10.4f}{value_drift:>10.4f}'
+            )
+
+        print(f'\nTraining step {config}, batch size {FLAGS.training_batch_size}')
+        print(f'{"mode":<10}{"ms/step":>10}{"samples/s":>12}{"pi loss":>10}{"v loss":>10}')
+        transitions = random_transitions(FLAGS.training_batch_size, input_shape, num_actions)
+        for use_bf16, channels_last in MODES:
+            network = network_builder()
+            if channels_last:
+                network = network.to(memory_format=torch.channels_last)
+            network.train()
+
+            def train_step():
+                network.zero_grad()
+                pi_loss, v_loss = compute_losses(network, device, transitions, False, use_bf16, channels_last)
+                (pi_loss + v_loss).backward()
+                return pi_loss, v_loss
+
+            ms = median_ms(train_step, FLAGS.num_runs)
+            pi_loss, v_loss = train_step()
+            print(
+                f'{mode_name(use_bf16, channels_last):<10}{ms:>10.1f}{FLAGS.training_batch_size / ms * 1000:>12.1f}'
+                f'{pi_loss.item():>10.4f}{v_loss.item():>10.4f}'
+            )
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -0,0 +1,144 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Compare the INT8 quantized network against the float32 network on the professional games,
+using the same metrics as the evaluator, and measure the inference latency per batch size on CPU."""
+from absl import app, flags
+import os
+import timeit
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Subset
+
+from alpha_zero.core.network import AlphaZeroNet
+from alpha_zero.core.eval_dataset import build_eval_dataset
+from alpha_zero.core.quantization import quantize_network
+from alpha_zero.core.pipeline import eval_on_pro_games, load_from_file
+from alpha_zero.core.replay import GameReplay, UniformReplay
+from alpha_zero.utils.util import create_logger
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer('board_size', 9, 'Board size for Go.')
+flags.DEFINE_integer('num_stack', 8, 'Stack N previous states, the state is an image of N x 2 + 1 binary planes.')
+flags.DEFINE_integer('num_res_blocks', 10, 'Number of residual blocks in the neural network.')
+flags.DEFINE_integer('num_filters', 128, 'Number of filters for the conv2d layers in the neural network.')
+flags.DEFINE_integer('num_fc_units', 128, 'Number of hidden units in the linear layer of the neural network.')
+flags.DEFINE_string('load_ckpt', '', 'Load the checkpoint file, a random network is used if not set.')
+flags.DEFINE_string('eval_games_dir', './games/pro_games/go/9x9', 'Professional games to evaluate the networks.')
+flags.DEFINE_string(
+    'load_replay',
+    '',
+    'Calibrate on positions from the saved replay state, use the professional games if not set.',
+)
+flags.DEFINE_integer('num_calibration_states', 512, 'Number of positions to calibrate the quantized network.')
+flags.DEFINE_integer('max_eval_states', 20000, 'Maximum number of positions from the professional games to evaluate.')
+flags.DEFINE_string('backend', 'x86', 'Quantized engine, "x86" or "fbgemm" for x86 CPU, "qnnpack" for ARM CPU.')
+flags.DEFINE_multi_integer('batch_sizes', [1, 8, 32], 'Batch sizes to measure the latency.')
+flags.DEFINE_integer('num_threads', 1, 'Number of threads for PyTorch, actors use 1 thread each.')
+flags.DEFINE_integer('seed', 1, 'Seed the runtime.')
+
+
+def load_replay_states(replay_file, num_states, random_state, input_shape):
+    """Returns bit packed states sampled without replacement from the saved replay state."""
+    replay_state = load_from_file(replay_file)
+    if 'move_numbers' in replay_state:
+        replay = GameReplay(len(replay_state['states']), random_state, input_shape)
+    else:
+        capacity = len(replay_state['storage']) if 'storage' in replay_state else len(replay_state['states'])
+        replay = UniformReplay(capacity, random_state)
+    replay.set_state(replay_state)
+    indices = random_state.choice(replay.size, size=min(num_states, replay.size), replace=False)
+    return np.stack([transition.state for transition in replay.get(indices)], axis=0)
+
+
+def measure_ms(model, x, num_runs=20):
+    with torch.no_grad():
+        for _ in range(3):
+            model(x)
+        start = timeit.default_timer()
+        for _ in range(num_runs):
+            model(x)
+    return (timeit.default_timer() - start) / num_runs * 1000
+
+
+@torch.no_grad()
+def compute_drift(network, quantized, dataloader):
+    """Returns the mean KL divergence of the policy, top-1 agreement and max absolute error of the value."""
+    total_kl = total_agreement = total_examples = 0
+    max_value_error = 0.0
+    for states, *_ in dataloader:
+        pi_logits, value = network(states)
+        q_pi_logits, q_value = quantized(states)
+        log_pi = torch.log_softmax(pi_logits, dim=-1)
+        q_log_pi = torch.log_softmax(q_pi_logits, dim=-1)
+        total_kl += (log_pi.exp() * (log_pi - q_log_pi)).sum().item()
+        total_agreement += (pi_logits.argmax(dim=-1) == q_pi_logits.argmax(dim=-1)).sum().item()
+        max_value_error = max(max_value_error, (value - q_value).abs().max().item())
+        total_examples += states.size(0)
+    return {
+        'policy_kl': total_kl / total_examples,
+        'policy_top_1_agreement': total_agreement / total_examples,
+        'value_max_abs_error': max_value_error,
+    }
+
+
+def main(argv):
+    torch.manual_seed(FLAGS.seed)
+    torch.set_num_threads(FLAGS.num_threads)
+    random_state = np.random.RandomState(FLAGS.seed)
+    logger = create_logger('INFO')
+    device = torch.device('cpu')
+
+    input_shape = (FLAGS.num_stack * 2 + 1, FLAGS.board_size, FLAGS.board_size)
+    network = AlphaZeroNet(
+        input_shape,
+        FLAGS.board_size**2 + 1,
+        FLAGS.num_res_blocks,
+        FLAGS.num_filters,
+        FLAGS.num_fc_units,
+    )
+    if FLAGS.load_ckpt and os.path.exists(FLAGS.load_ckpt):
+        network.load_state_dict(torch.load(FLAGS.load_ckpt, map_location=device)['network'])
+    else:
+        logger.warning('No checkpoint loaded, the results are for a random network')
+    network.eval()
+
+    eval_dataset = build_eval_dataset(FLAGS.eval_games_dir, FLAGS.num_stack, logger, board_size=FLAGS.board_size)
+    indices = random_state.permutation(len(eval_dataset))
+    calibration_indices = indices[: FLAGS.num_calibration_states]
+    eval_indices = indices[FLAGS.num_calibration_states :][: FLAGS.max_eval_states]
+
+    if FLAGS.load_replay:
+        calibration_states = load_replay_states(FLAGS.load_replay, FLAGS.num_calibration_states, random_state, input_shape)
+    else:
+        # Hold out the calibration positions from the evaluation.
+        calibration_states = torch.stack([eval_dataset[i][0] for i in calibration_indices], dim=0)
+
+    quantized = quantize_network(network, calibration_states, backend=FLAGS.backend)
+
+    dataloader = DataLoader(Subset(eval_dataset, eval_indices), batch_size=256, shuffle=False)
+
+    float_stats = eval_on_pro_games(network, device, dataloader)
+    quantized_stats = eval_on_pro_games(quantized, device, dataloader)
+
+    print(f'\nEvaluated on {len(eval_indices)} positions from "{FLAGS.eval_games_dir}"')
+    print(f'{"metric":<28}{"float32":>10}{"int8":>10}')
+    for k in float_stats.keys():
+        print(f'{k:<28}{float_stats[k]:>10.4f}{quantized_stats[k]:>10.4f}')
+    for k, v in compute_drift(network, quantized, dataloader).items():
+        print(f'{k:<28}{"":>10}{v:>10.4f}')
+
+    print(f'\n{"batch":<8}{"float32 (ms)":>14}{"int8 (ms)":>12}{"speedup":>9}')
+    for batch_size in FLAGS.batch_sizes:
+        x = torch.rand((batch_size, *input_shape)).round()
+        float_ms = measure_ms(network, x)
+        quantized_ms = measure_ms(quantized, x)
+        print(f'{batch_size:<8}{float_ms:>14.2f}{quantized_ms:>12.2f}{float_ms / quantized_ms:>8.2f}x')
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -0,0 +1,62 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Convert a training checkpoint into a TorchScript module for inference."""
+from absl import app, flags
+import torch
+
+from alpha_zero.core.network import AlphaZeroNet
+from alpha_zero.core.inference import convert_checkpoint, load_torchscript
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_enum('game', 'go', ['go', 'gomoku'], 'The game the checkpoint was trained on.')
+flags.DEFINE_integer('board_size', 19, 'Board size.')
+flags.DEFINE_integer('num_stack', 8, 'Stack N previous states, the state is an image of N x 2 + 1 binary planes.')
+flags.DEFINE_integer('num_res_blocks', 19, 'Number of residual blocks in the neural network.')
+flags.DEFINE_integer('num_filters', 256, 'Number of filters for the conv2d layers in the neural network.')
+flags.DEFINE_integer('num_fc_units', 256, 'Number of hidden units in the linear layer of the neural network.')
+flags.DEFINE_string('load_ckpt', '', 'The checkpoint file to convert.')
+flags.DEFINE_string('output_file', '', 'Save the TorchScript module to this file.')
+flags.DEFINE_string('device', 'cpu', 'Device to run the TorchScript module.')
+
+flags.mark_flags_as_required(['load_ckpt', 'output_file'])
+
+
+def main(argv):
+    device = torch.device(FLAGS.device)
+    input_shape = (FLAGS.num_stack * 2 + 1, FLAGS.board_size, FLAGS.board_size)
+    num_actions = FLAGS.board_size**2 + 1 if FLAGS.game == 'go' else FLAGS.board_size**2
+
+    def network_builder():
+        return AlphaZeroNet(
+            input_shape,
+            num_actions,
+            FLAGS.num_res_blocks,
+            FLAGS.num_filters,
+            FLAGS.num_fc_units,
+            FLAGS.game == 'gomoku',
+        )
+
+    convert_checkpoint(FLAGS.load_ckpt, network_builder, input_shape, FLAGS.output_file, device)
+
+    # Sanity check the saved module against the checkpoint
+    network = network_builder().to(device=device)
+    network.load_state_dict(torch.load(FLAGS.load_ckpt, map_location=device)['network'])
+    network.eval()
+    scripted = load_torchscript(FLAGS.output_file, device)
+
+    x = torch.rand((8, *input_shape), device=device).round()
+    with torch.no_grad():
+        pi_logits, value = network(x)
+        scripted_pi_logits, scripted_value = scripted(x)
+    max_pi_diff = (torch.softmax(pi_logits, dim=-1) - torch.softmax(scripted_pi_logits, dim=-1)).abs().max().item()
+    max_value_diff = (value - scripted_value).abs().max().item()
+    print(f'Saved TorchScript module to "{FLAGS.output_file}", max policy diff {max_pi_diff:.2e}, max value diff {max_value_diff:.2e}')
+
+
+if __name__ == '__main__':
+    app.run(main)
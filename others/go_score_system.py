@@ -11,68 +11,7 @@ it often produces inaccurate scores.
 """
 import numpy as np
 
-N = 9
-
-WHITE, EMPTY, BLACK, FILL, KO, UNKNOWN = range(-1, 5)
-
-ALL_COORDS = [(i, j) for i in range(N) for j in range(N)]
-
-
-def _check_bounds(c):
-    return 0 <= c[0] < N and 0 <= c[1] < N
-
-
-NEIGHBORS = {(x, y): list(filter(_check_bounds, [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)])) for x, y in ALL_COORDS}
-
-
-def place_stones(board, color, stones):
-    for s in stones:
-        board[s] = color
-
-
-def find_reached(board, c):
-    color = board[c]
-    chain = set([c])
-    reached = set()
-    frontier = [c]
-    while frontier:
-        current = frontier.pop()
-        chain.add(current)
-        for n in NEIGHBORS[current]:
-            if board[n] == color and n not in chain:
-                frontier.append(n)
-            elif board[n] != color:
-                reached.add(n)
-    return chain, reached
-
-
-def area_score(board):
-    """Return the area scores for both players following the simplifier Chinese rules.
-
-    Note, this does not handle dead stones, so for some complex games, the score will be incorrect.
-    """
-    board = np.copy(board)
-
-    # Need to remove dead stones from the board first
-
-    while EMPTY in board:
-        unassigned_spaces = np.where(board == EMPTY)
-        c = unassigned_spaces[0][0], unassigned_spaces[1][0]
-        territory, borders = find_reached(board, c)
-        border_colors = set(board[b] for b in borders)
-        X_border = BLACK in border_colors
-        O_border = WHITE in border_colors
-        if X_border and not O_border:
-            territory_color = BLACK
-        elif O_border and not X_border:
-            territory_color = WHITE
-        else:
-            territory_color = UNKNOWN  # dame, or seki
-        place_stones(board, territory_color, territory)
-
-    black_score = np.count_nonzero(board == BLACK)
-    white_score = np.count_nonzero(board == WHITE)
-    return black_score, white_score
+from alpha_zero.envs.go_engine import WHITE, BLACK, area_score, fill_pass_alive_areas
 
 
 # Test cases
@@ -86,6 +25,12 @@ def run_test_on_board(board, komi, actual_black_score, actual_white_score):
     white_score += komi
 
     print(f'Computed - black score: {black_score}, white score: {white_score}')
+
+    # Remove the dead stones inside pass-alive territory before computing the areas
+    black_score, white_score = area_score(fill_pass_alive_areas(board))
+    white_score += komi
+
+    print(f'Pass-alive - black score: {black_score}, white score: {white_score}')
     print(f'Expected - black score: {actual_black_score}, white score: {actual_white_score}')
 
 
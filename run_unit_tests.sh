@@ -6,5 +6,13 @@ set -u -e  # Check for uninitialized variables and exit if any command fails.
 
 python3 -m unit_tests.envs.base_test
 python3 -m unit_tests.envs.gomoku_test
+python3 -m unit_tests.envs.gomoku_threats_test
 python3 -m unit_tests.envs.go_test
+python3 -m unit_tests.game_ring_test
+python3 -m unit_tests.inference_test
+python3 -m unit_tests.network_test
+python3 -m unit_tests.prefetch_test
+python3 -m unit_tests.quantization_test
+python3 -m unit_tests.replay_test
+python3 -m unit_tests.shared_weights_test
 python3 -m unit_tests.transformation_test
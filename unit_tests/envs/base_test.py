@@ -23,7 +23,7 @@ from absl.testing import absltest
 from absl.testing import parameterized
 import numpy as np
 
-from alpha_zero.envs.base import BoardGameEnv
+from alpha_zero.envs.base import BoardGameEnv, VecBoardGameEnv
 
 
 class BoardGameEnvTest(parameterized.TestCase):
@@ -174,5 +174,12 @@ class StackHistoryTest(parameterized.TestCase):
         self.assertTrue(np.array_equal(obs, expected))
 
 
+
+class VecBoardGameEnvTest(absltest.TestCase):
+    def test_step_is_abstract(self):
+        with self.assertRaisesRegex(TypeError, 'abstract'):
+            VecBoardGameEnv(num_envs=2, board_size=7)
+
+
 if __name__ == '__main__':
     absltest.main()
@@ -10,15 +10,15 @@ from absl.testing import absltest
 from absl.testing import parameterized
 import numpy as np
 
-import os
+import copy
+
+from alpha_zero.envs.go import GoEnv, VecGoEnv
+import alpha_zero.envs.go_engine as go
 
 BOARD_SIZE = 19
 STACK_HISTORY = 8
-os.environ['BOARD_SIZE'] = str(BOARD_SIZE)
 
-
-from alpha_zero.envs.go import GoEnv
-import alpha_zero.envs.go_engine as go
+cc = go.get_board_tables(BOARD_SIZE).cc
 
 
 class RunGoEnvTest(parameterized.TestCase):
@@ -150,6 +150,40 @@ class RunGoEnvTest(parameterized.TestCase):
         with self.assertRaisesRegex(RuntimeError, 'Game is over'):
             env.step(6)
 
+    @parameterized.named_parameters(('early_termination', True), ('default', False))
+    def test_game_over_by_settled_outcome(self, early_termination):
+        env = GoEnv(board_size=5, num_stack=STACK_HISTORY, early_termination=early_termination)
+        env.reset()
+
+        # Black builds two groups which enclose the whole board, the last move makes both groups pass-alive,
+        # white passes in between, so the game is not over by passes
+        coords = [(1, c) for c in range(5)] + [(0, 2)] + [(3, c) for c in range(5)]
+        for i, coord in enumerate(coords):
+            _, reward, done, _ = env.step(env.cc.to_flat(coord))
+            if i == len(coords) - 1:
+                break
+            self.assertFalse(done)
+            env.step(env.pass_move)
+
+        self.assertEqual(done, early_termination)
+        self.assertEqual(env.is_game_over(), early_termination)
+        if early_termination:
+            self.assertEqual(reward, 1.0)
+            self.assertEqual(env.winner, env.black_player)
+            self.assertEqual(env.get_result_string(), 'B+17.5')
+            self.assertFalse(env.legal_actions.any())
+        else:
+            self.assertEqual(reward, 0.0)
+            self.assertIsNone(env.winner)
+
+    def test_clone_skips_early_termination(self):
+        env = GoEnv(board_size=5, num_stack=STACK_HISTORY, early_termination=True)
+        env.reset()
+        cloned = env.clone()
+
+        self.assertFalse(cloned.early_termination)
+        self.assertTrue(env.early_termination)
+
     def test_pass_move_steps(self):
         env = GoEnv(num_stack=STACK_HISTORY)
         env.reset()
@@ -284,6 +318,226 @@ class RunGoEnvTest(parameterized.TestCase):
         #         print(pred)
         #         print("\n")
 
+    def test_batch_area_score(self):
+        B, W = go.BLACK, go.WHITE
+        boards = np.zeros((3, 5, 5), dtype=np.int8)
+        # Black owns the left side, white owns the right side, the middle column is split.
+        boards[0, :, 1] = B
+        boards[0, :, 3] = W
+        # Empty region reaching both colors is nobody's territory.
+        boards[1, 0, 0] = B
+        boards[1, 4, 4] = W
+        # Black wall with a white stone inside black's area.
+        boards[2, 2, :] = B
+        boards[2, 0, 0] = W
+
+        black_scores, white_scores = go.batch_area_score(boards)
+        np.testing.assert_equal(black_scores, [10, 1, 15])
+        np.testing.assert_equal(white_scores, [10, 1, 1])
+
+        for board, black_score, white_score in zip(boards, black_scores, white_scores):
+            self.assertEqual(go.area_score(board), (black_score, white_score))
+
+        np.testing.assert_equal(go.batch_score(boards, 0.5), [-0.5, -0.5, 13.5])
+        self.assertEqual(go.batch_result_string(boards, 0.5), ['W+0.5', 'W+0.5', 'B+13.5'])
+
+    def test_batch_area_score_empty_and_full_boards(self):
+        boards = np.stack(
+            [
+                np.zeros((self.expected_board_size, self.expected_board_size), dtype=np.int8),
+                np.full((self.expected_board_size, self.expected_board_size), go.BLACK, dtype=np.int8),
+            ]
+        )
+        black_scores, white_scores = go.batch_area_score(boards)
+        np.testing.assert_equal(black_scores, [0, self.expected_board_size**2])
+        np.testing.assert_equal(white_scores, [0, 0])
+
+    def test_pass_alive_two_eyes(self):
+        B, W = go.BLACK, go.WHITE
+        board = np.zeros((5, 5), dtype=np.int8)
+        board[1, :] = B
+        board[0, 2] = B
+        # White stone inside black's eye is dead.
+        board[0, 0] = W
+
+        alive, territory = go.pass_alive(board, B)
+        np.testing.assert_equal(alive, board == B)
+        expected_territory = np.zeros((5, 5), dtype=np.bool_)
+        expected_territory[0, [0, 1, 3, 4]] = True
+        np.testing.assert_equal(territory, expected_territory)
+
+        alive, territory = go.pass_alive(board, W)
+        self.assertFalse(alive.any())
+        self.assertFalse(territory.any())
+
+    def test_pass_alive_single_eye_is_not_alive(self):
+        B = go.BLACK
+        board = np.zeros((5, 5), dtype=np.int8)
+        board[1, :] = B
+
+        alive, territory = go.pass_alive(board, B)
+        self.assertFalse(alive.any())
+        self.assertFalse(territory.any())
+
+    def test_settled_winner(self):
+        B = go.BLACK
+        board = np.zeros((5, 5), dtype=np.int8)
+        board[1, :] = B
+        board[3, :] = B
+        board[0, 2] = B
+        board[4, 2] = B
+
+        self.assertEqual(go.settled_winner(board, 7.5), go.BLACK)
+        self.assertEqual(go.settled_winner(-board, 7.5), go.WHITE)
+        # Not settled if only one group is alive
+        board[3, :] = 0
+        board[4, 2] = 0
+        self.assertIsNone(go.settled_winner(board, 7.5))
+
+    def test_score_removes_dead_stones_in_pass_alive_territory(self):
+        position = go.Position(komi=7.5)
+        position.board[1, :] = go.BLACK
+        position.board[0, 9] = go.BLACK
+        position.board[0, 3] = go.WHITE
+
+        black_score, white_score = go.area_score(position.board)
+        self.assertEqual((black_score, white_score), (self.expected_board_size**2 - 9, 1))
+        self.assertEqual(position.score(), self.expected_board_size**2 - 7.5)
+
+    def test_liberty_tracker_capture_and_clone(self):
+        position = go.Position()
+        # White stone at A19 in atari.
+        for move in ['B19', 'A19', 'C19', 'K10']:
+            position = position.play_move(cc.from_gtp(move))
+        self.assertEqual(position.lib_tracker.liberty_cache[cc.from_gtp('A19')], 1)
+
+        cloned = copy.deepcopy(position)
+        captured = cloned.play_move(cc.from_gtp('A18'))
+        self.assertEqual(captured.caps, (1, 0))
+        self.assertEqual(captured.board[cc.from_gtp('A19')], go.EMPTY)
+        self.assertEqual(captured.lib_tracker.group_index[cc.from_gtp('A19')], go.MISSING_GROUP_ID)
+
+        # The original position is not affected.
+        self.assertEqual(position.board[cc.from_gtp('A19')], go.WHITE)
+        self.assertEqual(position.lib_tracker.liberty_cache[cc.from_gtp('A19')], 1)
+
+        # Incremental updates agree with rebuilding the tracker from the board.
+        for pos in (position, captured):
+            rebuilt = go.LibertyTracker.from_board(pos.board)
+            np.testing.assert_equal(pos.lib_tracker.liberty_cache, rebuilt.liberty_cache)
+
+        group_id = captured.lib_tracker.group_index[cc.from_gtp('B19')]
+        group = captured.lib_tracker.get_group(group_id)
+        self.assertEqual(group.stones, frozenset(cc.from_gtp(m) for m in ['B19', 'C19']))
+        self.assertEqual(group.liberties, frozenset(cc.from_gtp(m) for m in ['A19', 'B18', 'C18', 'D19']))
+
+    def test_clone(self):
+        env = GoEnv(num_stack=8)
+        env.reset()
+        for move in ['B2', 'A3', 'C3']:
+            env.step(env.gtp_to_action(move))
+
+        cloned = env.clone()
+        # Immutable states are shared
+        self.assertIs(cloned.zobrist_table, env.zobrist_table)
+        self.assertIs(cloned.cc, env.cc)
+        self.assertIs(cloned.board, cloned.position.board)
+        self.assertEqual(list(cloned.history), list(env.history))
+        np.testing.assert_equal(cloned.observation(), env.observation())
+
+        obs = env.observation()
+        history = list(env.history)
+        cloned.step(cloned.gtp_to_action('A1'))
+        cloned.step(cloned.pass_move)
+
+        # The original env is not affected
+        np.testing.assert_equal(env.observation(), obs)
+        self.assertEqual(list(env.history), history)
+        self.assertEqual(env.steps, 3)
+        self.assertEqual(env.board[env.cc.from_gtp('A1')], go.EMPTY)
+        self.assertEqual(len(cloned.history), 5)
+        self.assertEqual(cloned.history[-1].move, cloned.pass_move)
+
+    def test_mixed_board_sizes(self):
+        envs = {board_size: GoEnv(board_size=board_size, num_stack=STACK_HISTORY) for board_size in (9, 13, 19)}
+        for board_size, env in envs.items():
+            self.assertEqual(env.board.shape, (board_size, board_size))
+            self.assertEqual(env.action_dim, board_size**2 + 1)
+            self.assertEqual(env.max_steps, board_size**2 * 2)
+            self.assertEqual(env.position.lib_tracker.board_size, board_size)
+
+        # Capture a corner stone on every board, interleaving the moves between the envs.
+        for move in ['A1', 'B1', 'PASS', 'A2']:
+            for env in envs.values():
+                env.step(env.gtp_to_action(move))
+
+        for board_size, env in envs.items():
+            self.assertEqual(env.board[env.cc.from_gtp('A1')], go.EMPTY)
+            self.assertEqual(env.get_captures()[env.white_player], 1)
+            self.assertEqual(env.position.lib_tracker.liberty_cache[env.cc.from_gtp('B1')], 3)
+            self.assertEqual(env.legal_actions.shape, (board_size**2 + 1,))
+
+        self.assertIs(go.get_board_tables(9), go.get_board_tables(9))
+        self.assertEqual(go.Position(board=np.zeros((13, 13), dtype=np.int8)).board_size, 13)
+
+    def test_vec_env_matches_single_env(self):
+        num_envs = 4
+        rng = np.random.default_rng(2)
+        vec_env = VecGoEnv(num_envs, num_stack=STACK_HISTORY, max_steps=150)
+        envs = [GoEnv(num_stack=STACK_HISTORY, max_steps=150) for _ in range(num_envs)]
+
+        vec_obs = vec_env.reset()
+        obs = np.stack([env.reset() for env in envs])
+        self.assertEqual(vec_obs.shape, (num_envs,) + self.expected_state_shape)
+
+        while not vec_env.dones.all():
+            np.testing.assert_equal(vec_obs, obs)
+            actions = []
+            for i, env in enumerate(envs):
+                if env.is_game_over():
+                    actions.append(0)
+                elif i == 0 and env.steps == 20:
+                    actions.append(env.resign_move)
+                elif rng.random() < 0.05:
+                    actions.append(env.pass_move)
+                else:
+                    actions.append(rng.choice(np.flatnonzero(env.legal_actions[:-1])))
+            actions = np.array(actions)
+            vec_obs, rewards, dones, _ = vec_env.step(actions)
+
+            obs = []
+            for i, env in enumerate(envs):
+                if env.is_game_over():
+                    obs.append(vec_obs[i])
+                    continue
+                o, reward, done, _ = env.step(actions[i])
+                obs.append(o)
+                self.assertEqual(reward, rewards[i])
+                self.assertEqual(done, dones[i])
+                np.testing.assert_equal(env.legal_actions, vec_env.legal_actions[i])
+                np.testing.assert_equal(env.board, vec_env.boards[i])
+                if done:
+                    self.assertEqual(env.get_result_string(), vec_env.get_result_string(i))
+            obs = np.stack(obs)
+
+        # Black resigned at step 20
+        self.assertEqual(vec_env.get_result_string(0), 'W+R')
+
+    def test_lazy_observation_matches_observation(self):
+        env = GoEnv(num_stack=8)
+        env.reset()
+        env.return_lazy_obs = True
+
+        for move in ['B2', 'A3', 'C3', 'A1', 'C1']:
+            obs, _, _, _ = env.step(env.gtp_to_action(move))
+            # Keep a handle to the current state, later steps must not change it.
+            expected = env.observation()
+            self.assertTrue(np.array_equal(obs.materialize(), expected))
+
+        env.step(env.gtp_to_action('C2'))
+        self.assertTrue(np.array_equal(obs.materialize(), expected))
+        self.assertFalse(np.array_equal(obs.materialize(), env.observation()))
+
 
 if __name__ == '__main__':
     absltest.main()
@@ -9,7 +9,7 @@ from absl.testing import absltest
 from absl.testing import parameterized
 import numpy as np
 
-from alpha_zero.envs.gomoku import GomokuEnv
+from alpha_zero.envs.gomoku import GomokuEnv, VecGomokuEnv
 
 
 class GomokuEnvTest(parameterized.TestCase):
@@ -160,6 +160,126 @@ class GomokuEnvTest(parameterized.TestCase):
         self.assertEqual(env.winner, winner_id)
         self.assertEqual(reward, 1.0)
 
+    def test_clone(self):
+        env = GomokuEnv(board_size=7)
+        env.reset()
+        for action in [0, 8, 16]:
+            env.step(action)
+
+        cloned = env.clone()
+        self.assertIs(cloned.zobrist_table, env.zobrist_table)
+        np.testing.assert_equal(cloned.observation(), env.observation())
+
+        obs = env.observation()
+        legal_actions = np.copy(env.legal_actions)
+        cloned.step(24)
+
+        np.testing.assert_equal(env.observation(), obs)
+        np.testing.assert_equal(env.legal_actions, legal_actions)
+        self.assertEqual(env.board[3, 3], 0)
+        self.assertEqual(len(env.history), 3)
+        self.assertEqual(len(cloned.history), 4)
+        self.assertEqual(cloned.to_play, env.opponent_player)
+
+    def test_board_full_draw(self):
+        env = GomokuEnv(board_size=3, num_to_win=4)
+        env.reset()
+        done = False
+        for action in range(9):
+            self.assertFalse(done)
+            _, reward, done, _ = env.step(action)
+            self.assertEqual(reward, 0.0)
+
+        self.assertTrue(done)
+        self.assertTrue(env.is_board_full())
+        self.assertIsNone(env.winner)
+        self.assertEqual(env.get_result_string(), 'DRAW')
+
+    def test_clone_line_runs(self):
+        env = GomokuEnv(board_size=7)
+        env.reset()
+        # Black has four in a row on the first row
+        for action in [0, 14, 1, 16, 2, 20, 3, 24]:
+            env.step(action)
+
+        cloned = env.clone()
+        _, reward, done, _ = cloned.step(4)
+        self.assertEqual(reward, 1.0)
+        self.assertTrue(done)
+
+        # Black plays elsewhere and white blocks the line in the original env
+        env.step(40)
+        env.step(4)
+        self.assertIsNone(env.winner)
+        self.assertFalse(env.is_game_over())
+        self.assertEqual(env.runs[0, 0, 0], 4)
+        self.assertEqual(env.runs[0, 0, 3], 4)
+
+    def test_lazy_observation_matches_observation(self):
+        env = GomokuEnv(board_size=7, num_stack=4)
+        env.reset()
+        env.return_lazy_obs = True
+
+        lazy_obs = []
+        expected = []
+        for action in [0, 8, 16, 24]:
+            obs, _, _, _ = env.step(action)
+            lazy_obs.append(obs)
+            expected.append(env.observation())
+
+        for obs, target in zip(lazy_obs, expected):
+            self.assertTrue(np.array_equal(obs.materialize(), target))
+            self.assertTrue(np.array_equal(np.asarray(obs), target))
+
+
+class VecGomokuEnvTest(parameterized.TestCase):
+    @parameterized.named_parameters(('num_to_win_5', 9, 5), ('num_to_win_4', 7, 4))
+    def test_matches_single_env(self, board_size, num_to_win):
+        num_envs = 8
+        rng = np.random.default_rng(1)
+        vec_env = VecGomokuEnv(num_envs, board_size=board_size, num_to_win=num_to_win, num_stack=4)
+        envs = [GomokuEnv(board_size=board_size, num_to_win=num_to_win, num_stack=4) for _ in range(num_envs)]
+
+        vec_obs = vec_env.reset()
+        obs = np.stack([env.reset() for env in envs])
+        self.assertEqual(vec_obs.shape, (num_envs, 9, board_size, board_size))
+
+        while not vec_env.dones.all():
+            np.testing.assert_equal(vec_obs, obs)
+            actions = np.array([rng.choice(np.flatnonzero(env.legal_actions)) for env in envs])
+            vec_obs, rewards, dones, _ = vec_env.step(actions)
+
+            obs = []
+            for i, env in enumerate(envs):
+                if env.is_game_over():
+                    self.assertEqual(rewards[i], 0.0)
+                    obs.append(vec_obs[i])
+                    continue
+                o, reward, done, _ = env.step(actions[i])
+                obs.append(o)
+                self.assertEqual(reward, rewards[i])
+                self.assertEqual(done, dones[i])
+                np.testing.assert_equal(env.legal_actions, vec_env.legal_actions[i])
+                if done:
+                    self.assertEqual(env.get_result_string(), vec_env.get_result_string(i))
+            obs = np.stack(obs)
+
+    def test_illegal_action(self):
+        vec_env = VecGomokuEnv(2, board_size=7)
+        vec_env.reset()
+        vec_env.step(np.array([0, 1]))
+        with self.assertRaisesRegex(ValueError, 'Illegal'):
+            vec_env.step(np.array([2, 1]))
+
+    def test_reset_indices(self):
+        vec_env = VecGomokuEnv(2, board_size=7)
+        vec_env.reset()
+        vec_env.step(np.array([0, 1]))
+        vec_env.reset([0])
+        self.assertEqual(vec_env.steps.tolist(), [0, 1])
+        self.assertFalse(vec_env.boards[0].any())
+        self.assertEqual(vec_env.boards[1, 0, 1], vec_env.black_player)
+
 
 if __name__ == '__main__':
     absltest.main()
@@ -0,0 +1,117 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Tests for envs.gomoku_threats.py."""
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+
+from alpha_zero.envs.gomoku import GomokuEnv
+from alpha_zero.envs.gomoku_threats import GomokuThreatSolver, build_line_windows
+
+
+def make_env(board_size, black_moves, white_moves, to_play=1):
+    """Set up the board directly from lists of (row, col) coordinates."""
+    env = GomokuEnv(board_size=board_size)
+    env.reset()
+    for color, moves in ((env.black_player, black_moves), (env.white_player, white_moves)):
+        for x, y in moves:
+            env.board[x, y] = color
+            env.legal_actions[env.coords_to_action((x, y))] = 0
+    env.to_play = to_play
+    return env
+
+
+class GomokuThreatSolverTest(parameterized.TestCase):
+    @parameterized.named_parameters(('9x9_5', 9, 5), ('15x15_5', 15, 5), ('7x7_4', 7, 4))
+    def test_line_windows(self, board_size, num_to_win):
+        windows = build_line_windows(board_size, num_to_win)
+        num_lines = board_size - num_to_win + 1
+        self.assertEqual(windows.shape, (2 * board_size * num_lines + 2 * num_lines**2, num_to_win))
+        self.assertTrue(np.all((windows >= 0) & (windows < board_size**2)))
+
+    def test_immediate_win(self):
+        env = make_env(9, [(4, 1), (4, 2), (4, 3), (4, 4)], [(0, 0), (0, 1), (0, 2), (0, 3)])
+        result = GomokuThreatSolver(9)(env)
+        self.assertIn(result.move, (env.coords_to_action((4, 0)), env.coords_to_action((4, 5))))
+        self.assertEqual(result.value, 1.0)
+
+    def test_forced_block(self):
+        env = make_env(9, [(8, 8), (7, 8), (1, 1)], [(2, 2), (3, 3), (4, 4), (5, 5)])
+        result = GomokuThreatSolver(9)(env)
+        self.assertEqual(result.move, env.coords_to_action((6, 6)))
+        self.assertIsNone(result.value)
+        self.assertIsNone(result.root_mask)
+
+    def test_double_block_lost_position(self):
+        env = make_env(9, [(8, 8), (7, 8), (0, 8)], [(2, 2), (3, 3), (4, 4), (5, 5)])
+        result = GomokuThreatSolver(9)(env)
+        self.assertIsNone(result.move)
+        expected = np.zeros(81, dtype=bool)
+        expected[[env.coords_to_action((1, 1)), env.coords_to_action((6, 6))]] = True
+        np.testing.assert_array_equal(result.root_mask, expected)
+
+    def test_vcf(self):
+        # Black makes a four at (2, 6), white blocks at (2, 2), then black makes a double four at (4, 6).
+        black = [(2, 3), (2, 4), (2, 5), (3, 6), (5, 6), (3, 7), (5, 5), (6, 4)]
+        white = [(2, 7), (2, 1), (6, 6), (7, 3), (0, 0), (8, 8), (8, 0), (0, 8)]
+        env = make_env(9, black, white)
+        solver = GomokuThreatSolver(9)
+        sequence = solver.find_vcf(env.board.flatten(), env.black_player, env.white_player)
+        self.assertEqual(sequence, [env.coords_to_action(coords) for coords in ((2, 6), (2, 2), (4, 6))])
+
+        result = solver(env)
+        self.assertEqual(result.move, sequence[0])
+        self.assertEqual(result.value, 1.0)
+
+        # Black has two winning moves at the end of the VCF sequence, at (1, 6) and (2, 8).
+        board = env.board.flatten()
+        board[sequence[::2]] = env.black_player
+        board[sequence[1::2]] = env.white_player
+        winning_moves = solver.winning_moves(board, env.black_player)
+        self.assertCountEqual(winning_moves, [env.coords_to_action((1, 6)), env.coords_to_action((2, 8))])
+
+    def test_vcf_depth_limit(self):
+        black = [(2, 3), (2, 4), (2, 5), (3, 6), (5, 6), (3, 7), (5, 5), (6, 4)]
+        white = [(2, 7), (2, 1), (6, 6), (7, 3), (0, 0), (8, 8), (8, 0), (0, 8)]
+        env = make_env(9, black, white)
+        solver = GomokuThreatSolver(9, max_vcf_depth=1)
+        self.assertIsNone(solver.find_vcf(env.board.flatten(), env.black_player, env.white_player))
+
+    def test_no_threats(self):
+        env = make_env(9, [(4, 4)], [(3, 3)])
+        result = GomokuThreatSolver(9)(env)
+        self.assertIsNone(result.move)
+        self.assertIsNone(result.root_mask)
+
+    def test_prune_root_against_opponent_vcf(self):
+        # Black to move has no fours, white has an open three which is a VCF.
+        black = [(0, 0), (8, 8)]
+        white = [(4, 3), (4, 4), (4, 5)]
+        env = make_env(9, black, white)
+        result = GomokuThreatSolver(9)(env)
+        self.assertIsNone(result.move)
+        self.assertIsNotNone(result.root_mask)
+        for x, y in ((4, 2), (4, 6)):
+            self.assertTrue(result.root_mask[env.coords_to_action((x, y))])
+        self.assertFalse(result.root_mask[env.coords_to_action((0, 8))])
+        self.assertTrue(np.all(env.legal_actions[result.root_mask] == 1))
+
+    def test_board_left_unchanged(self):
+        black = [(2, 3), (2, 4), (2, 5), (3, 6), (5, 6), (3, 7), (5, 5), (6, 4)]
+        white = [(2, 7), (2, 1), (6, 6), (7, 3), (0, 0), (8, 8), (8, 0), (0, 8)]
+        env = make_env(9, black, white)
+        board = env.board.copy()
+        GomokuThreatSolver(9)(env)
+        np.testing.assert_array_equal(env.board, board)
+
+    def test_mismatched_env(self):
+        with self.assertRaisesRegex(ValueError, 'board size'):
+            GomokuThreatSolver(9)(GomokuEnv(board_size=7))
+
+
+if __name__ == '__main__':
+    absltest.main()
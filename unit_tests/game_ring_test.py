@@ -0,0 +1,97 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Tests for core.game_ring.py."""
+import multiprocessing as mp
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+
+from alpha_zero.core.game_ring import GameSlot, SharedGameRing
+from alpha_zero.core.network import pack_states
+from alpha_zero.core.replay import Transition, UniformReplay
+
+
+INPUT_SHAPE = (17, 9, 9)
+STATE_SIZE = (int(np.prod(INPUT_SHAPE)) + 7) // 8
+NUM_ACTIONS = 82
+
+
+def random_game(game_length, seed=1, packed=True):
+    random_state = np.random.RandomState(seed)
+    states = random_state.randint(0, 2, size=(game_length, *INPUT_SHAPE)).astype(np.int8)
+    pi_probs = random_state.dirichlet(np.ones(NUM_ACTIONS), size=game_length).astype(np.float32)
+    values = random_state.choice([-1.0, 1.0], size=game_length)
+    return [
+        Transition(state=pack_states(states[i]) if packed else states[i], pi_prob=pi_probs[i], value=float(values[i]))
+        for i in range(game_length)
+    ]
+
+
+def put_game_in_child(game_ring, data_queue):
+    data_queue.put(game_ring.put(random_game(30, seed=2)))
+
+
+class SharedGameRingTest(parameterized.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.game_ring = SharedGameRing(num_slots=2, max_game_length=50, state_size=STATE_SIZE, num_actions=NUM_ACTIONS)
+
+    def assert_game_equal(self, game, game_seq):
+        np.testing.assert_array_equal(game.state, np.stack([pack_states(t.state) for t in game_seq]))
+        np.testing.assert_array_equal(game.pi_prob, np.stack([t.pi_prob for t in game_seq]))
+        np.testing.assert_array_equal(game.value, [t.value for t in game_seq])
+
+    @parameterized.named_parameters(('packed', True), ('unpacked', False))
+    def test_put_and_get(self, packed):
+        game_seq = random_game(40, packed=packed)
+        slot = self.game_ring.put(game_seq)
+        self.assertEqual(slot.length, 40)
+        self.assert_game_equal(self.game_ring.get(slot), random_game(40, packed=False))
+
+    def test_long_game(self):
+        self.assertIsNone(self.game_ring.put(random_game(51)))
+
+    def test_no_free_slot(self):
+        slots = [self.game_ring.put(random_game(10), timeout=1) for _ in range(2)]
+        self.assertNotEqual(slots[0].index, slots[1].index)
+        self.assertIsNone(self.game_ring.put(random_game(10), timeout=0.1))
+
+        self.game_ring.release(slots[0])
+        self.assertEqual(self.game_ring.put(random_game(10), timeout=1).index, slots[0].index)
+
+    def test_child_process(self):
+        data_queue = mp.Queue()
+        process = mp.Process(target=put_game_in_child, args=(self.game_ring, data_queue))
+        process.start()
+        slot = data_queue.get(timeout=60)
+        process.join()
+
+        self.assertIsInstance(slot, GameSlot)
+        self.assert_game_equal(self.game_ring.get(slot), random_game(30, seed=2, packed=False))
+
+    def test_add_to_replay(self):
+        game_seq = random_game(40)
+        replay = UniformReplay(100, np.random.RandomState(1))
+        slot = self.game_ring.put(game_seq)
+        replay.add_game(self.game_ring.get(slot))
+        self.game_ring.release(slot)
+
+        expected_replay = UniformReplay(100, np.random.RandomState(1))
+        expected_replay.add_game(game_seq)
+        self.assertEqual(replay.num_samples_added, 40)
+        for name in ('states', 'pi_probs', 'values'):
+            np.testing.assert_array_equal(getattr(replay, name), getattr(expected_replay, name))
+
+    def test_invalid_args(self):
+        with self.assertRaisesRegex(ValueError, 'num_slots'):
+            SharedGameRing(num_slots=0, max_game_length=50, state_size=STATE_SIZE, num_actions=NUM_ACTIONS)
+
+
+if __name__ == '__main__':
+    # Same as the training scripts
+    mp.set_start_method('spawn')
+    absltest.main()
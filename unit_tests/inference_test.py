@@ -0,0 +1,130 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Tests for core.inference.py."""
+import os
+import tempfile
+from absl.testing import absltest
+from absl.testing import parameterized
+import torch
+
+from alpha_zero.core.network import AlphaZeroNet
+from alpha_zero.core.inference import (
+    AutocastNetwork,
+    compute_inference_drift,
+    convert_checkpoint,
+    export_torchscript,
+    fuse_network,
+    load_torchscript,
+)
+
+
+INPUT_SHAPE = (17, 9, 9)
+NUM_ACTIONS = 9 * 9 + 1
+
+
+def build_network():
+    return AlphaZeroNet(INPUT_SHAPE, NUM_ACTIONS, num_res_block=2, num_filters=16, num_fc_units=16)
+
+
+class InferenceTest(parameterized.TestCase):
+    def setUp(self):
+        super().setUp()
+        torch.manual_seed(1)
+        self.network = build_network()
+        # Non-trivial BatchNorm statistics, so folding them into the conv layers actually changes the weights.
+        for module in self.network.modules():
+            if isinstance(module, torch.nn.BatchNorm2d):
+                module.running_mean.uniform_(-0.5, 0.5)
+                module.running_var.uniform_(0.5, 2.0)
+                module.weight.data.uniform_(0.5, 1.5)
+                module.bias.data.uniform_(-0.2, 0.2)
+        self.network.eval()
+
+    def assert_same_outputs(self, scripted, batch_size):
+        x = torch.rand((batch_size, *INPUT_SHAPE)).round()
+        with torch.no_grad():
+            pi_logits, value = self.network(x)
+            scripted_pi_logits, scripted_value = scripted(x)
+        self.assertEqual(scripted_pi_logits.shape, (batch_size, NUM_ACTIONS))
+        self.assertEqual(scripted_value.shape, (batch_size, 1))
+        torch.testing.assert_close(scripted_pi_logits, pi_logits, atol=1e-4, rtol=1e-4)
+        torch.testing.assert_close(scripted_value, value, atol=1e-4, rtol=1e-4)
+
+    @parameterized.named_parameters(('batch_1', 1), ('batch_8', 8), ('batch_32', 32))
+    def test_torchscript_matches_eager(self, batch_size):
+        scripted = export_torchscript(self.network, INPUT_SHAPE)
+        self.assert_same_outputs(scripted, batch_size)
+
+    def test_export_restores_training_mode(self):
+        self.network.train()
+        export_torchscript(self.network, INPUT_SHAPE)
+        self.assertTrue(self.network.training)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_file = os.path.join(tmp_dir, 'network.pt')
+            export_torchscript(self.network, INPUT_SHAPE, output_file)
+            scripted = load_torchscript(output_file)
+        self.assert_same_outputs(scripted, 4)
+
+    def test_convert_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ckpt_file = os.path.join(tmp_dir, 'training_steps_100.ckpt')
+            output_file = os.path.join(tmp_dir, 'network.pt')
+            torch.save({'network': self.network.state_dict(), 'training_steps': 100}, ckpt_file)
+            convert_checkpoint(ckpt_file, build_network, INPUT_SHAPE, output_file)
+            scripted = load_torchscript(output_file)
+        self.assert_same_outputs(scripted, 4)
+
+    @parameterized.named_parameters(('batch_1', 1), ('batch_8', 8))
+    def test_fused_matches_eager(self, batch_size):
+        fused = fuse_network(self.network)
+        self.assertFalse(any(isinstance(m, torch.nn.BatchNorm2d) for m in fused.modules()))
+        self.assertFalse(fused.training)
+        self.assertFalse(any(p.requires_grad for p in fused.parameters()))
+        self.assert_same_outputs(fused, batch_size)
+
+    def test_fuse_leaves_network_unchanged(self):
+        state_dict = {k: v.clone() for k, v in self.network.state_dict().items()}
+        fuse_network(self.network)
+        self.assertIsInstance(self.network.conv_block[1], torch.nn.BatchNorm2d)
+        for k, v in self.network.state_dict().items():
+            torch.testing.assert_close(v, state_dict[k])
+
+    @parameterized.named_parameters(
+        ('fp32_channels_last', False, True),
+        ('bf16', True, False),
+        ('bf16_channels_last', True, True),
+    )
+    def test_autocast_network(self, use_bf16, channels_last):
+        network = AutocastNetwork(fuse_network(self.network), use_bf16, channels_last)
+        x = torch.rand((8, *INPUT_SHAPE)).round()
+        with torch.no_grad():
+            pi_logits, value = network(x)
+        self.assertEqual(pi_logits.dtype, torch.float32)
+        self.assertEqual(value.dtype, torch.float32)
+
+        policy_drift, value_drift = compute_inference_drift(self.network, network, x)
+        limit = 0.05 if use_bf16 else 1e-4
+        self.assertLess(policy_drift, limit)
+        self.assertLess(value_drift, limit)
+
+    def test_inference_drift_same_network(self):
+        x = torch.rand((8, *INPUT_SHAPE)).round()
+        policy_drift, value_drift = compute_inference_drift(self.network, self.network, x, batch_size=3)
+        self.assertEqual(policy_drift, 0.0)
+        self.assertEqual(value_drift, 0.0)
+
+    def test_missing_files(self):
+        with self.assertRaisesRegex(ValueError, 'TorchScript file'):
+            load_torchscript('/not/exists/network.pt')
+        with self.assertRaisesRegex(ValueError, 'checkpoint file'):
+            convert_checkpoint('/not/exists/training_steps_100.ckpt', build_network, INPUT_SHAPE, '/tmp/network.pt')
+
+
+if __name__ == '__main__':
+    absltest.main()
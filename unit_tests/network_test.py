@@ -0,0 +1,75 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Tests for core.network.py."""
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+import torch
+
+from alpha_zero.core.network import AlphaZeroNet, UnpackStates, pack_states, unpack_states
+from alpha_zero.core.quantization import quantize_network
+
+
+class PackStatesTest(parameterized.TestCase):
+    @parameterized.named_parameters(('go_9x9', (17, 9, 9)), ('go_19x19', (17, 19, 19)), ('gomoku_15x15', (17, 15, 15)))
+    def test_pack_and_unpack(self, input_shape):
+        states = np.random.RandomState(1).randint(0, 2, size=(4, *input_shape)).astype(np.int8)
+        packed = pack_states(states)
+        num_bytes = (int(np.prod(input_shape)) + 7) // 8
+        self.assertEqual(packed.shape, (4, num_bytes))
+        self.assertEqual(packed.dtype, np.uint8)
+        np.testing.assert_array_equal(unpack_states(packed, input_shape), states)
+
+        # Single state
+        self.assertEqual(pack_states(states[0]).shape, (num_bytes,))
+        np.testing.assert_array_equal(unpack_states(pack_states(states[0]), input_shape), states[0])
+
+    def test_unpack_module(self):
+        input_shape = (17, 9, 9)
+        states = np.random.RandomState(1).randint(0, 2, size=(8, *input_shape)).astype(np.int8)
+        unpack = UnpackStates(input_shape)
+
+        x = unpack(torch.from_numpy(pack_states(states)))
+        self.assertEqual(x.dtype, torch.float32)
+        np.testing.assert_array_equal(x.numpy(), states)
+
+        # Unpacked states are passed through
+        np.testing.assert_array_equal(unpack(torch.from_numpy(states)).numpy(), states)
+
+
+class AlphaZeroNetTest(parameterized.TestCase):
+    def setUp(self):
+        super().setUp()
+        torch.manual_seed(1)
+        self.input_shape = (17, 9, 9)
+        self.network = AlphaZeroNet(self.input_shape, 82, num_res_block=2, num_filters=16, num_fc_units=16)
+        self.network.eval()
+        self.states = np.random.RandomState(1).randint(0, 2, size=(8, *self.input_shape)).astype(np.int8)
+
+    def test_packed_inputs(self):
+        with torch.no_grad():
+            pi_logits, value = self.network(torch.from_numpy(self.states).to(dtype=torch.float32))
+            packed_pi_logits, packed_value = self.network(torch.from_numpy(pack_states(self.states)))
+        torch.testing.assert_close(packed_pi_logits, pi_logits)
+        torch.testing.assert_close(packed_value, value)
+
+    def test_state_dict_compatible(self):
+        state_dict = self.network.state_dict()
+        self.assertFalse(any('unpack_states' in k for k in state_dict.keys()))
+        AlphaZeroNet(self.input_shape, 82, num_res_block=2, num_filters=16, num_fc_units=16).load_state_dict(state_dict)
+
+    def test_quantized_packed_inputs(self):
+        quantized = quantize_network(self.network, pack_states(self.states))
+        with torch.no_grad():
+            pi_logits, value = quantized(torch.from_numpy(self.states))
+            packed_pi_logits, packed_value = quantized(torch.from_numpy(pack_states(self.states)))
+        torch.testing.assert_close(packed_pi_logits, pi_logits)
+        torch.testing.assert_close(packed_value, value)
+
+
+if __name__ == '__main__':
+    absltest.main()
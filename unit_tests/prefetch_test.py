@@ -0,0 +1,109 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Tests for core.prefetch.py."""
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+import torch
+
+from alpha_zero.core.network import AlphaZeroNet, unpack_states
+from alpha_zero.core.pipeline import compute_losses
+from alpha_zero.core.prefetch import BatchPrefetcher
+from alpha_zero.core.replay import Transition, UniformReplay
+
+
+INPUT_SHAPE = (17, 9, 9)
+NUM_ACTIONS = 82
+
+
+class BatchPrefetcherTest(parameterized.TestCase):
+    def setUp(self):
+        super().setUp()
+        random_state = np.random.RandomState(1)
+        self.replay = UniformReplay(200, random_state)
+        states = random_state.randint(0, 2, size=(100, *INPUT_SHAPE)).astype(np.int8)
+        pi_probs = random_state.dirichlet(np.ones(NUM_ACTIONS), size=100).astype(np.float32)
+        self.replay.add_game([Transition(state=states[i], pi_prob=pi_probs[i], value=1.0) for i in range(100)])
+        self.stored_states = {state.tobytes() for state in states}
+
+    def test_batches(self):
+        prefetcher = BatchPrefetcher(self.replay, 16, torch.device('cpu'), INPUT_SHAPE, num_batches=2).start()
+        try:
+            batches = [prefetcher.get() for _ in range(5)]
+        finally:
+            prefetcher.stop()
+
+        self.assertEqual(prefetcher.num_batches_taken, 5)
+        for batch in batches:
+            self.assertEqual(batch.state.dtype, torch.uint8)
+            self.assertEqual(tuple(batch.pi_prob.shape), (16, NUM_ACTIONS))
+            self.assertEqual(tuple(batch.value.shape), (16,))
+            # The batches are copies, not the reused buffers of the replay
+            for state in unpack_states(batch.state.numpy(), INPUT_SHAPE):
+                self.assertIn(state.tobytes(), self.stored_states)
+
+    def test_argumentation(self):
+        prefetcher = BatchPrefetcher(self.replay, 16, torch.device('cpu'), INPUT_SHAPE, argumentation=True).start()
+        try:
+            batch = prefetcher.get()
+        finally:
+            prefetcher.stop()
+
+        self.assertEqual(tuple(batch.state.shape), (16, *INPUT_SHAPE))
+        self.assertEqual(batch.state.dtype, torch.float32)
+        torch.testing.assert_close(batch.pi_prob.sum(dim=-1), torch.ones(16), atol=1e-5, rtol=0)
+
+        network = AlphaZeroNet(INPUT_SHAPE, NUM_ACTIONS, num_res_block=1, num_filters=8, num_fc_units=8)
+        pi_loss, v_loss = compute_losses(network, torch.device('cpu'), batch)
+        self.assertTrue(torch.isfinite(pi_loss) and torch.isfinite(v_loss))
+
+    def test_restart_drops_queued_batches(self):
+        prefetcher = BatchPrefetcher(self.replay, 16, torch.device('cpu'), INPUT_SHAPE, num_batches=2).start()
+        try:
+            prefetcher.get()
+        finally:
+            prefetcher.stop()
+        self.assertTrue(prefetcher.batches.empty())
+
+        # The batches after the restart are only sampled from the new replay
+        random_state = np.random.RandomState(2)
+        states = random_state.randint(0, 2, size=(50, *INPUT_SHAPE)).astype(np.int8)
+        pi_probs = random_state.dirichlet(np.ones(NUM_ACTIONS), size=50).astype(np.float32)
+        prefetcher.replay = UniformReplay(100, random_state)
+        prefetcher.replay.add_game([Transition(state=states[i], pi_prob=pi_probs[i], value=1.0) for i in range(50)])
+        new_states = {state.tobytes() for state in states}
+
+        prefetcher.start()
+        try:
+            batch = prefetcher.get()
+        finally:
+            prefetcher.stop()
+        for state in unpack_states(batch.state.numpy(), INPUT_SHAPE):
+            self.assertIn(state.tobytes(), new_states)
+
+    def test_not_enough_samples(self):
+        prefetcher = BatchPrefetcher(self.replay, 128, torch.device('cpu'), INPUT_SHAPE).start()
+        self.assertIsNone(prefetcher.make_batch())
+        prefetcher.stop()
+        self.assertIsNone(prefetcher.thread)
+
+    def test_error(self):
+        prefetcher = BatchPrefetcher(self.replay, 16, torch.device('cpu'), INPUT_SHAPE)
+        prefetcher.replay = None
+        prefetcher.start()
+        with self.assertRaisesRegex(RuntimeError, 'prefetching'):
+            prefetcher.get()
+        prefetcher.stop()
+
+    @parameterized.named_parameters(('batch_size', 0, 2), ('num_batches', 16, 0))
+    def test_invalid_args(self, batch_size, num_batches):
+        with self.assertRaisesRegex(ValueError, 'positive'):
+            BatchPrefetcher(self.replay, batch_size, torch.device('cpu'), INPUT_SHAPE, num_batches=num_batches)
+
+
+if __name__ == '__main__':
+    absltest.main()
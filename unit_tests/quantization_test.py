@@ -0,0 +1,65 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Tests for core.quantization.py."""
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+import torch
+
+from alpha_zero.core.network import AlphaZeroNet
+from alpha_zero.core.quantization import quantize_network
+
+
+INPUT_SHAPE = (17, 9, 9)
+NUM_ACTIONS = 9 * 9 + 1
+
+
+class QuantizationTest(parameterized.TestCase):
+    def setUp(self):
+        super().setUp()
+        torch.manual_seed(1)
+        self.network = AlphaZeroNet(INPUT_SHAPE, NUM_ACTIONS, num_res_block=2, num_filters=16, num_fc_units=16)
+        # Scale down the weights to keep the activations in a realistic range like a trained network.
+        with torch.no_grad():
+            for p in self.network.parameters():
+                p.mul_(0.5)
+        self.network.eval()
+        self.states = np.random.RandomState(1).randint(0, 2, size=(128, *INPUT_SHAPE)).astype(np.int8)
+
+    @parameterized.named_parameters(('batch_1', 1), ('batch_32', 32))
+    def test_close_to_float_network(self, batch_size):
+        quantized = quantize_network(self.network, self.states)
+        x = torch.from_numpy(self.states[:batch_size]).to(dtype=torch.float32)
+        with torch.no_grad():
+            pi_logits, value = self.network(x)
+            q_pi_logits, q_value = quantized(x)
+
+        self.assertEqual(q_pi_logits.shape, pi_logits.shape)
+        self.assertEqual(q_value.shape, value.shape)
+        self.assertEqual(q_pi_logits.dtype, torch.float32)
+        self.assertEqual(q_value.dtype, torch.float32)
+        pi = torch.softmax(pi_logits, dim=-1)
+        q_pi = torch.softmax(q_pi_logits, dim=-1)
+        self.assertLess((pi - q_pi).abs().max().item(), 0.05)
+        self.assertLess((value - q_value).abs().max().item(), 0.1)
+
+    def test_float_network_unchanged(self):
+        state_dict = {k: v.clone() for k, v in self.network.state_dict().items()}
+        quantize_network(self.network, self.states)
+        for k, v in self.network.state_dict().items():
+            torch.testing.assert_close(v, state_dict[k])
+        self.assertIsInstance(self.network.res_blocks[0].conv_block1[1], torch.nn.BatchNorm2d)
+
+    def test_invalid_inputs(self):
+        with self.assertRaisesRegex(ValueError, 'calibration_states'):
+            quantize_network(self.network, self.states[:0])
+        with self.assertRaisesRegex(ValueError, 'backend'):
+            quantize_network(self.network, self.states, backend='not_a_backend')
+
+
+if __name__ == '__main__':
+    absltest.main()
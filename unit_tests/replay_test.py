@@ -0,0 +1,372 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Tests for core.replay.py."""
+import os
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+
+from alpha_zero.envs.go import GoEnv
+from alpha_zero.envs.gomoku import GomokuEnv
+from alpha_zero.core.network import pack_states, unpack_states
+from alpha_zero.core.replay import (
+    GameReplay,
+    Transition,
+    UniformReplay,
+    compress_array,
+    decode_sparse_policies,
+    encode_sparse_policies,
+    stack_game,
+)
+
+
+INPUT_SHAPE = (17, 9, 9)
+NUM_ACTIONS = 82
+
+
+def make_game(random_state, game_length):
+    states = random_state.randint(0, 2, size=(game_length, *INPUT_SHAPE)).astype(np.int8)
+    pi_probs = random_state.dirichlet(np.ones(NUM_ACTIONS), size=game_length).astype(np.float32)
+    values = random_state.choice([-1.0, 1.0], size=game_length)
+    return [Transition(state=states[i], pi_prob=pi_probs[i], value=float(values[i])) for i in range(game_length)]
+
+
+class UniformReplayTest(parameterized.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.random_state = np.random.RandomState(1)
+
+    def assert_transition_equal(self, stored, expected):
+        np.testing.assert_array_equal(unpack_states(stored.state, INPUT_SHAPE), expected.state)
+        np.testing.assert_array_equal(stored.pi_prob, expected.pi_prob)
+        self.assertEqual(stored.value, expected.value)
+
+    def test_add_game(self):
+        replay = UniformReplay(100, self.random_state)
+        game = make_game(self.random_state, 30)
+        replay.add_game(game)
+
+        self.assertEqual(replay.size, 30)
+        self.assertEqual(replay.num_games_added, 1)
+        self.assertEqual(replay.states.dtype, np.uint8)
+        for stored, expected in zip(replay.get(range(30)), game):
+            self.assert_transition_equal(stored, expected)
+
+    @parameterized.named_parameters(('shorter_than_capacity', 7), ('longer_than_capacity', 25))
+    def test_wrap_around(self, game_length):
+        capacity = 20
+        replay = UniformReplay(capacity, self.random_state)
+        games = [make_game(self.random_state, game_length) for _ in range(3)]
+        for game in games:
+            replay.add_game(game)
+
+        transitions = [transition for game in games for transition in game]
+        self.assertEqual(replay.num_samples_added, len(transitions))
+        self.assertEqual(replay.size, capacity)
+        for i, expected in enumerate(transitions[-capacity:]):
+            index = (len(transitions) - capacity + i) % capacity
+            self.assert_transition_equal(replay.get([index])[0], expected)
+
+    def test_add_packed_transition(self):
+        replay = UniformReplay(10, self.random_state)
+        game = make_game(self.random_state, 3)
+        for transition in game:
+            replay.add(transition._replace(state=pack_states(transition.state)))
+
+        self.assertEqual(replay.size, 3)
+        for stored, expected in zip(replay.get(range(3)), game):
+            self.assert_transition_equal(stored, expected)
+
+    def test_sample(self):
+        replay = UniformReplay(100, self.random_state)
+        self.assertIsNone(replay.sample(8))
+
+        replay.add_game(make_game(self.random_state, 50))
+        batch = replay.sample(32)
+        self.assertEqual(batch.state.shape, (32, replay.states.shape[1]))
+        self.assertEqual(batch.pi_prob.shape, (32, NUM_ACTIONS))
+        self.assertEqual(batch.value.shape, (32,))
+
+        # Each sampled pi_prob should match the stored item with the same state
+        for state, pi_prob in zip(batch.state, batch.pi_prob):
+            matches = np.all(replay.states[: replay.size] == state, axis=-1)
+            self.assertTrue(np.any(np.all(replay.pi_probs[: replay.size][matches] == pi_prob, axis=-1)))
+
+        # The batch buffers are reused
+        self.assertIs(replay.sample(32).state, batch.state)
+
+    def test_set_state(self):
+        replay = UniformReplay(40, self.random_state)
+        replay.add_game(make_game(self.random_state, 50))
+
+        new_replay = UniformReplay(40, self.random_state)
+        new_replay.set_state(replay.get_state())
+        self.assertEqual(new_replay.num_samples_added, 50)
+        np.testing.assert_array_equal(new_replay.states, replay.states)
+        np.testing.assert_array_equal(new_replay.pi_probs, replay.pi_probs)
+        np.testing.assert_array_equal(new_replay.values, replay.values)
+
+    def test_set_legacy_state(self):
+        game = make_game(self.random_state, 5)
+        storage = [transition._replace(state=compress_array(transition.state)) for transition in game] + [None] * 5
+        replay = UniformReplay(10, self.random_state)
+        replay.set_state({'num_games_added': 1, 'num_samples_added': 5, 'storage': storage})
+
+        self.assertEqual(replay.size, 5)
+        for stored, expected in zip(replay.get(range(5)), game):
+            self.assert_transition_equal(stored, expected)
+
+
+class MemoryMappedReplayTest(parameterized.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.random_state = np.random.RandomState(1)
+        self.storage_dir = self.create_tempdir().full_path
+
+    @parameterized.named_parameters(('dense', 0), ('sparse', 8))
+    def test_resume(self, policy_top_k):
+        replay = UniformReplay(50, self.random_state, policy_top_k, storage_dir=self.storage_dir)
+        for _ in range(3):
+            replay.add_game(make_game(self.random_state, 20))
+        self.assertIsInstance(replay.states, np.memmap)
+        replay.flush()
+        # Games added after the last flush are lost, as after the learner process crashed
+        replay.add_game(make_game(self.random_state, 20))
+
+        resumed = UniformReplay(50, self.random_state, policy_top_k, storage_dir=self.storage_dir)
+        self.assertEqual(resumed.num_games_added, 3)
+        self.assertEqual(resumed.num_samples_added, 60)
+        self.assertEqual(resumed.array_names, replay.array_names)
+        indices = np.arange(replay.size)
+        for stored, expected in zip(resumed.get(indices), replay.get(indices)):
+            np.testing.assert_array_equal(stored.state, expected.state)
+            np.testing.assert_array_equal(stored.pi_prob, expected.pi_prob)
+            self.assertEqual(stored.value, expected.value)
+
+        # Keep appending in place
+        resumed.add_game(make_game(self.random_state, 5))
+        resumed.flush()
+        self.assertEqual(UniformReplay(50, self.random_state, policy_top_k, storage_dir=self.storage_dir).size, 50)
+        self.assertIsNotNone(resumed.sample(16))
+
+    def test_resume_game_replay(self):
+        env = GoEnv(board_size=9, num_stack=8)
+        replay = GameReplay(500, self.random_state, env.observation_space.shape, storage_dir=self.storage_dir)
+        replay.add_game(play_random_game(env, self.random_state))
+        replay.flush()
+
+        resumed = GameReplay(500, self.random_state, env.observation_space.shape, storage_dir=self.storage_dir)
+        self.assertIsInstance(resumed.move_numbers, np.memmap)
+        indices = np.arange(replay.size)
+        for stored, expected in zip(resumed.get(indices), replay.get(indices)):
+            np.testing.assert_array_equal(stored.state, expected.state)
+
+    def test_capacity_mismatch(self):
+        replay = UniformReplay(50, self.random_state, storage_dir=self.storage_dir)
+        replay.add_game(make_game(self.random_state, 5))
+        replay.flush()
+        with self.assertRaisesRegex(ValueError, 'capacity 60'):
+            UniformReplay(60, self.random_state, storage_dir=self.storage_dir)
+
+    def test_replay_class_mismatch(self):
+        replay = UniformReplay(50, self.random_state, storage_dir=self.storage_dir)
+        replay.add_game(make_game(self.random_state, 5))
+        replay.flush()
+        with self.assertRaisesRegex(ValueError, 'replay_class GameReplay'):
+            GameReplay(50, self.random_state, (9, 9, 9), storage_dir=self.storage_dir)
+
+    def test_input_shape_mismatch(self):
+        env = GoEnv(board_size=9, num_stack=8)
+        replay = GameReplay(500, self.random_state, env.observation_space.shape, storage_dir=self.storage_dir)
+        replay.add_game(play_random_game(env, self.random_state))
+        replay.flush()
+        with self.assertRaisesRegex(ValueError, 'input_shape'):
+            GameReplay(500, self.random_state, (9, 9, 9), storage_dir=self.storage_dir)
+
+    def test_array_mismatch(self):
+        replay = UniformReplay(50, self.random_state, storage_dir=self.storage_dir)
+        replay.add_game(make_game(self.random_state, 5))
+        replay.flush()
+        np.save(os.path.join(self.storage_dir, 'values.npy'), np.zeros(40, dtype=np.float32))
+        with self.assertRaisesRegex(ValueError, 'array values'):
+            UniformReplay(50, self.random_state, storage_dir=self.storage_dir)
+
+    def test_state_shape_mismatch(self):
+        replay = UniformReplay(50, self.random_state, storage_dir=self.storage_dir)
+        replay.add_game(make_game(self.random_state, 5))
+        replay.flush()
+        resumed = UniformReplay(50, self.random_state, storage_dir=self.storage_dir)
+        game = [transition._replace(state=transition.state[:9]) for transition in make_game(self.random_state, 5)]
+        with self.assertRaisesRegex(ValueError, 'states of shape'):
+            resumed.add_game(game)
+
+    def test_set_state(self):
+        replay = UniformReplay(50, self.random_state)
+        replay.add_game(make_game(self.random_state, 20))
+
+        # Import an in memory replay state into the memory mapped files
+        mapped = UniformReplay(50, self.random_state, storage_dir=self.storage_dir)
+        mapped.set_state(replay.get_state())
+        self.assertIsInstance(mapped.states, np.memmap)
+
+        resumed = UniformReplay(50, self.random_state, storage_dir=self.storage_dir)
+        self.assertEqual(resumed.num_samples_added, 20)
+        np.testing.assert_array_equal(resumed.pi_probs, replay.pi_probs)
+
+
+class SparsePoliciesTest(parameterized.TestCase):
+    def test_encode_and_decode(self):
+        pi_probs = np.zeros((3, NUM_ACTIONS), dtype=np.float32)
+        pi_probs[0, [3, 10, 81]] = [0.5, 0.3, 0.2]
+        pi_probs[1, 0] = 1.0
+        pi_probs[2, :8] = np.arange(1, 9) / 36
+
+        indices, probs = encode_sparse_policies(pi_probs, 4)
+        self.assertEqual(indices.dtype, np.uint16)
+        self.assertEqual(probs.dtype, np.float16)
+        self.assertEqual(indices.shape, (3, 4))
+
+        decoded = decode_sparse_policies(indices, probs, NUM_ACTIONS)
+        self.assertEqual(decoded.dtype, np.float32)
+        np.testing.assert_allclose(decoded[:2], pi_probs[:2], atol=1e-3)
+        # Only the top 4 actions are kept, and renormalized
+        expected = np.zeros(NUM_ACTIONS, dtype=np.float32)
+        expected[4:8] = np.arange(5, 9) / 26
+        np.testing.assert_allclose(decoded[2], expected, atol=1e-3)
+
+    @parameterized.named_parameters(('zero', 0), ('too_large', NUM_ACTIONS + 1))
+    def test_invalid_top_k(self, top_k):
+        with self.assertRaisesRegex(ValueError, 'top_k'):
+            encode_sparse_policies(np.ones((1, NUM_ACTIONS), dtype=np.float32), top_k)
+
+    def test_sparse_replay(self):
+        random_state = np.random.RandomState(1)
+        replay = UniformReplay(100, random_state, policy_top_k=NUM_ACTIONS)
+        game = make_game(random_state, 20)
+        replay.add_game(game[:10])
+        for transition in game[10:]:
+            replay.add(transition)
+
+        self.assertEqual(replay.pi_probs.dtype, np.float16)
+        for stored, expected in zip(replay.get(range(20)), game):
+            np.testing.assert_allclose(stored.pi_prob, expected.pi_prob, atol=1e-3)
+
+        batch = replay.sample(8)
+        self.assertEqual(batch.pi_prob.shape, (8, NUM_ACTIONS))
+        self.assertEqual(batch.pi_prob.dtype, np.float32)
+        np.testing.assert_allclose(batch.pi_prob.sum(axis=-1), 1.0, atol=1e-2)
+
+        new_replay = UniformReplay(100, random_state, policy_top_k=NUM_ACTIONS)
+        new_replay.set_state(replay.get_state())
+        np.testing.assert_array_equal(new_replay.get([5])[0].pi_prob, replay.get([5])[0].pi_prob)
+
+
+def play_random_game(env, random_state):
+    obs = env.reset()
+    done = False
+    game = []
+    while not done:
+        pi_prob = random_state.dirichlet(np.ones(env.action_dim)).astype(np.float32)
+        game.append(Transition(state=obs, pi_prob=pi_prob, value=float(random_state.choice([-1.0, 1.0]))))
+        obs, _, done, _ = env.step(random_state.choice(np.where(env.legal_actions == 1)[0]))
+    return game
+
+
+class GameReplayTest(parameterized.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.random_state = np.random.RandomState(1)
+
+    @parameterized.named_parameters(
+        ('go', GoEnv, dict(board_size=9, num_stack=8)),
+        ('gomoku', GomokuEnv, dict(board_size=9, num_stack=4)),
+    )
+    def test_rebuild_stacked_planes(self, env_class, env_kwargs):
+        env = env_class(**env_kwargs)
+        games = [play_random_game(env, self.random_state) for _ in range(3)]
+        replay = GameReplay(200, self.random_state, env.observation_space.shape)
+        for game in games:
+            # The actors send the states as packed bits
+            replay.add_game([transition._replace(state=pack_states(transition.state)) for transition in game])
+
+        transitions = [transition for game in games for transition in game]
+        self.assertEqual(replay.num_samples_added, len(transitions))
+
+        # Only the positions with complete history are sampled after the storage wraps around
+        low, high = replay._sample_range()
+        num_positions = min(len(transitions), replay.capacity)
+        offset = len(transitions) - num_positions
+        for i in range(low, high):
+            index = (offset + i) % replay.capacity
+            stored = replay.get([index])[0]
+            expected = transitions[offset + i]
+            np.testing.assert_array_equal(unpack_states(stored.state, env.observation_space.shape), expected.state)
+            np.testing.assert_array_equal(stored.pi_prob, expected.pi_prob)
+            self.assertEqual(stored.value, expected.value)
+
+    def test_add_stacked_game(self):
+        env = GoEnv(board_size=9, num_stack=8)
+        game = play_random_game(env, self.random_state)
+        game = [transition._replace(state=pack_states(transition.state)) for transition in game]
+        replay = GameReplay(1000, self.random_state, env.observation_space.shape)
+        replay.add_game(game)
+        stacked_replay = GameReplay(1000, self.random_state, env.observation_space.shape)
+        stacked_replay.add_game(stack_game(game))
+
+        self.assertEqual(stacked_replay.num_samples_added, len(game))
+        for name in replay.array_names:
+            np.testing.assert_array_equal(getattr(stacked_replay, name), getattr(replay, name))
+
+    @parameterized.named_parameters(('packed', True), ('unpacked', False))
+    def test_add_transitions(self, packed):
+        env = GoEnv(board_size=9, num_stack=8)
+        games = [play_random_game(env, self.random_state) for _ in range(3)]
+        if packed:
+            games = [[transition._replace(state=pack_states(transition.state)) for transition in game] for game in games]
+        replay = GameReplay(200, self.random_state, env.observation_space.shape)
+        game_replay = GameReplay(200, self.random_state, env.observation_space.shape)
+        for game in games:
+            for transition in game:
+                replay.add(transition)
+            game_replay.add_game(game)
+
+        self.assertEqual(replay.num_samples_added, game_replay.num_samples_added)
+        for name in replay.array_names:
+            np.testing.assert_array_equal(getattr(replay, name), getattr(game_replay, name))
+
+    def test_sample(self):
+        env = GoEnv(board_size=9, num_stack=8)
+        replay = GameReplay(1000, self.random_state, env.observation_space.shape)
+        self.assertIsNone(replay.sample(8))
+
+        game = play_random_game(env, self.random_state)
+        replay.add_game(game)
+        batch = replay.sample(16)
+        self.assertEqual(batch.state.shape, (16, (int(np.prod(env.observation_space.shape)) + 7) // 8))
+        self.assertEqual(batch.pi_prob.shape, (16, env.action_dim))
+
+        expected_states = {pack_states(transition.state).tobytes() for transition in game}
+        for state in batch.state:
+            self.assertIn(state.tobytes(), expected_states)
+
+    def test_set_state(self):
+        env = GoEnv(board_size=9, num_stack=8)
+        replay = GameReplay(100, self.random_state, env.observation_space.shape)
+        replay.add_game(play_random_game(env, self.random_state))
+
+        new_replay = GameReplay(100, self.random_state, env.observation_space.shape)
+        new_replay.set_state(replay.get_state())
+        indices = np.arange(replay.size)
+        for stored, expected in zip(new_replay.get(indices), replay.get(indices)):
+            np.testing.assert_array_equal(stored.state, expected.state)
+
+        with self.assertRaisesRegex(ValueError, 'GameReplay'):
+            new_replay.set_state(UniformReplay(10, self.random_state).get_state())
+
+
+if __name__ == '__main__':
+    absltest.main()
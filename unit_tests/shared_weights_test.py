@@ -0,0 +1,87 @@
+# Copyright (c) 2023 Michael Hu.
+# This code is part of the book "The Art of Reinforcement Learning: Fundamentals, Mathematics, and Implementation with Python.".
+# This project is released under the MIT License.
+# See the accompanying LICENSE file for details.
+
+
+"""Tests for core.shared_weights.py."""
+import multiprocessing as mp
+from absl.testing import absltest
+import torch
+
+from alpha_zero.core.network import AlphaZeroNet
+from alpha_zero.core.shared_weights import SharedWeights
+
+
+INPUT_SHAPE = (17, 9, 9)
+NUM_ACTIONS = 82
+
+
+def build_network(seed=1):
+    torch.manual_seed(seed)
+    return AlphaZeroNet(INPUT_SHAPE, NUM_ACTIONS, num_res_block=2, num_filters=16, num_fc_units=16)
+
+
+def load_in_child(shared_weights, data_queue):
+    network = build_network(seed=3)
+    version, training_steps = shared_weights.load(network)
+    # Send NumPy arrays, as the tensors are shared through file descriptors which are closed when the process exits
+    data_queue.put((version, training_steps, {name: tensor.numpy() for name, tensor in network.state_dict().items()}))
+
+
+class SharedWeightsTest(absltest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.network = build_network()
+        # Change the batch norm statistics, which are part of the state dict
+        self.network.train()
+        self.network(torch.rand(4, *INPUT_SHAPE))
+        self.shared_weights = SharedWeights(build_network(seed=2))
+
+    def assert_state_dict_equal(self, state_dict, expected_state_dict):
+        self.assertEqual(list(state_dict.keys()), list(expected_state_dict.keys()))
+        for name, tensor in expected_state_dict.items():
+            torch.testing.assert_close(state_dict[name], tensor, rtol=0, atol=0)
+
+    def test_publish_and_load(self):
+        self.assertEqual(self.shared_weights.version, 0)
+        self.assertEqual(self.shared_weights.publish(self.network, 100), 1)
+        self.assertEqual(self.shared_weights.version, 1)
+
+        network = build_network(seed=3)
+        parameters = list(network.parameters())
+        self.assertEqual(self.shared_weights.load(network), (1, 100))
+        self.assert_state_dict_equal(network.state_dict(), self.network.state_dict())
+        # The weights are copied in place
+        for parameter, loaded_parameter in zip(parameters, network.parameters()):
+            self.assertIs(parameter, loaded_parameter)
+
+    def test_channels_last(self):
+        self.shared_weights.publish(self.network.to(memory_format=torch.channels_last), 100)
+        network = build_network(seed=3)
+        self.shared_weights.load(network)
+        self.assert_state_dict_equal(network.state_dict(), self.network.state_dict())
+
+    def test_child_process(self):
+        self.shared_weights.publish(self.network, 200)
+        data_queue = mp.Queue()
+        process = mp.Process(target=load_in_child, args=(self.shared_weights, data_queue))
+        process.start()
+        version, training_steps, state_dict = data_queue.get(timeout=60)
+        process.join()
+
+        self.assertEqual((version, training_steps), (1, 200))
+        self.assert_state_dict_equal({name: torch.from_numpy(v) for name, v in state_dict.items()}, self.network.state_dict())
+
+    def test_different_network(self):
+        network = AlphaZeroNet(INPUT_SHAPE, NUM_ACTIONS, num_res_block=1, num_filters=16, num_fc_units=16)
+        with self.assertRaisesRegex(ValueError, 'same state dict'):
+            self.shared_weights.load(network)
+        with self.assertRaisesRegex(ValueError, 'same state dict'):
+            self.shared_weights.publish(network, 100)
+
+
+if __name__ == '__main__':
+    # Same as the training scripts
+    mp.set_start_method('spawn')
+    absltest.main()
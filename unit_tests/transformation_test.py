@@ -5,11 +5,16 @@
 
 
 from absl.testing import absltest
+from absl.testing import parameterized
 import torch
 from alpha_zero.utils.transformation import (
+    DIHEDRAL_SYMMETRIES,
+    apply_dihedral_transformation,
     apply_horizontal_flip,
+    apply_random_transformation,
     apply_vertical_flip,
     apply_rotation,
+    dihedral_permutations,
     probs_to_3d,
     flatten_probs,
 )
@@ -334,5 +339,79 @@ class TestRotation(absltest.TestCase):
             self.assertTrue(torch.all(torch.eq(pi_probs_out[i, ...], expected_pi_probs)))
 
 
+class TestDihedralTransformation(parameterized.TestCase):
+    @parameterized.named_parameters(('no_pass_move', 0), ('pass_move', 1))
+    def test_matches_existing_transformations(self, num_pass_moves):
+        board_size = 19
+        states = torch.randn(2, 3, board_size, board_size)
+        pi_probs = torch.randn(2, board_size * board_size + num_pass_moves)
+        existing = {
+            'rotate90': lambda x, y: apply_rotation(x, y, 90),
+            'rotate180': lambda x, y: apply_rotation(x, y, 180),
+            'rotate270': lambda x, y: apply_rotation(x, y, 270),
+            'h_flip': apply_horizontal_flip,
+            'v_flip': apply_vertical_flip,
+        }
+        names = list(DIHEDRAL_SYMMETRIES.keys())
+        for name, transformation in existing.items():
+            symmetries = torch.full((2,), names.index(name), dtype=torch.long)
+            states_out, pi_probs_out = apply_dihedral_transformation(states, pi_probs, symmetries)
+            expected_states, expected_pi_probs = transformation(states, pi_probs)
+            self.assertTrue(torch.equal(states_out, expected_states), name)
+            self.assertTrue(torch.equal(pi_probs_out, expected_pi_probs), name)
+
+    def test_rotation_small_case(self):
+        # Same case as `test_apply_rotation_90_with_pass_move_small_case`
+        states = torch.tensor([[[[1, 2, 3], [4, 5, 6], [7, 8, 9]]]])
+        pi_probs = torch.tensor([[0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.001]])
+        symmetries = torch.tensor([list(DIHEDRAL_SYMMETRIES.keys()).index('rotate90')])
+        states_out, pi_probs_out = apply_dihedral_transformation(states, pi_probs, symmetries)
+
+        self.assertTrue(torch.equal(states_out, torch.tensor([[[[3, 6, 9], [2, 5, 8], [1, 4, 7]]]])))
+        self.assertTrue(torch.equal(pi_probs_out, torch.tensor([[0.3, 0.6, 0.9, 0.2, 0.5, 0.8, 0.1, 0.4, 0.7, 0.001]])))
+
+    def test_all_symmetries_per_sample(self):
+        board_size = 9
+        states = torch.randint(0, 2, (8, 17, board_size, board_size), dtype=torch.uint8)
+        pi_probs = torch.rand(8, board_size * board_size + 1)
+        symmetries = torch.arange(8)
+        states_out, pi_probs_out = apply_dihedral_transformation(states, pi_probs, symmetries)
+
+        for i, symmetry in enumerate(DIHEDRAL_SYMMETRIES.values()):
+            self.assertTrue(torch.equal(states_out[i], symmetry(states[i])))
+            expected_pi_probs = symmetry(pi_probs[i, :-1].reshape(board_size, board_size)).reshape(-1)
+            self.assertTrue(torch.equal(pi_probs_out[i, :-1], expected_pi_probs))
+            # The pass move is untouched
+            self.assertEqual(pi_probs_out[i, -1], pi_probs[i, -1])
+
+    def test_permutations(self):
+        permutations = dihedral_permutations(5, True)
+        self.assertEqual(tuple(permutations.shape), (8, 26))
+        # All symmetries are distinct permutations
+        self.assertEqual(len({tuple(p.tolist()) for p in permutations}), 8)
+        for permutation in permutations:
+            self.assertTrue(torch.equal(torch.sort(permutation).values, torch.arange(26)))
+
+    def test_random_transformation(self):
+        torch.manual_seed(1)
+        states = torch.randn(64, 3, 9, 9)
+        pi_probs = torch.softmax(torch.randn(64, 82), dim=-1)
+        values = torch.randn(64)
+        states_out, pi_probs_out, values_out = apply_random_transformation(states, pi_probs, values)
+
+        self.assertTrue(torch.equal(values_out, values))
+        torch.testing.assert_close(pi_probs_out.sum(dim=-1), torch.ones(64))
+        torch.testing.assert_close(torch.sort(states_out.reshape(64, -1)).values, torch.sort(states.reshape(64, -1)).values)
+        # The symmetries are sampled per sample, so a batch of 64 should include untransformed and transformed samples
+        is_identity = torch.all((states_out == states).reshape(64, -1), dim=-1)
+        self.assertTrue(torch.any(is_identity) and not torch.all(is_identity))
+
+    def test_invalid_input(self):
+        with self.assertRaisesRegex(ValueError, 'Expect'):
+            apply_dihedral_transformation(torch.randn(2, 3, 9, 8), torch.randn(2, 72), torch.zeros(2, dtype=torch.long))
+        with self.assertRaisesRegex(ValueError, 'Expect'):
+            apply_dihedral_transformation(torch.randn(2, 3, 9, 9), torch.randn(2, 80), torch.zeros(2, dtype=torch.long))
+
+
 if __name__ == '__main__':
     absltest.main()